@@ -0,0 +1,99 @@
+"""
+Cold-start import-time benchmark for the GUI and each CLI command.
+
+Every case imports what that entry point loads before it does any work,
+in a fresh interpreter, several times over. Reports the median wall time
+of the imports (interpreter start-up excluded) and which heavy third-party
+packages were loaded, so a stray top-level import shows up at once.
+
+    python -m benchmarks.import_time --repeat 7 --output import_times.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules each entry point imports before its first request or query;
+# keep in step with main.py's command handlers and the lazy imports in src/
+CASES = {
+    "gui": ["src.gui.application"],
+    "cli stats": ["main", "src.data.database_operations"],
+    "cli export": ["main", "src.data.database_operations"],
+    "cli export --shards": ["main", "src.data.shard_export"],
+    "cli generate": ["main", "src.data.topic_scheduler", "src.utils.settings", "src.data.dataset_creator"],
+    "cli generate --engine asyncio": ["main", "src.data.topic_scheduler", "src.utils.settings",
+                                      "src.data.dataset_creator", "httpx"],
+    "cli generate --api openai": ["main", "src.data.topic_scheduler", "src.utils.settings",
+                                  "src.data.dataset_creator", "httpx", "openai"],
+    "cli resume": ["main", "src.data.topic_scheduler", "src.utils.settings", "src.data.dataset_creator"],
+}
+
+HEAVY_MODULES = ("tkinter", "ttkbootstrap", "PIL", "psutil", "requests", "httpx", "openai", "pydantic",
+                 "numpy", "zstandard")
+
+PROBE = """
+import importlib, json, sys, time
+start = time.perf_counter()
+for name in {modules!r}:
+    importlib.import_module(name)
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed,
+                  "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(modules, repeat):
+    """
+    Import modules in repeat fresh interpreters.
+
+    :param modules: Module names to import, in order
+    :param repeat: Number of interpreters to start
+    :return: Dict with median/min import time in ms and the heavy modules loaded
+    """
+    code = PROBE.format(modules=modules, heavy=HEAVY_MODULES)
+    # Bytecode is compiled by the first run, so every run after it is a warm-cache cold start
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, capture_output=True)
+    times, loaded = [], []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True,
+                                capture_output=True, text=True)
+        sample = json.loads(result.stdout.strip().splitlines()[-1])
+        times.append(sample["seconds"] * 1000)
+        loaded = sample["loaded"]
+    return {"median_ms": statistics.median(times), "min_ms": min(times), "loaded": loaded}
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time benchmark for each entry point")
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per case')
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), metavar='CASE',
+                        help=f'Cases to run (default: all of {", ".join(CASES)})')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    results = {}
+    print(f"{'case':<32}{'median ms':>10}{'min ms':>10}  heavy modules loaded")
+    for name in args.cases or CASES:
+        try:
+            results[name] = measure(CASES[name], args.repeat)
+        except subprocess.CalledProcessError as e:
+            # e.g. the GUI case without Tk or ttkbootstrap installed
+            print(f"{name:<32}{'failed':>10}  {e.stderr.strip().splitlines()[-1] if e.stderr else ''}")
+            continue
+        row = results[name]
+        print(f"{name:<32}{row['median_ms']:>10.1f}{row['min_ms']:>10.1f}  {', '.join(row['loaded']) or '-'}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"python": sys.version.split()[0], "repeat": args.repeat, "cases": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
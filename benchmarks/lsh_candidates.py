@@ -0,0 +1,163 @@
+"""
+Candidate-set benchmark for the MinHash/LSH near-duplicate index.
+
+is_duplicate() only runs SequenceMatcher against the rows that share an
+LSH bucket with the new question, so its cost is the number of candidates
+per probe. This builds an in-memory index of synthetic questions on one
+topic (they share most of their wording, like a real single-topic
+dataset), then probes it with new questions and with near-duplicates of
+stored ones, and reports candidates per probe and near-duplicate recall
+for each band layout:
+
+    python -m benchmarks.lsh_candidates --sizes 10000 100000 --layouts 32x3 20x5
+
+Signatures are computed once per question; every layout uses a prefix of
+them, so layouts need bands * rows <= NUM_PERMUTATIONS.
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from collections import defaultdict
+from difflib import SequenceMatcher
+from src.data.dedup_index import NUM_BANDS, NUM_PERMUTATIONS, ROWS_PER_BAND, band_keys, minhash_signature
+
+_ADJECTIVES = ("nested", "async", "immutable", "lazy", "generic", "recursive", "abstract", "cached",
+               "concurrent", "typed", "private", "default", "dynamic", "static", "mutable", "frozen",
+               "bound", "weak", "global", "local", "custom", "built-in", "keyword", "variadic")
+_NOUNS = ("list comprehensions", "decorators", "generators", "closures", "context managers", "metaclasses",
+          "descriptors", "dataclasses", "type hints", "iterators", "exceptions", "modules", "coroutines",
+          "properties", "slots", "dictionaries", "sets", "tuples", "lambdas", "class methods", "imports",
+          "arguments", "references", "namespaces", "threads", "buffers", "strings", "integers", "protocols",
+          "enums", "f-strings", "walrus assignments", "match statements", "virtual environments")
+_FRAMES = ("How do {a} work in Python?",
+           "What is the difference between {a} and {b} in Python?",
+           "Why would you use {a} instead of {b}?",
+           "What are common pitfalls when using {a} in Python?",
+           "How do {a} interact with {b} in Python code?",
+           "How do {a} affect the performance of {b}?",
+           "What happens internally when Python evaluates {a}?",
+           "How would you test code that relies on {a} and {b}?",
+           "When should {a} be preferred over {b} in a large codebase?",
+           "Can {a} be combined with {b}, and what are the trade-offs?")
+_FILLERS = ("really", "actually", "exactly", "the", "in", "typically")
+
+
+def synthetic_question(rng):
+    subjects = [f"{rng.choice(_ADJECTIVES)} {rng.choice(_NOUNS)}" for _ in range(2)]
+    return rng.choice(_FRAMES).format(a=subjects[0], b=subjects[1])
+
+
+def synthetic_questions(count, rng):
+    """Return count distinct single-topic questions."""
+    questions = set()
+    while len(questions) < count:
+        questions.add(synthetic_question(rng))
+    return list(questions)
+
+
+def near_duplicate(question, rng, threshold=0.9):
+    """
+    Edit a question by a word or two, keeping it above the is_duplicate cutoff.
+
+    :return: The edited question, or None if the edit went below the cutoff
+    """
+    words = question.split()
+    for _ in range(rng.choice((1, 2))):
+        index = rng.randrange(len(words))
+        action = rng.random()
+        if action < 0.4:
+            words[index] += "s"
+        elif action < 0.7 and len(words) > 3:
+            del words[index]
+        else:
+            words.insert(index, rng.choice(_FILLERS))
+    edited = " ".join(words)
+    if edited == question or SequenceMatcher(None, question.lower(), edited.lower()).ratio() < threshold:
+        return None
+    return edited
+
+
+def parse_layout(text):
+    bands, rows = (int(part) for part in text.lower().split("x"))
+    if bands * rows > NUM_PERMUTATIONS:
+        raise argparse.ArgumentTypeError(f"{text} needs {bands * rows} permutations; there are {NUM_PERMUTATIONS}")
+    return bands, rows
+
+
+def measure(signatures, probes, duplicates, bands, rows):
+    """
+    Index signatures under one band layout and probe it.
+
+    :param signatures: Signatures of the stored questions
+    :param probes: Signatures of new, non-duplicate questions
+    :param duplicates: (stored index, signature) of near-duplicates of stored questions
+    :return: Dict with mean/median/p99 candidates per probe, the mean as a
+        share of the table, and the share of near-duplicates found
+    """
+    buckets = defaultdict(list)
+    for qa_id, signature in enumerate(signatures):
+        for key in band_keys(signature, bands, rows):
+            buckets[key].append(qa_id)
+
+    def candidates(signature):
+        found = set()
+        for key in band_keys(signature, bands, rows):
+            found.update(buckets.get(key, ()))
+        return found
+
+    counts = sorted(len(candidates(signature)) for signature in probes)
+    found = sum(qa_id in candidates(signature) for qa_id, signature in duplicates)
+    return {"mean": statistics.fmean(counts), "median": statistics.median(counts),
+            "p99": counts[min(len(counts) - 1, round(0.99 * (len(counts) - 1)))],
+            "share": statistics.fmean(counts) / len(signatures),
+            "recall": found / len(duplicates) if duplicates else None}
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Candidates per probe of the LSH near-duplicate index")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000], help='Rows to index')
+    parser.add_argument('--layouts', type=parse_layout, nargs='+',
+                        default=[(NUM_BANDS, ROWS_PER_BAND)], metavar='BANDSxROWS',
+                        help=f'Band layouts to compare (default: the current {NUM_BANDS}x{ROWS_PER_BAND})')
+    parser.add_argument('--probes', type=int, default=500, help='New questions and near-duplicates to probe with')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    rng = random.Random(args.seed)
+    # One corpus, so every size is a prefix of the largest
+    questions = synthetic_questions(max(args.sizes) + args.probes, rng)
+    probe_questions, questions = questions[:args.probes], questions[args.probes:]
+
+    start = time.perf_counter()
+    signatures = [minhash_signature(question) for question in questions]
+    probes = [minhash_signature(question) for question in probe_questions]
+    print(f"Signed {len(signatures) + len(probes)} questions in {time.perf_counter() - start:.1f}s")
+
+    results = []
+    print(f"{'rows':>8}{'layout':>8}{'mean':>10}{'median':>8}{'p99':>8}{'share':>9}{'recall':>8}")
+    for size in sorted(args.sizes):
+        duplicates = []
+        for qa_id in rng.sample(range(size), min(size, args.probes)):
+            edited = near_duplicate(questions[qa_id], rng)
+            if edited is not None:
+                duplicates.append((qa_id, minhash_signature(edited)))
+        for bands, rows in args.layouts:
+            row = dict(measure(signatures[:size], probes, duplicates, bands, rows),
+                       rows=size, layout=f"{bands}x{rows}")
+            results.append(row)
+            print(f"{size:>8}{row['layout']:>8}{row['mean']:>10.1f}{row['median']:>8}{row['p99']:>8}"
+                  f"{row['share']:>9.2%}{row['recall']:>8.1%}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+"""
+Local stand-in for the Ollama and OpenAI APIs, for benchmarks and tests.
+
+Speaks the Ollama /api/generate (streaming and not), /api/embed,
+/api/embeddings and /api/tags wire formats and the OpenAI
+/v1/chat/completions format. Response latency, error and throttle
+rates, and the share of repeated questions are configurable.
+
+Run it standalone with:
+
+    python -m benchmarks.mock_server --port 11434 --latency-ms 300
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_COUNT_PATTERN = re.compile(r"Do this (\d+) times")
+_WORDS = ("data model cache thread index query schema token layer graph vector "
+          "kernel buffer stream parser socket module runtime compiler").split()
+
+
+class MockConfig:
+    """
+    Behaviour of the mock backend.
+
+    :param latency_ms: Mean response latency in milliseconds
+    :param latency_dist: 'fixed', 'uniform' (0 to 2x the mean) or 'lognormal'
+    :param latency_sigma: Shape of the lognormal distribution
+    :param error_rate: Share of requests answered with a 503
+    :param throttle_rate: Share of requests answered with a 429 and Retry-After
+    :param duplicate_rate: Share of questions drawn from a small repeated pool
+    :param answer_words: Length of each generated answer
+    :param seed: Random seed, for repeatable runs
+    """
+
+    def __init__(self, latency_ms=100.0, latency_dist='lognormal', latency_sigma=0.5,
+                 error_rate=0.0, throttle_rate=0.0, duplicate_rate=0.0, answer_words=60,
+                 seed=None):
+        self.latency_ms = latency_ms
+        self.latency_dist = latency_dist
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.duplicate_rate = duplicate_rate
+        self.answer_words = answer_words
+        self.seed = seed
+
+
+class MockBackend:
+    """Generates responses and keeps request counters for one server."""
+
+    def __init__(self, config):
+        self.config = config
+        self._rng = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self._popular = [self._unique_question("popular") for _ in range(50)]
+        self.stats = {"requests": 0, "errors": 0, "throttled": 0, "pairs": 0,
+                      "aborted_streams": 0}
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def _random(self):
+        with self._lock:
+            return self._rng.random()
+
+    def latency(self):
+        config = self.config
+        mean = config.latency_ms / 1000
+        if mean <= 0:
+            return 0.0
+        with self._lock:
+            if config.latency_dist == 'fixed':
+                return mean
+            if config.latency_dist == 'uniform':
+                return self._rng.uniform(0, 2 * mean)
+            # Pick mu so the distribution's mean is latency_ms
+            sigma = config.latency_sigma
+            return self._rng.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma)
+
+    def failure(self):
+        """Return the status to fail this request with, or None."""
+        draw = self._random()
+        if draw < self.config.error_rate:
+            self.count("errors")
+            return 503
+        if draw < self.config.error_rate + self.config.throttle_rate:
+            self.count("throttled")
+            return 429
+        return None
+
+    def _unique_question(self, topic):
+        words = " ".join(self._rng.sample(_WORDS, 3))
+        return f"How does the {words} design {uuid.uuid4().hex[:12]} affect {topic}?"
+
+    def qa_pairs(self, prompt):
+        match = _COUNT_PATTERN.search(prompt)
+        count = int(match.group(1)) if match else 1
+        pairs = []
+        with self._lock:
+            for _ in range(count):
+                if self._rng.random() < self.config.duplicate_rate:
+                    question = self._rng.choice(self._popular)
+                else:
+                    question = self._unique_question("the topic")
+                answer = " ".join(self._rng.choice(_WORDS) for _ in range(self.config.answer_words))
+                pairs.append({"question": question, "answer": answer.capitalize() + ".",
+                              "category": "Benchmarking"})
+        self.count("pairs", len(pairs))
+        return pairs
+
+    def response_text(self, prompt, structured):
+        pairs = self.qa_pairs(prompt)
+        if structured:
+            return json.dumps(pairs[0] if len(pairs) == 1 else {"pairs": pairs})
+        return "\n\n".join(
+            f"Question: {pair['question']}\nAnswer: {pair['answer']}\nCategory: {pair['category']}"
+            for pair in pairs)
+
+
+def mock_embedding(text, dim=64):
+    """
+    Bag-of-words embedding: texts sharing most of their words score close.
+
+    Stands in for a real embedding model, which would also match paraphrases.
+    """
+    vector = [0.0] * dim
+    for word in re.findall(r"\w+", text.lower()):
+        vector[zlib.crc32(word.encode()) % dim] += 1.0
+    return vector
+
+
+def _make_handler(backend):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, body, headers=None):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length", 0))
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def _fail(self, status):
+            headers = {"Retry-After": "1"} if status == 429 else None
+            self._send_json(status, {"error": "mock failure"}, headers)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/api/tags":
+                self._send_json(200, {"models": []})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            body = self._read_json()
+            backend.count("requests")
+            path = self.path.rstrip("/")
+            if path.endswith("/chat/completions"):
+                self._openai(body)
+            elif path == "/api/generate":
+                self._ollama(body)
+            elif path == "/api/embed":
+                texts = body.get("input", [])
+                texts = [texts] if isinstance(texts, str) else texts
+                self._send_json(200, {"model": body.get("model"),
+                                      "embeddings": [mock_embedding(text) for text in texts]})
+            elif path == "/api/embeddings":
+                self._send_json(200, {"embedding": mock_embedding(body.get("prompt", ""))})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def _ollama(self, body):
+            latency = backend.latency()
+            status = backend.failure()
+            if status:
+                time.sleep(latency / 10)
+                self._fail(status)
+                return
+
+            text = backend.response_text(body.get("prompt", ""), bool(body.get("format")))
+            prompt_tokens = len(body.get("prompt", "")) // 4
+            if not body.get("stream", True):
+                time.sleep(latency)
+                self._send_json(200, {"model": body.get("model"), "response": text, "done": True,
+                                      "prompt_eval_count": prompt_tokens,
+                                      "eval_count": len(text) // 4})
+                return
+
+            # Spread the latency over the tokens like a real model would
+            tokens = re.findall(r"\S+\s*|\s+", text)
+            delay = latency / max(1, len(tokens))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for token in tokens:
+                    time.sleep(delay)
+                    self._chunk({"model": body.get("model"), "response": token, "done": False})
+                self._chunk({"model": body.get("model"), "response": "", "done": True,
+                             "prompt_eval_count": prompt_tokens, "eval_count": len(tokens)})
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                # The client stopped reading: generation "aborted"
+                backend.count("aborted_streams")
+                self.close_connection = True
+
+        def _chunk(self, data):
+            line = json.dumps(data).encode() + b"\n"
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+            self.wfile.flush()
+
+        def _openai(self, body):
+            latency = backend.latency()
+            status = backend.failure()
+            if status:
+                time.sleep(latency / 10)
+                self._fail(status)
+                return
+
+            prompt = body["messages"][-1]["content"]
+            text = backend.response_text(prompt, "response_format" in body)
+            time.sleep(latency)
+            prompt_tokens = sum(len(m["content"]) for m in body["messages"]) // 4
+            self._send_json(200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": text}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(text) // 4,
+                          "total_tokens": prompt_tokens + len(text) // 4},
+            })
+
+    return Handler
+
+
+class _BenchmarkHTTPServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops connections once a benchmark
+    # opens more concurrent requests than that
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class MockServer:
+    """
+    Mock backend served on a background thread.
+
+    :param config: MockConfig describing the backend's behaviour
+    :param host: Interface to listen on
+    :param port: Port to listen on (default: any free port)
+    """
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.backend = MockBackend(config or MockConfig())
+        self.httpd = _BenchmarkHTTPServer((host, port), _make_handler(self.backend))
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def _serve(config, ready, stats_queue, stop):
+    with MockServer(config) as server:
+        ready.put(server.url)
+        stop.wait()
+        stats_queue.put(dict(server.backend.stats))
+
+
+class MockServerProcess:
+    """
+    Mock backend running in its own process.
+
+    Keeps the server's CPU use and GIL out of the process being measured.
+    """
+
+    def __init__(self, config=None):
+        context = multiprocessing.get_context("spawn")
+        self._ready = context.Queue()
+        self._stats = context.Queue()
+        self._stop = context.Event()
+        self._process = context.Process(
+            target=_serve, args=(config or MockConfig(), self._ready, self._stats, self._stop),
+            daemon=True)
+        self.url = None
+
+    def start(self):
+        self._process.start()
+        self.url = self._ready.get(timeout=30)
+        return self
+
+    def stop(self):
+        """Stop the server and return its request counters."""
+        self._stop.set()
+        stats = self._stats.get(timeout=30)
+        self._process.join(timeout=10)
+        return stats
+
+
+def add_config_arguments(parser):
+    """Add the MockConfig options to an argparse parser."""
+    parser.add_argument('--latency-ms', type=float, default=100.0,
+                        help='Mean response latency in milliseconds')
+    parser.add_argument('--latency-dist', choices=['fixed', 'uniform', 'lognormal'],
+                        default='lognormal', help='Latency distribution')
+    parser.add_argument('--latency-sigma', type=float, default=0.5,
+                        help='Shape of the lognormal latency distribution')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Share of requests failed with a 503')
+    parser.add_argument('--throttle-rate', type=float, default=0.0,
+                        help='Share of requests throttled with a 429')
+    parser.add_argument('--duplicate-rate', type=float, default=0.0,
+                        help='Share of questions repeated from a small pool')
+    parser.add_argument('--answer-words', type=int, default=60,
+                        help='Words per generated answer')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed')
+
+
+def config_from_args(args):
+    return MockConfig(latency_ms=args.latency_ms, latency_dist=args.latency_dist,
+                      latency_sigma=args.latency_sigma, error_rate=args.error_rate,
+                      throttle_rate=args.throttle_rate, duplicate_rate=args.duplicate_rate,
+                      answer_words=args.answer_words, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Ollama/OpenAI server")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=11434)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockServer(config_from_args(args), args.host, args.port)
+    print(f"Mock backend listening on {server.url} "
+          f"(Ollama: {server.url}/api/generate, OpenAI: {server.url}/v1)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(json.dumps(server.backend.stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""
+End-to-end throughput benchmark for create_dataset.
+
+Each database size runs in a fresh process against a mock backend
+(benchmarks.mock_server) running in a process of its own. Reports
+pairs/sec, p50/p95/p99 per-pair latency, CPU time per stage and peak RSS.
+
+    python -m benchmarks.run_benchmark --sizes 1000 10000 100000 --entries 500 --concurrency 16
+"""
+import argparse
+import functools
+import inspect
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.mock_server import MockServerProcess, add_config_arguments, config_from_args
+
+STAGES = ('request', 'parse', 'dedup', 'store')
+
+
+class StageTimer:
+    """Accumulates wall and thread CPU time of instrumented calls, per stage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.wall = dict.fromkeys(STAGES, 0.0)
+        self.cpu = dict.fromkeys(STAGES, 0.0)
+        self.calls = dict.fromkeys(STAGES, 0)
+        self.pair_latencies = []
+
+    def add(self, stage, wall, cpu):
+        with self._lock:
+            self.wall[stage] += wall
+            self.calls[stage] += 1
+            if cpu is not None:
+                self.cpu[stage] += cpu
+
+    def add_pairs(self, latency, count):
+        with self._lock:
+            self.pair_latencies.extend([latency] * count)
+
+    def wrap(self, stage, func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    # Thread CPU time would include every other task on the loop
+                    self.add(stage, time.perf_counter() - start, None)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start, start_cpu = time.perf_counter(), time.thread_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start, time.thread_time() - start_cpu)
+        return wrapper
+
+    def wrap_generator(self, func):
+        """Wrap a generate_qa_pair(s) function to also record per-pair latency."""
+        timed = self.wrap('request', func)
+
+        def count_pairs(result):
+            if isinstance(result, list):
+                return len(result)
+            return 1 if result and result[0] else 0
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                result = await timed(*args, **kwargs)
+                self.add_pairs(time.perf_counter() - start, count_pairs(result))
+                return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = timed(*args, **kwargs)
+            self.add_pairs(time.perf_counter() - start, count_pairs(result))
+            return result
+        return wrapper
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def peak_rss_mb():
+    try:
+        import resource
+        # Kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / (1024 if os.uname().sysname == "Darwin" else 1)
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 1024 / 1024
+
+
+def seed_database(db_path, rows, cache_dir):
+    """
+    Fill a database with rows synthetic QA pairs, reusing a cached copy.
+
+    Rows go through write_qa_pair so the dedup index is populated like a
+    real dataset's.
+    """
+    from src.data.database_operations import create_table, write_qa_pair
+
+    cached = os.path.join(cache_dir, f"seed_{rows}.db")
+    if not os.path.exists(cached):
+        building = f"{cached}.{uuid.uuid4().hex}.tmp"
+        create_table(building)
+        conn = sqlite3.connect(building)
+        cursor = conn.cursor()
+        for i in range(rows):
+            write_qa_pair(cursor, f"Seed question {uuid.uuid4().hex} number {i} about benchmarks?",
+                          "A seeded answer that is long enough to be kept.", "Seed")
+        conn.commit()
+        conn.close()
+        os.replace(building, cached)
+    shutil.copyfile(cached, db_path)
+
+
+def _instrument(timer):
+    from src.data import dataset_creator, batch_writer, semantic_dedup
+    from src.utils import api_client, async_api_client
+
+    patches = []
+
+    def patch(module, name, replacement):
+        patches.append((module, name, getattr(module, name)))
+        setattr(module, name, replacement)
+
+    for name in ('generate_qa_pair', 'generate_qa_pairs', 'agenerate_qa_pair', 'agenerate_qa_pairs'):
+        patch(dataset_creator, name, timer.wrap_generator(getattr(dataset_creator, name)))
+    for module in (api_client, async_api_client):
+        for name in ('parse_qa_response', 'parse_qa_responses',
+                     'parse_structured_qa_response', 'parse_structured_qa_responses'):
+            patch(module, name, timer.wrap('parse', getattr(module, name)))
+    patch(dataset_creator, 'is_duplicate', timer.wrap('dedup', dataset_creator.is_duplicate))
+    patch(semantic_dedup.SemanticDeduplicator, 'drop_duplicates',
+          timer.wrap('dedup', semantic_dedup.SemanticDeduplicator.drop_duplicates))
+    patch(batch_writer.QAPairWriter, '_write_batch',
+          timer.wrap('store', batch_writer.QAPairWriter._write_batch))
+    return patches
+
+
+def run_case(rows, options):
+    """
+    Run one benchmark case and return its measurements.
+
+    :param rows: Number of rows in the database before generating
+    :param options: Dict of benchmark options (see parse_arguments)
+    :return: Dict of results
+    """
+    from src.data.dataset_creator import create_dataset
+    from src.utils.settings import settings_store
+
+    logging.basicConfig(level=logging.WARNING)
+    workdir = tempfile.mkdtemp(prefix="qa_bench_")
+    db_path = os.path.join(workdir, "bench.db")
+    seed_database(db_path, rows, options["seed_cache"])
+
+    server = MockServerProcess(options["mock_config"]).start()
+    settings = {
+        "api_url": f"{server.url}/api/generate",
+        "openai_base_url": f"{server.url}/v1",
+        "openai_rpm": 1000000,
+        "max_retries": 3,
+        "timeout": 60,
+        "ollama_stream": options["stream"],
+        "ollama_probe_interval": 0,
+        "structured_output": options["structured"],
+        "pairs_per_request": options["pairs_per_request"],
+        "semantic_dedup": options["semantic"],
+    }
+    settings_path = os.path.join(workdir, "settings.json")
+    with open(settings_path, "w") as f:
+        json.dump(settings, f)
+    os.environ.setdefault("OPENAI_API_KEY", "mock-key")
+
+    original_settings_path = settings_store.path
+    settings_store.path = settings_path
+    settings_store.invalidate()
+    timer = StageTimer()
+    patches = _instrument(timer)
+    try:
+        start, start_cpu = time.perf_counter(), time.process_time()
+        generated = create_dataset(
+            options["entries"], db_path, ["benchmarking"], lambda current, total: None,
+            threading.Event(), options["backend"], options["concurrency"], options["engine"])
+        elapsed = time.perf_counter() - start
+        process_cpu = time.process_time() - start_cpu
+    finally:
+        for target, name, original in reversed(patches):
+            setattr(target, name, original)
+        settings_store.path = original_settings_path
+        settings_store.invalidate()
+        server_stats = server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    latencies = timer.pair_latencies
+    return {
+        "rows": rows,
+        "generated": generated,
+        "seconds": elapsed,
+        "pairs_per_sec": generated / elapsed if elapsed else None,
+        "latency_p50": percentile(latencies, 0.50),
+        "latency_p95": percentile(latencies, 0.95),
+        "latency_p99": percentile(latencies, 0.99),
+        "process_cpu": process_cpu,
+        "stage_cpu": timer.cpu,
+        "stage_wall": timer.wall,
+        "stage_calls": timer.calls,
+        "peak_rss_mb": peak_rss_mb(),
+        "server": server_stats,
+    }
+
+
+def _format_seconds(value):
+    return "-" if value is None else f"{value * 1000:.0f}ms"
+
+
+def print_header():
+    print("Stage columns are CPU seconds; request CPU includes parse and is not "
+          "measured for the asyncio engine.")
+    print(f"{'rows':>8} {'pairs':>6} {'pairs/s':>8} {'p50':>7} {'p95':>7} {'p99':>7} "
+          f"{'cpu':>7} {'request':>8} {'parse':>7} {'dedup':>7} {'store':>7} {'rss':>7}")
+
+
+def print_result(result):
+    cpu = result["stage_cpu"]
+    print(f"{result['rows']:>8} {result['generated']:>6} {result['pairs_per_sec']:>8.1f} "
+          f"{_format_seconds(result['latency_p50']):>7} {_format_seconds(result['latency_p95']):>7} "
+          f"{_format_seconds(result['latency_p99']):>7} {result['process_cpu']:>6.2f}s "
+          f"{cpu['request']:>7.2f}s {cpu['parse']:>6.2f}s {cpu['dedup']:>6.2f}s "
+          f"{cpu['store']:>6.2f}s {result['peak_rss_mb']:>5.0f}MB", flush=True)
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="create_dataset throughput benchmark")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='Database sizes (rows) to benchmark at')
+    parser.add_argument('--entries', type=int, default=500, help='Pairs to generate per case')
+    parser.add_argument('--backend', choices=['ollama', 'openai'], default='ollama')
+    parser.add_argument('--engine', choices=['threads', 'asyncio'], default='threads')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--pairs-per-request', type=int, default=1)
+    parser.add_argument('--no-stream', dest='stream', action='store_false',
+                        help='Disable streaming Ollama responses')
+    parser.add_argument('--structured', action='store_true', help='Use structured JSON output')
+    parser.add_argument('--semantic', action='store_true',
+                        help='Enable semantic dedup (embeddings from the mock server; needs numpy)')
+    parser.add_argument('--seed-cache', default=os.path.join(tempfile.gettempdir(), "qa_bench_seeds"),
+                        help='Directory for cached seeded databases')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    add_config_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    os.makedirs(args.seed_cache, exist_ok=True)
+    options = {
+        "entries": args.entries,
+        "backend": args.backend,
+        "engine": args.engine,
+        "concurrency": args.concurrency,
+        "pairs_per_request": args.pairs_per_request,
+        "stream": args.stream,
+        "structured": args.structured,
+        "semantic": args.semantic,
+        "seed_cache": args.seed_cache,
+        "mock_config": config_from_args(args),
+    }
+
+    print_header()
+    results = []
+    for rows in args.sizes:
+        # A fresh process per size keeps caches and peak RSS from leaking between cases
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results.append(pool.submit(run_case, rows, options).result())
+        print_result(results[-1])
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
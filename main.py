@@ -1,27 +1,319 @@
 import sys
 import argparse
+import json
 import logging
-from src.gui.application import Application
+import os
+import signal
+import sqlite3
+import threading
+import time
 from src.utils.logging_config import setup_logger
 
+# Each command imports what it needs inside its handler: the headless
+# commands must never load the GUI (and with it Tk), and stats/export
+# don't need the API clients either.
 
-def parse_arguments():
-    parser = argparse.ArgumentParser(description="QA Dataset Generator")
+
+class ProgressPrinter:
+    """
+    Progress callback that writes "label: current/total (pct)" lines to stderr.
+
+    Lines are throttled to one per ``interval`` seconds, plus the final one,
+    so a long job doesn't flood the terminal or a log collector.
+    """
+
+    def __init__(self, label, stream=None, interval=1.0):
+        self.label = label
+        self.stream = stream or sys.stderr
+        self.interval = interval
+        self._last = 0.0
+
+    def __call__(self, current, total):
+        now = time.monotonic()
+        if current < total and now - self._last < self.interval:
+            return
+        self._last = now
+        percent = f" ({current / total:.0%})" if total else ""
+        self.stream.write(f"{self.label}: {current}/{total}{percent}\n")
+        self.stream.flush()
+
+
+def _stop_on_signals(stop_event):
+    """Set stop_event on Ctrl+C or SIGTERM, so in-flight work is committed before exiting."""
+    def handler(signum, frame):
+        if stop_event.is_set():
+            raise KeyboardInterrupt
+        sys.stderr.write("Stopping after the requests in flight (press Ctrl+C again to abort)\n")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, handler)
+    signal.signal(signal.SIGTERM, handler)
+
+
+def _require_db(db_path):
+    # sqlite3 would silently create an empty database
+    if not os.path.exists(db_path):
+        raise SystemExit(f"Database not found: {db_path}")
+
+
+def _make_scheduler(topics, quotas):
+    from src.data.topic_scheduler import make_topic_scheduler
+    from src.utils.settings import get_settings
+    return make_topic_scheduler(topics, get_settings(), quotas or None)
+
+
+def _parse_topic_arg(text):
+    from src.data.topic_scheduler import parse_topics
+    try:
+        topics, quotas = parse_topics(text)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    if not topics:
+        raise SystemExit("At least one topic is required")
+    return topics, quotas
+
+
+def _run_job(db_path, job_id, concurrency=None, engine=None, api_choice=None):
+    from src.data.job_journal import COMPLETED, STOPPED, get_job, run_job
+
+    stop_event = threading.Event()
+    _stop_on_signals(stop_event)
+    generated = run_job(db_path, job_id, ProgressPrinter("Generated"), stop_event, concurrency, engine,
+                        api_choice)
+    job = get_job(db_path, job_id)
+    sys.stderr.write(f"Job {job_id} {job['status']}: {generated} entries added this run, "
+                     f"{job['committed']} of {job['total']} in total\n")
+    if job["status"] != COMPLETED and not stop_event.is_set():
+        sys.stderr.write(f"Resume it with: python main.py resume --db {db_path} --job {job_id}\n")
+    return 0 if job["status"] in (COMPLETED, STOPPED) else 1
+
+
+def cmd_generate(args):
+    from src.data.job_journal import JobError, create_job
+
+    topics, quotas = _parse_topic_arg(args.topics)
+    job_id = create_job(args.db, topics, args.entries, args.api, args.concurrency, args.engine,
+                        args.pairs_per_request, quotas)
+    sys.stderr.write(f"Started job {job_id}\n")
+    try:
+        return _run_job(args.db, job_id)
+    except JobError as e:
+        raise SystemExit(str(e))
+
+
+def cmd_resume(args):
+    _require_db(args.db)
+    if args.total is None:
+        return _resume_job(args)
+
+    # Without a job: top the database up to --total entries
+    from src.data.dataset_creator import get_generation_progress, resume_dataset_creation
+
+    if not args.topics:
+        raise SystemExit("--topics is required with --total")
+    topics, quotas = _parse_topic_arg(args.topics)
+    current = get_generation_progress(args.db)
+    if current >= args.total:
+        sys.stderr.write(f"{args.db} already holds {current} of {args.total} entries\n")
+        return 0
+    stop_event = threading.Event()
+    _stop_on_signals(stop_event)
+    total = resume_dataset_creation(
+        args.total, current, args.db, topics, ProgressPrinter("Generated"), stop_event, args.api or 'ollama',
+        args.concurrency or 1, args.engine or 'threads', args.pairs_per_request, _make_scheduler(topics, quotas))
+    sys.stderr.write(f"{args.db} now holds {total} of {args.total} entries\n")
+    return 0
+
+
+def _resume_job(args):
+    from src.data.job_journal import JobError, latest_resumable_job
+
+    job_id = args.job or latest_resumable_job(args.db)
+    if job_id is None:
+        sys.stderr.write(f"No resumable job in {args.db}\n")
+        return 1
+    try:
+        return _run_job(args.db, job_id, args.concurrency, args.engine, args.api)
+    except JobError as e:
+        raise SystemExit(str(e))
+
+
+def cmd_jobs(args):
+    from src.data.job_journal import list_jobs
+
+    _require_db(args.db)
+    jobs = list_jobs(args.db, resumable_only=args.resumable)
+    if args.json:
+        print(json.dumps(jobs, indent=2, ensure_ascii=False))
+        return 0
+    for job in jobs:
+        state = "running" if job["active"] else job["status"]
+        flag = " (resumable)" if job["resumable"] else ""
+        print(f"{job['id']:>4}  {state:<9} {job['committed']}/{job['total']}  "
+              f"{job['api_choice']}  {', '.join(job['topics'])}  updated {job['updated_at']}{flag}")
+    return 0
+
+
+def cmd_enqueue(args):
+    from src.data.work_queue import enqueue_work
+
+    topics, quotas = _parse_topic_arg(args.topics)
+    units = enqueue_work(args.db, topics, args.entries, args.unit_size, quotas)
+    sys.stderr.write(f"Queued {units} units of work in {args.db}\n")
+    return 0
+
+
+def cmd_worker(args):
+    from src.data.work_queue import run_worker
+
+    _require_db(args.db)
+    stop_event = threading.Event()
+    _stop_on_signals(stop_event)
+    summary = run_worker(args.db, args.api, stop_event, args.concurrency, args.engine, args.pairs_per_request,
+                         args.worker_id, args.lease_seconds, ProgressPrinter("Generated"), args.poll_interval)
+    sys.stderr.write(f"Worker finished {summary['units']} units, {summary['pairs']} entries added\n")
+    return 0
+
+
+def cmd_export(args):
+    _require_db(args.db)
+    if args.shards:
+        from src.data.shard_export import export_sharded_jsonl
+        export_sharded_jsonl(args.db, args.output, ProgressPrinter("Exported"),
+                             num_shards=args.shards, compression=args.compression)
+    else:
+        from src.data.database_operations import export_to_json
+        export_to_json(args.db, args.output, ProgressPrinter("Exported"))
+    sys.stderr.write(f"Exported {args.db} to {args.output}\n")
+    return 0
+
+
+def cmd_stats(args):
+    from src.data.database_operations import get_dataset_stats
+    from src.data.work_queue import queue_status
+
+    _require_db(args.db)
+    stats = get_dataset_stats(args.db)
+    work_queue = queue_status(args.db)
+    if args.json:
+        if work_queue:
+            stats = dict(stats, work_queue=work_queue)
+        print(json.dumps(stats, indent=2, ensure_ascii=False))
+    else:
+        print(f"Total pairs: {stats['total_pairs']}")
+        for category, count in sorted(stats["category_counts"].items(), key=lambda item: -item[1]):
+            print(f"  {category}: {count}")
+        if work_queue:
+            print("Work queue:")
+            for status, row in sorted(work_queue.items()):
+                print(f"  {status}: {row['units']} units, {row['produced']}/{row['pairs']} pairs")
+    return 0
+
+
+def _metrics_exporters(args):
+    """Start the metrics endpoint and snapshot file asked for on the command line or in settings.json."""
+    from src.utils.metrics import MetricsExporters
+    from src.utils.settings import get_settings
+    return MetricsExporters.from_settings(get_settings(), args.metrics_port, args.metrics_file,
+                                          args.metrics_interval)
+
+
+def _add_backend_options(parser):
+    parser.add_argument('--api', choices=['ollama', 'openai'], default='ollama',
+                        help='Backend to generate with (default: ollama)')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='Maximum number of API requests in flight (default: 1)')
+    parser.add_argument('--engine', choices=['threads', 'asyncio'], default='threads',
+                        help='Concurrency engine (default: threads)')
+    parser.add_argument('--pairs-per-request', type=int,
+                        help='QA pairs to ask for per request (default: the pairs_per_request setting)')
+
+
+def _add_generation_options(parser):
+    parser.add_argument('--topics', required=True,
+                        help='Comma-separated topics, optionally with quotas, e.g. "math:100, python"')
+    _add_backend_options(parser)
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(
+        description="QA Dataset Generator. Without a command, opens the GUI.")
     parser.add_argument('--debug', action='store_true',
                         help='Enable debug mode')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Log progress details to stderr in headless commands')
     parser.add_argument('--log-file', type=str, help='Path to log file')
-    return parser.parse_args()
+    parser.add_argument('--metrics-port', type=int,
+                        help='Serve Prometheus metrics at http://127.0.0.1:PORT/metrics (default: the '
+                             'metrics_port setting, or none)')
+    parser.add_argument('--metrics-file',
+                        help='Write a metrics snapshot to this file periodically and on exit; '
+                             'JSON if it ends in .json, else the Prometheus text format')
+    parser.add_argument('--metrics-interval', type=float,
+                        help='Seconds between metrics snapshots (default: 15)')
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
 
+    generate = subparsers.add_parser('generate', help='Generate QA pairs without the GUI')
+    generate.add_argument('--db', required=True, help='Path to the SQLite database')
+    generate.add_argument('--entries', type=int, required=True, help='Number of entries to generate')
+    _add_generation_options(generate)
+    generate.set_defaults(handler=cmd_generate)
 
-def main():
-    # Parse command-line arguments
-    args = parse_arguments()
+    resume = subparsers.add_parser(
+        'resume', help='Resume a stopped or crashed job (by default the newest one)')
+    resume.add_argument('--db', required=True, help='Path to the SQLite database')
+    resume.add_argument('--job', type=int, help='Id of the job to resume (see the jobs command)')
+    resume.add_argument('--total', type=int,
+                        help='Instead of resuming a job, top the database up to this many entries')
+    resume.add_argument('--topics', help='Topics for --total, optionally with quotas')
+    _add_backend_options(resume)
+    # Unset options keep the job's own settings
+    resume.set_defaults(handler=cmd_resume, api=None, concurrency=None, engine=None)
+
+    jobs = subparsers.add_parser('jobs', help='List the generation jobs recorded in a database')
+    jobs.add_argument('--db', required=True, help='Path to the SQLite database')
+    jobs.add_argument('--resumable', action='store_true', help='Only list jobs that can be resumed')
+    jobs.add_argument('--json', action='store_true', help='Print the jobs as JSON')
+    jobs.set_defaults(handler=cmd_jobs)
+
+    enqueue = subparsers.add_parser('enqueue', help='Add units of work to the work queue for workers')
+    enqueue.add_argument('--db', required=True, help='Path to the SQLite database')
+    enqueue.add_argument('--entries', type=int, required=True, help='Number of entries to queue')
+    enqueue.add_argument('--topics', required=True,
+                         help='Comma-separated topics, optionally with quotas, e.g. "math:100, python"')
+    enqueue.add_argument('--unit-size', type=int, default=50, help='Entries per unit of work (default: 50)')
+    enqueue.set_defaults(handler=cmd_enqueue)
+
+    worker = subparsers.add_parser('worker', help='Lease units from the work queue and generate them')
+    worker.add_argument('--db', required=True, help='Path to the SQLite database')
+    _add_backend_options(worker)
+    worker.add_argument('--worker-id', help='Id recorded on leases (default: host name and process id)')
+    worker.add_argument('--lease-seconds', type=float, default=300,
+                        help='Lease duration; a dead worker\'s unit is re-issued after it (default: 300)')
+    worker.add_argument('--poll-interval', type=float, default=5,
+                        help='Seconds between claims while other workers hold the remaining units (default: 5)')
+    worker.set_defaults(handler=cmd_worker)
+
+    export = subparsers.add_parser('export', help='Export a database to JSON Lines')
+    export.add_argument('--db', required=True, help='Path to the SQLite database')
+    export.add_argument('--output', required=True,
+                        help='Output file, or output directory with --shards')
+    export.add_argument('--shards', type=int, default=0,
+                        help='Write this many compressed shards instead of one file')
+    export.add_argument('--compression', choices=['gzip', 'zstd', 'none'], default='gzip',
+                        help='Shard compression (default: gzip)')
+    export.set_defaults(handler=cmd_export)
+
+    stats = subparsers.add_parser('stats', help='Print the number of pairs per category')
+    stats.add_argument('--db', required=True, help='Path to the SQLite database')
+    stats.add_argument('--json', action='store_true', help='Print the stats as JSON')
+    stats.set_defaults(handler=cmd_stats)
+
+    return parser.parse_args(argv)
 
-    # Setup logging
-    log_level = logging.DEBUG if args.debug else logging.INFO
-    logger = setup_logger(log_file=args.log_file, level=log_level)
 
-    logger.debug("Starting application in debug mode")
+def run_gui(logger):
+    from src.gui.application import Application
 
     try:
         # Initialize and run the main application
@@ -32,5 +324,31 @@ def main():
         sys.exit(1)
 
 
+def main(argv=None):
+    # Parse command-line arguments
+    args = parse_arguments(argv)
+
+    # Setup logging; headless commands keep stdout for their output
+    log_level = logging.DEBUG if args.debug else logging.INFO
+    if args.command is None:
+        logger = setup_logger(log_file=args.log_file, level=log_level)
+        logger.debug("Starting application in debug mode")
+        run_gui(logger)
+        return
+
+    if not (args.debug or args.verbose):
+        log_level = logging.WARNING
+    logger = setup_logger(log_file=args.log_file, level=log_level, stream=sys.stderr)
+    try:
+        with _metrics_exporters(args):
+            sys.exit(args.handler(args))
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        # e.g. "no such table: qa_pairs" for a file that isn't a dataset
+        logger.error(f"{args.command} failed: {str(e)}")
+        sys.exit(1)
+
+
 if __name__ == "__main__":
     main()
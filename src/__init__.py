@@ -1,7 +1,12 @@
-from .gui import Application
-from .data import create_dataset, export_to_json
-from .utils import setup_logger
-
-__all__ = ['Application', 'create_dataset', 'export_to_json', 'setup_logger']
+from .utils.lazy import lazy_exports
 
 __version__ = '0.1.0'
+
+# Exports are imported on first access, so importing a submodule such as
+# src.data.database_operations doesn't load the GUI (and Tk) as well
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    'Application': '.gui',
+    'create_dataset': '.data',
+    'export_to_json': '.data',
+    'setup_logger': '.utils',
+})
@@ -1,4 +1,9 @@
-from .dataset_creator import create_dataset
-from .database_operations import export_to_json
+from ..utils.lazy import lazy_exports
 
-__all__ = ['create_dataset', 'export_to_json']
+# Imported on first access: exporting or reading stats shouldn't load the API clients
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    'create_dataset': '.dataset_creator',
+    'acreate_dataset': '.dataset_creator',
+    'export_to_json': '.database_operations',
+    'export_sharded_jsonl': '.shard_export',
+})
@@ -0,0 +1,239 @@
+import sqlite3
+import logging
+import queue
+import threading
+import time
+from .database_operations import write_qa_pair, is_similar_to_any
+from ..utils.metrics import DB_COMMIT_SECONDS, PAIRS_COMMITTED, REJECTED_PAIRS, WRITER_QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+
+class QAPairWriter:
+    """
+    Background writer that owns a single SQLite connection.
+
+    Accepted QA pairs are queued with submit() and committed in groups,
+    either once batch_size pairs are waiting or flush_interval seconds after
+    the first one arrived, so many inserts share one commit (and one fsync).
+    flush() and close() block until everything submitted so far is committed.
+
+    A batch that fails to commit, e.g. because the database stayed locked,
+    is rolled back and retried up to ``max_retries`` times with backoff.
+    committed_count counts the pairs that are actually in the database;
+    failed_count those rejected as duplicates or lost to database errors.
+    If given, ``on_commit`` is called from the writer thread after every
+    batch with the questions that were committed and those that were not.
+
+    The database is switched to ``journal_mode`` (WAL by default). WAL needs
+    every process to be on the same machine; workers on several machines
+    sharing the database over a network file system need "DELETE".
+    """
+
+    _STOP = object()
+
+    def __init__(self, db_path, batch_size=50, flush_interval=0.5, journal_mode="WAL", max_retries=5,
+                 retry_delay=0.2, on_commit=None):
+        self.db_path = db_path
+        self.journal_mode = journal_mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.on_commit = on_commit
+
+        self.committed_count = 0
+        self.failed_count = 0
+        # Pairs given up on after every retry failed, a subset of failed_count
+        self.lost_count = 0
+
+        self._queue = queue.Queue()
+        # Questions that have been submitted but not committed yet; the
+        # database can't see them, so duplicate checks have to
+        self._pending = []
+        self._pending_lock = threading.Lock()
+
+        self._thread = threading.Thread(
+            target=self._run, name="qa-writer", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def submit(self, question, answer, category, metadata=None):
+        """
+        Queue a QA pair for insertion.
+
+        :param question: The question to insert
+        :param answer: The answer to insert
+        :param category: The category of the QA pair
+        :param metadata: Optional dict of generation metadata (see write_qa_pair)
+        """
+        if not self._thread.is_alive():
+            raise RuntimeError("QAPairWriter is closed")
+        # Keep the pending list in queue order so committed pairs can be trimmed from its head
+        with self._pending_lock:
+            self._pending.append(question)
+            WRITER_QUEUE_DEPTH.set(len(self._pending))
+            self._queue.put((question, answer, category, metadata))
+
+    def is_pending_duplicate(self, question, threshold=0.9):
+        """
+        Check a question against pairs that are queued but not yet committed.
+
+        Call this before is_duplicate: a pair leaves the pending list only
+        after it is committed, so checking in that order never misses one.
+
+        :param question: The question to check
+        :param threshold: Similarity threshold (default: 0.9)
+        :return: True if a pending question is too similar
+        """
+        with self._pending_lock:
+            pending = list(self._pending)
+        return is_similar_to_any(question, pending, threshold)
+
+    def queue_depth(self):
+        """Return the number of pairs waiting to be committed."""
+        with self._pending_lock:
+            return len(self._pending)
+
+    def flush(self, timeout=None):
+        """
+        Wait until every pair submitted so far has been committed.
+
+        :param timeout: Maximum number of seconds to wait (default: no limit)
+        :return: Total number of pairs committed by this writer
+        """
+        if self._thread.is_alive():
+            done = threading.Event()
+            self._queue.put(done)
+            if not done.wait(timeout):
+                raise TimeoutError("Timed out waiting for the QA pair writer to flush")
+        return self.committed_count
+
+    def close(self, timeout=None):
+        """
+        Commit everything that is still queued and stop the writer thread.
+
+        :param timeout: Maximum number of seconds to wait (default: no limit)
+        :return: Total number of pairs committed by this writer
+        """
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join(timeout)
+        return self.committed_count
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            # WAL lets readers such as is_duplicate run while a batch is being written
+            conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            stopping = False
+            while not stopping:
+                batch, waiters, stopping = self._collect_batch()
+                if batch:
+                    self._write_batch(conn, batch)
+                for waiter in waiters:
+                    waiter.set()
+        except Exception as e:
+            logger.error(f"QA pair writer stopped unexpectedly: {str(e)}")
+        finally:
+            conn.close()
+            # Never leave flush() callers hanging
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    def _collect_batch(self):
+        batch = []
+        waiters = []
+        item = self._queue.get()
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            if item is self._STOP:
+                return batch, waiters, True
+            if isinstance(item, threading.Event):
+                # Flush requested: commit what we have right away
+                waiters.append(item)
+                return batch, waiters, False
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                return batch, waiters, False
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return batch, waiters, False
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                return batch, waiters, False
+
+    def _insert_batch(self, conn, batch):
+        """Insert and commit a batch; return (questions written, questions rejected as duplicates)."""
+        written = []
+        rejected = []
+        cursor = conn.cursor()
+        try:
+            for question, answer, category, metadata in batch:
+                if write_qa_pair(cursor, question, answer, category, metadata) is None:
+                    logger.info(
+                        f"Duplicate question rejected by the database: {question[:50]}...")
+                    rejected.append(question)
+                else:
+                    written.append(question)
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        return written, rejected
+
+    def _write_batch(self, conn, batch):
+        start = time.perf_counter()
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    written, rejected = self._insert_batch(conn, batch)
+                    break
+                except sqlite3.Error as e:
+                    if attempt == self.max_retries:
+                        self.failed_count += len(batch)
+                        self.lost_count += len(batch)
+                        REJECTED_PAIRS.inc(len(batch), stage="database", reason="error")
+                        logger.error(f"Failed to commit {len(batch)} QA pairs after "
+                                     f"{self.max_retries + 1} attempts: {str(e)}")
+                        self._report_commit([], [question for question, _, _, _ in batch])
+                        return
+                    delay = self.retry_delay * 2 ** attempt
+                    logger.warning(f"Failed to commit {len(batch)} QA pairs ({str(e)}); "
+                                   f"retrying in {delay:.1f}s")
+                    time.sleep(delay)
+            DB_COMMIT_SECONDS.observe(time.perf_counter() - start)
+            PAIRS_COMMITTED.inc(len(written))
+            if rejected:
+                REJECTED_PAIRS.inc(len(rejected), stage="database", reason="duplicate")
+            self.committed_count += len(written)
+            self.failed_count += len(rejected)
+            logger.debug(f"Committed {len(written)} QA pairs in one transaction")
+            self._report_commit(written, rejected)
+        finally:
+            with self._pending_lock:
+                del self._pending[:len(batch)]
+                WRITER_QUEUE_DEPTH.set(len(self._pending))
+
+    def _report_commit(self, committed, dropped):
+        if self.on_commit is None:
+            return
+        try:
+            self.on_commit(committed, dropped)
+        except Exception as e:
+            logger.error(f"Commit callback failed: {str(e)}")
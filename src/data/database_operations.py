@@ -3,6 +3,16 @@ import json
 import logging
 from difflib import SequenceMatcher
 from contextlib import contextmanager
+from .dedup_index import lsh_buckets, question_digest
+from .migrations import migrate
+
+# Generation metadata columns filled from write_qa_pair's metadata dict
+GENERATION_METADATA = ("topic", "backend", "model", "prompt_template",
+                       "latency_ms", "prompt_tokens", "completion_tokens", "work_unit_id", "job_id")
+
+_INSERT_QA_PAIR = f"""INSERT OR IGNORE INTO qa_pairs
+                      (question, answer, category, question_hash, {", ".join(GENERATION_METADATA)}, created_at)
+                      VALUES (?, ?, ?, ?, {", ".join("?" * len(GENERATION_METADATA))}, datetime('now'))"""
 
 logger = logging.getLogger(__name__)
 
@@ -27,24 +37,76 @@ def get_cursor(conn):
 
 def create_table(db_path):
     """
-    Create the qa_pairs table if it doesn't exist.
+    Create the database schema, or upgrade an existing database to it.
 
     :param db_path: Path to the SQLite database
     """
     with get_db_connection(db_path) as conn:
         with get_cursor(conn) as cursor:
-            cursor.execute('''CREATE TABLE IF NOT EXISTS qa_pairs
-                              (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                               question TEXT UNIQUE,
-                               answer TEXT,
-                               category TEXT)''')
-            conn.commit()
+            migrate(conn, cursor)
+            backfill_dedup_index(conn, cursor)
+
+
+def has_exact_duplicate(cursor, question):
+    """
+    Check whether a question with the same normalized text is stored.
+
+    :param cursor: Cursor on an open connection
+    :param question: The question to check
+    :return: True if the question's digest is already in the table
+    """
+    cursor.execute("SELECT 1 FROM qa_pairs WHERE question_hash = ? LIMIT 1",
+                   (question_digest(question),))
+    return cursor.fetchone() is not None
+
+
+def _index_question(cursor, qa_id, question):
+    cursor.executemany("INSERT INTO qa_lsh_buckets (bucket, qa_id) VALUES (?, ?)",
+                       [(bucket, qa_id) for bucket in lsh_buckets(question)])
+
+
+def backfill_dedup_index(conn, cursor, batch_size=1000):
+    """
+    Add QA pairs that are missing from the near-duplicate index.
+
+    Rows are always indexed in id order, so everything above the highest
+    indexed id still needs indexing. This covers databases created before
+    the index existed.
+
+    :param conn: Open database connection
+    :param cursor: Cursor on that connection
+    :param batch_size: Number of rows to index per transaction
+    :return: Number of rows indexed
+    """
+    cursor.execute("SELECT COALESCE(MAX(qa_id), 0) FROM qa_lsh_buckets")
+    last_id = cursor.fetchone()[0]
+
+    indexed = 0
+    while True:
+        cursor.execute("SELECT id, question FROM qa_pairs WHERE id > ? ORDER BY id LIMIT ?",
+                       (last_id, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        for qa_id, question in rows:
+            _index_question(cursor, qa_id, question)
+        conn.commit()
+        last_id = rows[-1][0]
+        indexed += len(rows)
+        logger.info(f"Indexed {indexed} existing entries for duplicate detection...")
+
+    return indexed
 
 
 def is_duplicate(new_question, db_path, threshold=0.9):
     """
     Check if a question is too similar to existing questions in the database.
 
+    Exact repeats (after normalize_question) are found with one probe of the
+    question_hash index. Otherwise candidates are looked up in the LSH index,
+    so only questions that share a bucket with the new one are compared with
+    SequenceMatcher.
+
     :param new_question: The question to check
     :param db_path: Path to the SQLite database
     :param threshold: Similarity threshold (default: 0.9)
@@ -52,18 +114,41 @@ def is_duplicate(new_question, db_path, threshold=0.9):
     """
     with get_db_connection(db_path) as conn:
         with get_cursor(conn) as cursor:
-            cursor.execute("SELECT question FROM qa_pairs")
-            existing_questions = [row[0] for row in cursor.fetchall()]
+            if has_exact_duplicate(cursor, new_question):
+                return True
+
+            buckets = lsh_buckets(new_question)
+            placeholders = ",".join("?" * len(buckets))
+            cursor.execute(f"""SELECT question FROM qa_pairs WHERE id IN
+                               (SELECT qa_id FROM qa_lsh_buckets WHERE bucket IN ({placeholders}))""",
+                           buckets)
+            candidates = [row[0] for row in cursor.fetchall()]
+
+    return is_similar_to_any(new_question, candidates, threshold)
+
+
+def is_similar_to_any(new_question, candidates, threshold=0.9):
+    """
+    Check if a question is too similar to any of the given questions.
 
-    for existing_question in existing_questions:
-        similarity = SequenceMatcher(
-            None, new_question.lower(), existing_question.lower()).ratio()
-        if similarity > threshold:
+    :param new_question: The question to check
+    :param candidates: Iterable of questions to compare against
+    :param threshold: Similarity threshold (default: 0.9)
+    :return: True if any candidate is more similar than the threshold
+    """
+    # SequenceMatcher caches information about the second sequence, so keep
+    # the new question there and swap candidates in as the first one
+    matcher = SequenceMatcher(None, b=new_question.lower())
+    for existing_question in candidates:
+        matcher.set_seq1(existing_question.lower())
+        # Cheap upper bounds first; ratio() is only computed when they pass
+        if matcher.real_quick_ratio() > threshold and matcher.quick_ratio() > threshold \
+                and matcher.ratio() > threshold:
             return True
     return False
 
 
-def insert_qa_pair(db_path, question, answer, category):
+def insert_qa_pair(db_path, question, answer, category, metadata=None):
     """
     Insert a new QA pair into the database.
 
@@ -71,12 +156,41 @@ def insert_qa_pair(db_path, question, answer, category):
     :param question: The question to insert
     :param answer: The answer to insert
     :param category: The category of the QA pair
+    :param metadata: Optional dict of generation metadata (see write_qa_pair)
+    :return: True if the pair was inserted, False if it was an exact duplicate
     """
     with get_db_connection(db_path) as conn:
         with get_cursor(conn) as cursor:
-            cursor.execute("INSERT INTO qa_pairs (question, answer, category) VALUES (?, ?, ?)",
-                           (question, answer, category))
+            qa_id = write_qa_pair(cursor, question, answer, category, metadata)
             conn.commit()
+    return qa_id is not None
+
+
+def write_qa_pair(cursor, question, answer, category, metadata=None):
+    """
+    Insert a QA pair and its index entries without committing.
+
+    Exact duplicates (same question, or same question_hash) are ignored by
+    SQLite rather than raising.
+
+    :param cursor: Cursor on an open connection
+    :param question: The question to insert
+    :param answer: The answer to insert
+    :param category: The category of the QA pair
+    :param metadata: Optional dict with any of topic, backend, model,
+        prompt_template, latency_ms, prompt_tokens, completion_tokens,
+        work_unit_id and job_id
+    :return: The id of the new row, or None if the question was a duplicate
+    """
+    metadata = metadata or {}
+    cursor.execute(_INSERT_QA_PAIR,
+                   (question, answer, category, question_digest(question),
+                    *(metadata.get(column) for column in GENERATION_METADATA)))
+    if cursor.rowcount == 0:
+        return None
+    qa_id = cursor.lastrowid
+    _index_question(cursor, qa_id, question)
+    return qa_id
 
 
 def get_all_qa_pairs(db_path):
@@ -94,30 +208,111 @@ def get_all_qa_pairs(db_path):
                     for row in cursor.fetchall()]
 
 
-def export_to_json(db_path, json_path, progress_callback):
+def get_recent_questions(db_path, limit):
+    """
+    Retrieve the most recently inserted questions.
+
+    :param db_path: Path to the SQLite database
+    :param limit: Maximum number of questions to return
+    :return: List of questions, oldest first
+    """
+    with get_db_connection(db_path) as conn:
+        with get_cursor(conn) as cursor:
+            cursor.execute(
+                "SELECT question FROM qa_pairs ORDER BY id DESC LIMIT ?", (limit,))
+            return [row[0] for row in reversed(cursor.fetchall())]
+
+
+def iter_qa_pairs(cursor, chunk_size=1000, start_id=None, end_id=None):
+    """
+    Stream QA pairs from the database without loading them all at once.
+
+    :param cursor: Cursor on an open connection
+    :param chunk_size: Number of rows to fetch from SQLite at a time
+    :param start_id: Only return rows with id >= start_id (default: no bound)
+    :param end_id: Only return rows with id < end_id (default: no bound)
+    :return: Generator of dictionaries containing QA pairs
+    """
+    # Build the range as plain comparisons so SQLite can seek on the rowid
+    conditions, params = [], []
+    if start_id is not None:
+        conditions.append("id >= ?")
+        params.append(start_id)
+    if end_id is not None:
+        conditions.append("id < ?")
+        params.append(end_id)
+    where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+
+    cursor.execute(
+        f"SELECT id, question, answer, category FROM qa_pairs {where}ORDER BY id", params)
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        for row in rows:
+            yield {"id": row[0], "question": row[1], "answer": row[2], "category": row[3]}
+
+
+def to_jsonl_line(qa_pair):
+    """
+    Serialize a QA pair as one line of JSONL.
+
+    :param qa_pair: Dictionary containing a QA pair
+    :return: The JSON line, including the trailing newline
+    """
+    # Remove newline characters from question and answer
+    qa_pair['question'] = qa_pair['question'].replace('\n', ' ')
+    qa_pair['answer'] = qa_pair['answer'].replace('\n', ' ')
+
+    # Write each QA pair on a new line for better readability
+    return json.dumps(qa_pair, ensure_ascii=False) + '\n'
+
+
+def export_to_json(db_path, json_path, progress_callback, chunk_size=1000):
     """
     Export all QA pairs from the database to a JSON file.
 
+    Rows are streamed from the database in chunks and written through a
+    buffered file, so memory use stays flat regardless of dataset size.
+
     :param db_path: Path to the SQLite database
     :param json_path: Path to save the JSON file
     :param progress_callback: Function to call to update progress
+    :param chunk_size: Number of rows to fetch from SQLite at a time
     """
-    qa_pairs = get_all_qa_pairs(db_path)
-    total_pairs = len(qa_pairs)
-
-    with open(json_path, 'w', encoding='utf-8') as f:
-        for i, qa_pair in enumerate(qa_pairs, 1):
-            # Remove newline characters from question and answer
-            qa_pair['question'] = qa_pair['question'].replace('\n', ' ')
-            qa_pair['answer'] = qa_pair['answer'].replace('\n', ' ')
+    total_pairs = 0
 
-            json.dump(qa_pair, f, ensure_ascii=False)
-            # Write each QA pair on a new line for better readability
-            f.write('\n')
+    with get_db_connection(db_path) as conn:
+        with get_cursor(conn) as cursor:
+            # Fix the upper id bound once and read it back in short id-range
+            # queries rather than one long read transaction, which under the
+            # DELETE journal mode would block a running job's commits until
+            # the export finished; rows added meanwhile land above max_id
+            cursor.execute("SELECT MAX(id) FROM qa_pairs")
+            max_id = cursor.fetchone()[0] or 0
+            cursor.execute("SELECT COUNT(*) FROM qa_pairs WHERE id <= ?", (max_id,))
+            total_pairs = cursor.fetchone()[0]
 
-            if i % 100 == 0 or i == total_pairs:
-                progress_callback(i, total_pairs)
-                logger.info(f"Exported {i}/{total_pairs} entries...")
+            exported, last_id = 0, 0
+            with open(json_path, 'w', encoding='utf-8', buffering=1024 * 1024) as f:
+                while last_id < max_id:
+                    cursor.execute(
+                        "SELECT id, question, answer, category FROM qa_pairs "
+                        "WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+                        (last_id, max_id, chunk_size))
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    last_id = rows[-1][0]
+
+                    for row in rows:
+                        exported += 1
+                        f.write(to_jsonl_line(
+                            {"id": row[0], "question": row[1], "answer": row[2], "category": row[3]}))
+
+                        if exported % 100 == 0 or exported == total_pairs:
+                            progress_callback(exported, total_pairs)
+                            logger.info(f"Exported {exported}/{total_pairs} entries...")
 
     logger.info(f"Successfully exported {total_pairs} entries to {json_path}")
 
@@ -1,65 +1,540 @@
-import random
+import asyncio
 import logging
-from .database_operations import create_table, is_duplicate, insert_qa_pair
-from ..utils.api_client import generate_qa_pair
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .database_operations import create_table, is_duplicate, is_similar_to_any, get_recent_questions
+from .semantic_dedup import get_semantic_deduplicator
+from .topic_scheduler import make_topic_scheduler, log_yield_report
+from .batch_writer import QAPairWriter
+from ..utils.api_client import generate_qa_pair, generate_qa_pairs, DuplicateQuestion, question_cache
+from ..utils.async_api_client import AsyncBackendClients, agenerate_qa_pair, agenerate_qa_pairs
+from ..utils.settings import get_settings
+from ..utils.clients import clients
+from ..utils.metrics import DEDUP_CHECK_SECONDS, REJECTED_PAIRS, REQUESTS_IN_FLIGHT
 
 logger = logging.getLogger(__name__)
 
+# Outcomes of handling one generated QA pair
+ADDED = 'added'
+DUPLICATE = 'duplicate'
+FAILED = 'failed'
 
-def create_dataset(num_entries, db_path, topics, progress_callback, stop_event, api_choice):
+
+def _check_qa_pair(qa_pair, db_path, writer, accepted=()):
+    """
+    Check whether a generated QA pair is usable and not a lexical duplicate.
+
+    :param qa_pair: Tuple of (question, answer, category) from the API client
+    :param db_path: Path to the SQLite database
+    :param writer: QAPairWriter that commits accepted pairs
+    :param accepted: Questions accepted from the same response so far
+    :return: ADDED if the pair can be stored, DUPLICATE or FAILED
+    """
+    question, answer, category = qa_pair
+    if not (question and answer and category):
+        return FAILED
+
+    # Pending pairs first: see QAPairWriter.is_pending_duplicate
+    with DEDUP_CHECK_SECONDS.time(check="lexical"):
+        duplicate = is_similar_to_any(question, accepted) or writer.is_pending_duplicate(question) \
+            or is_duplicate(question, db_path)
+    if duplicate:
+        logger.info(
+            f"Duplicate question detected and skipped: {question[:50]}...")
+        REJECTED_PAIRS.inc(stage="dedup", reason="duplicate")
+        return DUPLICATE
+    return ADDED
+
+
+def _question_filter(db_path, writer):
+    # Lets a streaming request drop a duplicate before its answer is generated.
+    # _store_results still checks again, since a racing request may win meanwhile.
+    return lambda question: writer.is_pending_duplicate(question) or is_duplicate(question, db_path)
+
+
+def _store_results(result, db_path, writer, limit, metadata=None, semantic=None):
+    """
+    Store the QA pairs produced by one API request.
+
+    Pairs that pass the lexical checks go through the semantic check, if
+    enabled, together, so a response costs one embedding request.
+
+    :param result: A (question, answer, category) tuple, or a list of them
+        when several pairs were asked for at once
+    :param db_path: Path to the SQLite database
+    :param writer: QAPairWriter that commits accepted pairs
+    :param limit: Maximum number of pairs to add; the rest are discarded
+    :param metadata: Generation metadata of the request, stored with each pair
+    :param semantic: Optional SemanticDeduplicator
+    :return: Tuple of (pairs added, pairs failed)
+    """
+    qa_pairs = result if isinstance(result, list) else [result]
+    if not qa_pairs:
+        # A multi-pair request that yielded nothing usable
+        qa_pairs = [(None, None, None)]
+
+    accepted = []
+    failed = 0
+    for qa_pair in qa_pairs:
+        if len(accepted) >= limit:
+            break
+        outcome = _check_qa_pair(qa_pair, db_path, writer, [question for question, _, _ in accepted])
+        if outcome == ADDED:
+            accepted.append(qa_pair)
+        elif outcome == FAILED:
+            failed += 1
+
+    if semantic is not None and accepted:
+        checked = len(accepted)
+        with DEDUP_CHECK_SECONDS.time(check="semantic"):
+            accepted = semantic.drop_duplicates(accepted)
+        if checked > len(accepted):
+            REJECTED_PAIRS.inc(checked - len(accepted), stage="dedup", reason="semantic")
+
+    for question, answer, category in accepted:
+        writer.submit(question, answer, category, metadata)
+        logger.info(f"Added new entry: {question[:50]}...")
+    return len(accepted), failed
+
+
+def _requests_needed(remaining, pairs_per_request):
+    return -(-remaining // pairs_per_request)
+
+
+def _store_limit(scheduler, topic, remaining):
+    # Pairs beyond the job's target or the topic's quota are discarded
+    quota = scheduler.remaining_quota(topic)
+    return remaining if quota is None else min(remaining, quota)
+
+
+def _prepare_question_cache(db_path, settings):
+    """
+    Size the recent-question cache and warm it from the newest rows.
+
+    A resumed job then rejects repeats of what it generated last time
+    right away, instead of only after the database duplicate check.
+    """
+    question_cache.resize(settings.get("question_cache_size", 1000))
+    if settings.get("question_cache_warm_start", True):
+        added = question_cache.warm_start(get_recent_questions(db_path, question_cache.max_size))
+        logger.debug(f"Warmed the recent-question cache with {added} questions")
+
+
+def _stored_count(writer):
+    # Pairs leave the queue only after they are counted as committed, so this never undercounts
+    return writer.committed_count + writer.queue_depth()
+
+
+def _target_committed(writer, num_entries):
+    """
+    Check whether num_entries pairs are in the database.
+
+    Queued pairs can still be rejected by the database as duplicates or be
+    lost to an error, so once enough are committed or queued, the queue is
+    flushed and only the committed ones count.
+    """
+    if _stored_count(writer) < num_entries:
+        return False
+    writer.flush()
+    return writer.committed_count >= num_entries
+
+
+def _close_writer(writer):
+    committed_count = writer.close()
+    if writer.failed_count:
+        logger.warning(f"{writer.failed_count} accepted entries were not committed "
+                       f"({writer.lost_count} of them lost to database errors)")
+    return committed_count
+
+
+def _committed_since(writer, base):
+    # Everything the run queued is committed (or given up on) once flush() returns
+    writer.flush()
+    return writer.committed_count - base
+
+
+class GenerationSession:
+    """
+    Writer and request engine shared by consecutive generation runs on one database.
+
+    Opening a session checks the tables, warms the recent-question cache
+    and starts the QAPairWriter; the worker pool (threads engine) or the
+    event loop and its HTTP clients (asyncio engine) start on first use.
+    A queue worker passes one session to create_dataset for every unit it
+    leases, so all of that happens once per worker rather than once per
+    unit. Without a session, create_dataset opens one for the call.
+
+    :param db_path: Path to the SQLite database
+    :param concurrency: Maximum number of API requests in flight
+    :param settings: Settings snapshot used by every run (default: the current settings)
+    """
+
+    def __init__(self, db_path, concurrency=1, settings=None):
+        self.db_path = db_path
+        self.concurrency = max(1, int(concurrency))
+        # One settings snapshot for the whole session; saves made meanwhile apply to the next one
+        self.settings = get_settings() if settings is None else settings
+        create_table(db_path)
+        _prepare_question_cache(db_path, self.settings)
+        self.semantic = get_semantic_deduplicator(db_path, self.settings)
+        self.writer = QAPairWriter(db_path, journal_mode=self.settings.get("sqlite_journal_mode", "WAL"),
+                                   on_commit=self.semantic.settle if self.semantic is not None else None)
+        self._executor = None
+        self._loop = None
+        self._async_clients = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def executor(self):
+        """Worker pool of the threads engine."""
+        if self._executor is None:
+            # One pooled connection per worker, reused for the whole session
+            clients.configure(self.concurrency)
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.concurrency, thread_name_prefix="qa-generator")
+        return self._executor
+
+    async def async_clients(self):
+        """Open AsyncBackendClients of the asyncio engine, bound to the running event loop."""
+        if self._async_clients is None:
+            self._async_clients = await AsyncBackendClients(
+                max_connections=self.concurrency,
+                openai_base_url=self.settings.get("openai_base_url")).__aenter__()
+        return self._async_clients
+
+    def run(self, coro):
+        """Run a coroutine on the session's private event loop, which stays open between runs."""
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(coro)
+
+    async def aclose(self):
+        """
+        Close a session used from someone else's event loop.
+
+        :return: Total number of entries committed in the session
+        """
+        if self._async_clients is not None:
+            await self._async_clients.aclose()
+            self._async_clients = None
+        return await asyncio.to_thread(self.close)
+
+    def close(self):
+        """
+        Stop the engine and commit what is still queued.
+
+        :return: Total number of entries committed in the session
+        """
+        if self._executor is not None:
+            # Don't block on requests that are no longer needed; their results are discarded
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._loop is not None:
+            if self._async_clients is not None:
+                self._loop.run_until_complete(self._async_clients.aclose())
+                self._async_clients = None
+            self._loop.close()
+            self._loop = None
+        return _close_writer(self.writer)
+
+
+def create_dataset(num_entries, db_path, topics, progress_callback, stop_event, api_choice, concurrency=1,
+                   engine='threads', pairs_per_request=None, scheduler=None, job_metadata=None,
+                   settings=None, session=None):
     """
     Create a dataset of QA pairs.
 
+    Up to ``concurrency`` API requests are kept in flight at once on a worker
+    pool. Results are checked for duplicates one at a time on the calling
+    thread, and accepted pairs are committed in batches by a QAPairWriter.
+    Each request's topic comes from a TopicScheduler, which is told how
+    many pairs the request yielded; its per-topic yield is logged at the end.
+
     :param num_entries: Number of entries to generate
     :param db_path: Path to the SQLite database
     :param topics: List of topics to generate questions about
     :param progress_callback: Function to call to update progress
     :param stop_event: Threading event to signal when to stop generation
     :param api_choice: Choice of API to use ('ollama' or 'openai')
-    :return: Number of entries actually generated
+    :param concurrency: Maximum number of API requests in flight (default: 1)
+    :param engine: 'threads' to use a worker pool, or 'asyncio' to run
+        acreate_dataset on a private event loop in the calling thread
+    :param pairs_per_request: Number of QA pairs to ask for in each API
+        request (default: the pairs_per_request setting, or 1)
+    :param scheduler: TopicScheduler that picks each request's topic
+        (default: make_topic_scheduler with the job's settings)
+    :param job_metadata: Generation metadata stored with every pair of the
+        job, e.g. {"work_unit_id": 7}
+    :param settings: Settings snapshot to use (default: the current settings);
+        ignored when a session is given, which has its own
+    :param session: GenerationSession to run in, left open afterwards
+        (default: one opened and closed for this call)
+    :return: Number of entries committed to the database
     """
-    create_table(db_path)
+    if session is None:
+        with GenerationSession(db_path, concurrency, settings) as session:
+            return create_dataset(num_entries, db_path, topics, progress_callback, stop_event, api_choice,
+                                  concurrency, engine, pairs_per_request, scheduler, job_metadata,
+                                  session=session)
+    if engine == 'asyncio':
+        return session.run(acreate_dataset(
+            num_entries, db_path, topics, progress_callback, stop_event, api_choice, concurrency,
+            pairs_per_request, scheduler, job_metadata, session=session))
 
     generated_count = 0
     error_count = 0
     max_errors = 50  # Increased from 20
+    concurrency = max(1, int(concurrency))
 
-    while generated_count < num_entries and not stop_event.is_set():
-        topic = random.choice(topics)
-        try:
-            question, answer, category = generate_qa_pair(
-                topic, stop_event, api_choice)
-            if question and answer and category:
-                if not is_duplicate(question, db_path):
-                    insert_qa_pair(db_path, question, answer, category)
-                    generated_count += 1
-                    error_count = 0  # Reset error count on successful generation
-                    logger.info(f"Added new entry: {question[:50]}...")
+    settings = session.settings
+    if pairs_per_request is None:
+        pairs_per_request = settings.get("pairs_per_request", 1)
+    pairs_per_request = max(1, int(pairs_per_request))
+    if scheduler is None:
+        scheduler = make_topic_scheduler(topics, settings)
+    semantic = session.semantic
+    executor = session.executor
+    writer = session.writer
+    # The session's writer may already hold earlier runs' pairs
+    base_committed = writer.committed_count
+    base_lost = writer.lost_count
+    target = base_committed + num_entries
+    question_filter = _question_filter(db_path, writer)
+    # Future -> generation metadata dict the request fills in
+    in_flight = {}
+
+    try:
+        while not stop_event.is_set() and not _target_committed(writer, target):
+            if writer.lost_count > base_lost:
+                logger.error("Stopping generation: accepted entries could not be committed.")
+                break
+            # Keep the pool full, but never ask for more pairs than are still needed
+            generated_count = _stored_count(writer) - base_committed
+            remaining = num_entries - generated_count
+            while len(in_flight) < min(concurrency, _requests_needed(remaining, pairs_per_request)):
+                topic = scheduler.next_topic(pairs_per_request)
+                if topic is None:
+                    break
+                metadata = dict(job_metadata or {}, topic=topic)
+                if pairs_per_request == 1:
+                    future = executor.submit(
+                        generate_qa_pair, topic, stop_event, api_choice, settings, question_filter,
+                        metadata=metadata)
                 else:
+                    future = executor.submit(
+                        generate_qa_pairs, topic, stop_event, api_choice, pairs_per_request, settings,
+                        metadata=metadata)
+                in_flight[future] = metadata
+            REQUESTS_IN_FLIGHT.set(len(in_flight), engine="threads")
+            if not in_flight:
+                logger.info("Every topic has reached its quota.")
+                break
+
+            # Wake up periodically so a stop request is noticed promptly
+            done, _ = wait(
+                in_flight, timeout=0.5, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                metadata = in_flight.pop(future)
+                if generated_count >= num_entries or stop_event.is_set():
+                    break
+
+                topic = metadata["topic"]
+                try:
+                    result = future.result()
+                    if metadata.get("request_failed"):
+                        scheduler.release(topic, pairs_per_request)
+                        error_count += 1
+                        continue
+                    added, failed = _store_results(
+                        result, db_path, writer,
+                        _store_limit(scheduler, topic, num_entries - generated_count), metadata, semantic)
+                    scheduler.record(topic, pairs_per_request, added, failed, metadata.get("prompt_template"))
+                    generated_count += added
+                    if added:
+                        error_count = 0  # Reset error count on successful generation
+                    else:
+                        error_count += failed
+
+                    progress_callback(generated_count, num_entries)
+
+                except DuplicateQuestion as e:
+                    scheduler.record(topic, pairs_per_request, 0)
                     logger.info(
-                        f"Duplicate question detected and skipped: {question[:50]}...")
-            else:
-                error_count += 1
+                        f"Duplicate question detected and skipped: {e.question[:50]}...")
+                except Exception as e:
+                    scheduler.release(topic, pairs_per_request)
+                    logger.error(f"Error in generate_and_store: {str(e)}")
+                    error_count += 1
 
-            progress_callback(generated_count, num_entries)
+                if error_count >= max_errors:
+                    break
 
             if error_count >= max_errors:
                 logger.error(
                     f"Stopping generation due to {max_errors} consecutive errors.")
                 break
+    finally:
+        # Requests that are no longer needed are dropped; their results are discarded
+        for future in in_flight:
+            future.cancel()
+        REQUESTS_IN_FLIGHT.set(0, engine="threads")
+        generated_count = _committed_since(writer, base_committed)
+        log_yield_report(scheduler)
+
+    return generated_count
+
+
+async def acreate_dataset(num_entries, db_path, topics, progress_callback, stop_event, api_choice,
+                          concurrency=100, pairs_per_request=None, scheduler=None, job_metadata=None,
+                          settings=None, session=None):
+    """
+    Create a dataset of QA pairs using the asyncio generation engine.
+
+    Works like create_dataset, but keeps up to ``concurrency`` requests in
+    flight as tasks on the running event loop instead of worker threads.
+
+    :param num_entries: Number of entries to generate
+    :param db_path: Path to the SQLite database
+    :param topics: List of topics to generate questions about
+    :param progress_callback: Function to call to update progress
+    :param stop_event: Threading event to signal when to stop generation
+    :param api_choice: Choice of API to use ('ollama' or 'openai')
+    :param concurrency: Maximum number of API requests in flight (default: 100)
+    :param pairs_per_request: Number of QA pairs to ask for in each API
+        request (default: the pairs_per_request setting, or 1)
+    :param scheduler: TopicScheduler that picks each request's topic
+        (default: make_topic_scheduler with the job's settings)
+    :param job_metadata: Generation metadata stored with every pair of the job
+    :param settings: Settings snapshot to use (default: the current settings);
+        ignored when a session is given, which has its own
+    :param session: GenerationSession to run in, used from this event loop
+        only and left open afterwards (default: one opened and closed for this call)
+    :return: Number of entries committed to the database
+    """
+    if session is None:
+        session = await asyncio.to_thread(GenerationSession, db_path, concurrency, settings)
+        try:
+            return await acreate_dataset(num_entries, db_path, topics, progress_callback, stop_event,
+                                         api_choice, concurrency, pairs_per_request, scheduler,
+                                         job_metadata, session=session)
+        finally:
+            await session.aclose()
+
+    generated_count = 0
+    error_count = 0
+    max_errors = 50
+    concurrency = max(1, int(concurrency))
+    # Task -> generation metadata dict the request fills in
+    in_flight = {}
+    settings = session.settings
+    if pairs_per_request is None:
+        pairs_per_request = settings.get("pairs_per_request", 1)
+    pairs_per_request = max(1, int(pairs_per_request))
+    if scheduler is None:
+        scheduler = make_topic_scheduler(topics, settings)
+    semantic = session.semantic
+    writer = session.writer
+    # The session's writer may already hold earlier runs' pairs
+    base_committed = writer.committed_count
+    base_lost = writer.lost_count
+    target = base_committed + num_entries
+    question_filter = _question_filter(db_path, writer)
+    async_clients = await session.async_clients()
+
+    try:
+        while not stop_event.is_set():
+            # Flushing blocks, so it runs off the event loop
+            if _stored_count(writer) >= target \
+                    and await asyncio.to_thread(_target_committed, writer, target):
+                break
+            if writer.lost_count > base_lost:
+                logger.error("Stopping generation: accepted entries could not be committed.")
+                break
+            generated_count = _stored_count(writer) - base_committed
+            remaining = num_entries - generated_count
+            while len(in_flight) < min(concurrency, _requests_needed(remaining, pairs_per_request)):
+                topic = scheduler.next_topic(pairs_per_request)
+                if topic is None:
+                    break
+                metadata = dict(job_metadata or {}, topic=topic)
+                if pairs_per_request == 1:
+                    coro = agenerate_qa_pair(topic, stop_event, api_choice, async_clients, settings,
+                                             question_filter, metadata=metadata)
+                else:
+                    coro = agenerate_qa_pairs(topic, stop_event, api_choice, async_clients,
+                                              pairs_per_request, settings, metadata=metadata)
+                in_flight[asyncio.ensure_future(coro)] = metadata
+            REQUESTS_IN_FLIGHT.set(len(in_flight), engine="asyncio")
+            if not in_flight:
+                logger.info("Every topic has reached its quota.")
+                break
+
+            # stop_event is a threading.Event, so poll it between completions
+            done, _ = await asyncio.wait(
+                in_flight, timeout=0.5, return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                metadata = in_flight.pop(task)
+                if generated_count >= num_entries or stop_event.is_set():
+                    break
+
+                topic = metadata["topic"]
+                try:
+                    result = task.result()
+                    if metadata.get("request_failed"):
+                        scheduler.release(topic, pairs_per_request)
+                        error_count += 1
+                        continue
+                    # The duplicate checks query the database and the
+                    # semantic one calls the embedder, so keep them off the loop
+                    added, failed = await asyncio.to_thread(
+                        _store_results, result, db_path, writer,
+                        _store_limit(scheduler, topic, num_entries - generated_count), metadata,
+                        semantic)
+                    scheduler.record(topic, pairs_per_request, added, failed,
+                                     metadata.get("prompt_template"))
+                    generated_count += added
+                    if added:
+                        error_count = 0
+                    else:
+                        error_count += failed
+
+                    progress_callback(generated_count, num_entries)
+
+                except DuplicateQuestion as e:
+                    scheduler.record(topic, pairs_per_request, 0)
+                    logger.info(
+                        f"Duplicate question detected and skipped: {e.question[:50]}...")
+                except Exception as e:
+                    scheduler.release(topic, pairs_per_request)
+                    logger.error(f"Error in generate_and_store: {str(e)}")
+                    error_count += 1
+
+                if error_count >= max_errors:
+                    break
 
-        except Exception as e:
-            logger.error(f"Error in generate_and_store: {str(e)}")
-            error_count += 1
             if error_count >= max_errors:
                 logger.error(
                     f"Stopping generation due to {max_errors} consecutive errors.")
                 break
+    finally:
+        # Unlike worker threads, outstanding requests can actually be cancelled
+        for task in in_flight:
+            task.cancel()
+        await asyncio.gather(*in_flight, return_exceptions=True)
+        REQUESTS_IN_FLIGHT.set(0, engine="asyncio")
+        generated_count = await asyncio.to_thread(_committed_since, writer, base_committed)
+        log_yield_report(scheduler)
 
     return generated_count
 
 
-def generate_dataset_batch(batch_size, db_path, topics, progress_callback, stop_event, api_choice):
+def generate_dataset_batch(batch_size, db_path, topics, progress_callback, stop_event, api_choice, concurrency=1):
     """
     Generate a batch of QA pairs for the dataset.
 
@@ -69,12 +544,14 @@ def generate_dataset_batch(batch_size, db_path, topics, progress_callback, stop_
     :param progress_callback: Function to call to update progress
     :param stop_event: Threading event to signal when to stop generation
     :param api_choice: Choice of API to use ('ollama' or 'openai')
+    :param concurrency: Maximum number of API requests in flight (default: 1)
     :return: Number of entries generated in this batch
     """
-    return create_dataset(batch_size, db_path, topics, progress_callback, stop_event, api_choice)
+    return create_dataset(batch_size, db_path, topics, progress_callback, stop_event, api_choice, concurrency)
 
 
-def resume_dataset_creation(total_entries, current_entries, db_path, topics, progress_callback, stop_event, api_choice):
+def resume_dataset_creation(total_entries, current_entries, db_path, topics, progress_callback, stop_event, api_choice, concurrency=1,
+                            engine='threads', pairs_per_request=None, scheduler=None):
     """
     Resume dataset creation from a previous point.
 
@@ -85,6 +562,10 @@ def resume_dataset_creation(total_entries, current_entries, db_path, topics, pro
     :param progress_callback: Function to call to update progress
     :param stop_event: Threading event to signal when to stop generation
     :param api_choice: Choice of API to use ('ollama' or 'openai')
+    :param concurrency: Maximum number of API requests in flight (default: 1)
+    :param engine: 'threads' or 'asyncio' (see create_dataset)
+    :param pairs_per_request: Number of QA pairs to ask for in each API request
+    :param scheduler: TopicScheduler that picks each request's topic
     :return: Total number of entries after resuming
     """
     remaining_entries = total_entries - current_entries
@@ -95,7 +576,8 @@ def resume_dataset_creation(total_entries, current_entries, db_path, topics, pro
     logger.info(
         f"Resuming dataset creation. Generating {remaining_entries} more entries.")
     new_entries = create_dataset(
-        remaining_entries, db_path, topics, progress_callback, stop_event, api_choice)
+        remaining_entries, db_path, topics, progress_callback, stop_event, api_choice, concurrency,
+        engine, pairs_per_request, scheduler)
     return current_entries + new_entries
 
 
@@ -0,0 +1,116 @@
+import hashlib
+import random
+import re
+import string
+import unicodedata
+
+# MinHash / LSH parameters. Two questions become candidates with probability
+# 1 - (1 - J**ROWS_PER_BAND)**NUM_BANDS for shingle Jaccard similarity J, an
+# S-curve centred near (1 / NUM_BANDS)**(1 / ROWS_PER_BAND) = 0.55 for 20
+# bands of 5 rows. Pairs above the 0.9 SequenceMatcher cutoff have J >= 0.64
+# or so (candidates ~90% of the time at that worst case, ~99% at the typical
+# 0.75+), while different questions on one topic reach J 0.3-0.5 and only
+# rarely collide (5-47%, against 58-99% with the old 32 bands of 3), so the
+# candidate set stays small as the table grows. Changing these needs a
+# migration that rebuilds qa_lsh_buckets; benchmarks/lsh_candidates.py
+# measures the candidates per probe.
+SHINGLE_SIZE = 3
+NUM_BANDS = 20
+ROWS_PER_BAND = 5
+NUM_PERMUTATIONS = NUM_BANDS * ROWS_PER_BAND
+
+_PRIME = (1 << 61) - 1
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Fixed seed: bucket keys are persisted in the database, so the hash
+# functions must be identical in every process
+_rng = random.Random(0x5eed)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME))
+                 for _ in range(NUM_PERMUTATIONS)]
+
+
+def _stable_hash(data, size=8):
+    # Built-in hash() is salted per process, so it can't be used for keys on disk
+    return int.from_bytes(hashlib.blake2b(data, digest_size=size).digest(), 'little')
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """
+    Split text into the set of overlapping character n-grams used for MinHash.
+
+    :param text: Text to split (compared case-insensitively)
+    :param size: Length of each shingle
+    :return: Set of shingles
+    """
+    text = text.lower()
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def minhash_signature(text):
+    """
+    Compute the MinHash signature of a piece of text.
+
+    :param text: Text to sign
+    :return: List of NUM_PERMUTATIONS integers
+    """
+    hashes = [_stable_hash(s.encode('utf-8'), 4) for s in shingles(text)]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def band_keys(signature, bands=NUM_BANDS, rows=ROWS_PER_BAND):
+    """
+    Hash each band of a MinHash signature into a bucket key.
+
+    Keys include the band number, so a single indexed column is enough to
+    look up candidates across all bands.
+
+    :param signature: MinHash signature with at least bands * rows values
+    :param bands: Number of bands
+    :param rows: Signature values per band
+    :return: List of bands signed 64-bit integers (SQLite INTEGER range)
+    """
+    keys = []
+    for band in range(bands):
+        values = signature[band * rows:(band + 1) * rows]
+        key = f"{band}:" + ",".join(map(str, values))
+        keys.append(_stable_hash(key.encode('ascii')) - (1 << 63))
+    return keys
+
+
+def lsh_buckets(text):
+    """
+    Compute the LSH bucket keys of a piece of text, one per band.
+
+    :param text: Text to bucket
+    :return: List of NUM_BANDS signed 64-bit integers (see band_keys)
+    """
+    return band_keys(minhash_signature(text))
+
+
+def normalize_question(question):
+    """
+    Normalize a question for exact-duplicate detection.
+
+    Casing, runs of whitespace and trailing punctuation are ignored, so
+    "What is Python?" and "what  is python" normalize to the same text.
+
+    :param question: The question to normalize
+    :return: The normalized question
+    """
+    text = unicodedata.normalize("NFKC", question).casefold()
+    text = _WHITESPACE.sub(" ", text).strip()
+    return text.rstrip(string.punctuation + " ")
+
+
+def question_digest(question):
+    """
+    Hash a question's normalized form into a signed 64-bit integer.
+
+    :param question: The question to hash
+    :return: The digest, as stored in the question_hash column
+    """
+    digest = hashlib.blake2b(normalize_question(question).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
@@ -0,0 +1,281 @@
+import json
+import logging
+import threading
+import time
+from .database_operations import create_table, get_db_connection, get_cursor
+from .work_queue import default_worker_id
+
+logger = logging.getLogger(__name__)
+
+CREATED = 'created'
+RUNNING = 'running'
+STOPPED = 'stopped'
+FAILED = 'failed'
+COMPLETED = 'completed'
+
+# A running job whose owner hasn't checked in for this long is taken to have crashed
+STALE_AFTER_SECONDS = 60
+HEARTBEAT_SECONDS = 15
+
+
+class JobError(Exception):
+    """A job doesn't exist or can't be run right now."""
+
+
+def _journal(cursor, job_id, event, detail=None):
+    cursor.execute("""INSERT INTO job_journal (job_id, event, detail, created_at)
+                      VALUES (?, ?, ?, datetime('now'))""",
+                   (job_id, event, json.dumps(detail) if detail is not None else None))
+
+
+def create_job(db_path, topics, total_entries, api_choice, concurrency=1, engine='threads',
+               pairs_per_request=None, quotas=None):
+    """
+    Record a new generation job, so it can be run and later resumed.
+
+    :param db_path: Path to the SQLite database
+    :param topics: List of topics to generate questions about
+    :param total_entries: Number of entries the job should add
+    :param api_choice: Choice of API to use ('ollama' or 'openai')
+    :param concurrency: Maximum number of API requests in flight
+    :param engine: 'threads' or 'asyncio' (see create_dataset)
+    :param pairs_per_request: Number of QA pairs to ask for in each API request
+    :param quotas: Optional dict of topic -> maximum number of pairs
+    :return: The job id
+    """
+    create_table(db_path)
+    parameters = {"topics": list(topics), "quotas": quotas or {}, "api_choice": api_choice,
+                  "concurrency": concurrency, "engine": engine, "pairs_per_request": pairs_per_request}
+    with get_db_connection(db_path) as conn:
+        with get_cursor(conn) as cursor:
+            cursor.execute("""INSERT INTO jobs (status, parameters, total, created_at, updated_at)
+                              VALUES (?, ?, ?, datetime('now'), datetime('now'))""",
+                           (CREATED, json.dumps(parameters), total_entries))
+            job_id = cursor.lastrowid
+            _journal(cursor, job_id, "created", dict(parameters, total=total_entries))
+            conn.commit()
+    return job_id
+
+
+def _progress(cursor, job_id):
+    # Every stored pair carries its job id, written in the same transaction
+    # as the pair, so this is exact even after a crash
+    cursor.execute("SELECT topic, COUNT(*), MAX(id) FROM qa_pairs WHERE job_id = ? GROUP BY topic", (job_id,))
+    rows = cursor.fetchall()
+    topic_counts = {topic: count for topic, count, _ in rows}
+    last_id = max((last for _, _, last in rows), default=None)
+    return sum(topic_counts.values()), topic_counts, last_id
+
+
+def _job_from_row(row, cursor, now):
+    (job_id, status, parameters, total, error, owner, heartbeat_at, created_at, updated_at) = row
+    committed, topic_counts, last_id = _progress(cursor, job_id)
+    active = status == RUNNING and heartbeat_at is not None and now - heartbeat_at < STALE_AFTER_SECONDS
+    return dict(json.loads(parameters), id=job_id, status=status, total=total, committed=committed,
+                topic_counts=topic_counts, last_committed_id=last_id, error=error, owner=owner,
+                active=active, created_at=created_at, updated_at=updated_at,
+                resumable=status != COMPLETED and committed < total and not active)
+
+
+_JOB_COLUMNS = "id, status, parameters, total, error, owner, heartbeat_at, created_at, updated_at"
+
+
+def get_job(db_path, job_id):
+    """
+    Load a job with its progress.
+
+    :param db_path: Path to the SQLite database
+    :param job_id: The job id
+    :return: Dict with the job's parameters, status, total, committed,
+        topic_counts, last_committed_id, error, owner, active and resumable;
+        None if there is no such job
+    """
+    with get_db_connection(db_path) as conn:
+        with get_cursor(conn) as cursor:
+            cursor.execute(f"SELECT {_JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+            return _job_from_row(row, cursor, time.time()) if row else None
+
+
+def list_jobs(db_path, resumable_only=False):
+    """
+    List the jobs recorded in a database, newest first.
+
+    :param db_path: Path to the SQLite database
+    :param resumable_only: Only list jobs that stopped, failed or crashed
+        before adding all their entries
+    :return: List of job dicts (see get_job); empty for databases without jobs
+    """
+    with get_db_connection(db_path) as conn:
+        with get_cursor(conn) as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'jobs'")
+            if cursor.fetchone() is None:
+                return []
+            cursor.execute(f"SELECT {_JOB_COLUMNS} FROM jobs ORDER BY id DESC")
+            now = time.time()
+            jobs = [_job_from_row(row, cursor, now) for row in cursor.fetchall()]
+    return [job for job in jobs if job["resumable"]] if resumable_only else jobs
+
+
+def job_events(db_path, job_id):
+    """
+    Return a job's journal, oldest first.
+
+    :param db_path: Path to the SQLite database
+    :param job_id: The job id
+    :return: List of (created_at, event, detail) tuples
+    """
+    with get_db_connection(db_path) as conn:
+        with get_cursor(conn) as cursor:
+            cursor.execute("SELECT created_at, event, detail FROM job_journal WHERE job_id = ? ORDER BY id",
+                           (job_id,))
+            return [(created_at, event, json.loads(detail) if detail else None)
+                    for created_at, event, detail in cursor.fetchall()]
+
+
+def _update_job(db_path, job_id, event, detail=None, **columns):
+    assignments = "".join(f", {column} = ?" for column in columns)
+    with get_db_connection(db_path) as conn:
+        with get_cursor(conn) as cursor:
+            cursor.execute(f"UPDATE jobs SET updated_at = datetime('now'){assignments} WHERE id = ?",
+                           (*columns.values(), job_id))
+            if event:
+                _journal(cursor, job_id, event, detail)
+            conn.commit()
+
+
+def _claim_job(db_path, job_id, event, detail):
+    """
+    Mark a job as running in this process, unless another one is running it.
+
+    The check and the update are a single statement, so of two processes
+    starting the same job at once only one gets it.
+
+    :return: True if the job was claimed
+    """
+    now = time.time()
+    with get_db_connection(db_path) as conn:
+        with get_cursor(conn) as cursor:
+            cursor.execute("""UPDATE jobs SET status = ?, owner = ?, heartbeat_at = ?, error = NULL,
+                                  updated_at = datetime('now')
+                              WHERE id = ?
+                                AND NOT (status = ? AND heartbeat_at IS NOT NULL AND heartbeat_at > ?)""",
+                           (RUNNING, default_worker_id(), now, job_id, RUNNING, now - STALE_AFTER_SECONDS))
+            if cursor.rowcount == 0:
+                return False
+            _journal(cursor, job_id, event, detail)
+            conn.commit()
+    return True
+
+
+def _stored(db_path, job_id):
+    with get_db_connection(db_path) as conn:
+        with get_cursor(conn) as cursor:
+            return _progress(cursor, job_id)
+
+
+def _checkpoint(db_path, job_id, status, event, error=None):
+    """Store the job's progress and status, and journal why it changed."""
+    committed, topic_counts, last_id = _stored(db_path, job_id)
+    _update_job(db_path, job_id, event, {"committed": committed, "topic_counts": topic_counts, "error": error},
+                status=status, committed=committed, last_committed_id=last_id,
+                topic_counts=json.dumps(topic_counts), error=error, heartbeat_at=None)
+
+
+class _Heartbeat(threading.Thread):
+    """Marks a running job as alive, so other processes don't take it for crashed."""
+
+    def __init__(self, db_path, job_id):
+        super().__init__(name=f"job-{job_id}-heartbeat", daemon=True)
+        self.db_path = db_path
+        self.job_id = job_id
+        self.finished = threading.Event()
+
+    def run(self):
+        while not self.finished.wait(HEARTBEAT_SECONDS):
+            try:
+                _update_job(self.db_path, self.job_id, None, heartbeat_at=time.time())
+            except Exception as e:
+                logger.warning(f"Could not record the heartbeat of job {self.job_id}: {str(e)}")
+
+
+def latest_resumable_job(db_path):
+    """Return the id of the newest job that can be resumed, or None."""
+    jobs = list_jobs(db_path, resumable_only=True)
+    return jobs[0]["id"] if jobs else None
+
+
+def run_job(db_path, job_id, progress_callback, stop_event, concurrency=None, engine=None, api_choice=None):
+    """
+    Run a recorded job until it has added all its entries, or resume one.
+
+    How many entries, and how many per topic, are still needed is worked
+    out from the pairs already stored under the job's id, so a job picks
+    up exactly where it stopped, whether it was stopped, failed or its
+    process crashed. Requests that were in flight when it stopped are not
+    recovered; their pairs were never stored, so nothing is counted twice.
+
+    :param db_path: Path to the SQLite database
+    :param job_id: Id returned by create_job
+    :param progress_callback: Function called with (entries added by the job, job total)
+    :param stop_event: Threading event to signal when to stop generation
+    :param concurrency: Override the job's concurrency for this run
+    :param engine: Override the job's engine for this run
+    :param api_choice: Override the job's backend for this run
+    :return: Number of entries added by this run
+    :raises JobError: If the job doesn't exist, is complete, or is running elsewhere
+    """
+    from .dataset_creator import create_dataset
+    from .topic_scheduler import make_topic_scheduler
+    from ..utils.settings import get_settings
+
+    create_table(db_path)
+    job = get_job(db_path, job_id)
+    if job is None:
+        raise JobError(f"No job {job_id} in {db_path}")
+    if job["active"]:
+        raise JobError(f"Job {job_id} is still running in {job['owner']}")
+    remaining = job["total"] - job["committed"]
+    if remaining <= 0:
+        _checkpoint(db_path, job_id, COMPLETED, "completed")
+        raise JobError(f"Job {job_id} is already complete")
+
+    topics = job["topics"]
+    quotas = {topic: max(0, quota - job["topic_counts"].get(topic, 0))
+              for topic, quota in job["quotas"].items()}
+    settings = get_settings()
+    # Quotas given with the job take precedence over the topic_quotas setting
+    scheduler = make_topic_scheduler(topics, settings, quotas or None)
+    resumed = job["status"] != CREATED
+    if not _claim_job(db_path, job_id, "resumed" if resumed else "started",
+                      {"committed": job["committed"], "remaining": remaining, "previous_status": job["status"]}):
+        raise JobError(f"Job {job_id} is still running in another process")
+    if resumed:
+        logger.info(f"Resuming job {job_id}: {job['committed']} of {job['total']} entries already stored")
+
+    heartbeat = _Heartbeat(db_path, job_id)
+    heartbeat.start()
+    try:
+        generated = create_dataset(
+            remaining, db_path, topics, lambda current, total: progress_callback(
+                job["committed"] + current, job["total"]),
+            stop_event, api_choice or job["api_choice"], concurrency or job["concurrency"],
+            engine or job["engine"], job["pairs_per_request"], scheduler,
+            job_metadata={"job_id": job_id}, settings=settings)
+    except Exception as e:
+        heartbeat.finished.set()
+        heartbeat.join()
+        _checkpoint(db_path, job_id, FAILED, "failed", str(e))
+        raise
+    heartbeat.finished.set()
+    heartbeat.join()
+
+    committed = _stored(db_path, job_id)[0]
+    quotas_met = bool(job["quotas"]) and all(scheduler.remaining_quota(topic) == 0 for topic in topics)
+    if committed >= job["total"] or quotas_met:
+        _checkpoint(db_path, job_id, COMPLETED, "completed")
+    elif stop_event.is_set():
+        _checkpoint(db_path, job_id, STOPPED, "stopped")
+    else:
+        _checkpoint(db_path, job_id, FAILED, "failed", "Generation stopped after repeated errors")
+    return generated
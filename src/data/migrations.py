@@ -0,0 +1,198 @@
+import logging
+from .dedup_index import question_digest
+
+logger = logging.getLogger(__name__)
+
+# Per-row generation metadata added in schema version 2
+METADATA_COLUMNS = (
+    ("topic", "TEXT"),
+    ("backend", "TEXT"),
+    ("model", "TEXT"),
+    ("prompt_template", "TEXT"),
+    ("latency_ms", "INTEGER"),
+    ("prompt_tokens", "INTEGER"),
+    ("completion_tokens", "INTEGER"),
+    ("created_at", "TEXT"),
+)
+
+
+def _columns(cursor, table):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in cursor.fetchall()}
+
+
+def _add_column(cursor, table, column, definition):
+    # ADD COLUMN only rewrites the schema, never the rows, so it is cheap on any table size
+    if column not in _columns(cursor, table):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def backfill_question_hashes(conn, cursor, batch_size=1000):
+    """
+    Fill in question_hash for rows stored before the column existed.
+
+    A row whose normalized question is already taken by another row keeps
+    a NULL hash: it stays in the table, it just doesn't block new inserts
+    a second time.
+
+    :param conn: Open database connection
+    :param cursor: Cursor on that connection
+    :param batch_size: Number of rows to hash per transaction
+    :return: Number of rows hashed
+    """
+    last_id = 0
+    hashed = 0
+    while True:
+        cursor.execute("""SELECT id, question FROM qa_pairs
+                          WHERE question_hash IS NULL AND id > ? ORDER BY id LIMIT ?""",
+                       (last_id, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        for qa_id, question in rows:
+            cursor.execute("UPDATE OR IGNORE qa_pairs SET question_hash = ? WHERE id = ?",
+                           (question_digest(question), qa_id))
+            hashed += cursor.rowcount
+        conn.commit()
+        last_id = rows[-1][0]
+        logger.info(f"Hashed {hashed} existing entries for exact duplicate detection...")
+
+    return hashed
+
+
+def _v1_base_schema(conn, cursor):
+    """QA pairs with exact and near-duplicate indexes."""
+    cursor.execute('''CREATE TABLE IF NOT EXISTS qa_pairs
+                      (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                       question TEXT UNIQUE,
+                       answer TEXT,
+                       category TEXT,
+                       question_hash INTEGER)''')
+    # Databases from before the schema was versioned may lack the column
+    _add_column(cursor, "qa_pairs", "question_hash", "INTEGER")
+    # NULLs don't conflict, so rows that can't be hashed uniquely stay allowed
+    cursor.execute('''CREATE UNIQUE INDEX IF NOT EXISTS idx_qa_pairs_question_hash
+                      ON qa_pairs (question_hash)''')
+    # Near-duplicate index: one row per (LSH bucket, QA pair)
+    cursor.execute('''CREATE TABLE IF NOT EXISTS qa_lsh_buckets
+                      (bucket INTEGER NOT NULL,
+                       qa_id INTEGER NOT NULL)''')
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_qa_lsh_buckets_bucket
+                      ON qa_lsh_buckets (bucket, qa_id)''')
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_qa_lsh_buckets_qa_id
+                      ON qa_lsh_buckets (qa_id)''')
+    conn.commit()
+    backfill_question_hashes(conn, cursor)
+
+
+def _v2_generation_metadata(conn, cursor):
+    """Which topic, backend, model and prompt produced each row, and what it cost."""
+    for column, definition in METADATA_COLUMNS:
+        _add_column(cursor, "qa_pairs", column, definition)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_qa_pairs_topic ON qa_pairs (topic)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_qa_pairs_category ON qa_pairs (category)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_qa_pairs_backend_model ON qa_pairs (backend, model)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_qa_pairs_created_at ON qa_pairs (created_at)")
+
+
+def _v3_work_queue(conn, cursor):
+    """Units of work that worker processes lease, and which unit produced each row."""
+    cursor.execute('''CREATE TABLE IF NOT EXISTS work_queue
+                      (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                       topic TEXT NOT NULL,
+                       count INTEGER NOT NULL,
+                       status TEXT NOT NULL DEFAULT 'pending',
+                       lease_owner TEXT,
+                       lease_expires REAL,
+                       attempts INTEGER NOT NULL DEFAULT 0,
+                       produced INTEGER NOT NULL DEFAULT 0,
+                       created_at TEXT,
+                       updated_at TEXT)''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_work_queue_status ON work_queue (status, lease_expires)")
+    _add_column(cursor, "qa_pairs", "work_unit_id", "INTEGER")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_qa_pairs_work_unit_id ON qa_pairs (work_unit_id)")
+
+
+def _v4_job_journal(conn, cursor):
+    """Generation jobs, their parameters and progress checkpoints, and an event journal."""
+    cursor.execute('''CREATE TABLE IF NOT EXISTS jobs
+                      (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                       status TEXT NOT NULL,
+                       parameters TEXT NOT NULL,
+                       total INTEGER NOT NULL,
+                       committed INTEGER NOT NULL DEFAULT 0,
+                       last_committed_id INTEGER,
+                       topic_counts TEXT,
+                       error TEXT,
+                       owner TEXT,
+                       heartbeat_at REAL,
+                       created_at TEXT,
+                       updated_at TEXT)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS job_journal
+                      (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                       job_id INTEGER NOT NULL,
+                       event TEXT NOT NULL,
+                       detail TEXT,
+                       created_at TEXT)''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_job_journal_job_id ON job_journal (job_id)")
+    _add_column(cursor, "qa_pairs", "job_id", "INTEGER")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_qa_pairs_job_id_topic ON qa_pairs (job_id, topic)")
+
+
+def _v5_rebanded_lsh_index(conn, cursor):
+    """Near-duplicate buckets under the 20 x 5 band layout; create_table re-indexes every row."""
+    cursor.execute("DELETE FROM qa_lsh_buckets")
+
+
+# (version, migration) pairs in order. A migration may be interrupted part way
+# and run again, so each one must be safe to repeat.
+MIGRATIONS = (
+    (1, _v1_base_schema),
+    (2, _v2_generation_metadata),
+    (3, _v3_work_queue),
+    (4, _v4_job_journal),
+    (5, _v5_rebanded_lsh_index),
+)
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(cursor):
+    """
+    Read the schema version stored in the database.
+
+    :param cursor: Cursor on an open connection
+    :return: The version; 0 for databases created before versioning
+    """
+    cursor.execute("PRAGMA user_version")
+    return cursor.fetchone()[0]
+
+
+def migrate(conn, cursor):
+    """
+    Bring a database up to SCHEMA_VERSION in place.
+
+    The version lives in PRAGMA user_version and is bumped after each
+    migration that completes, so running this again is a no-op.
+
+    :param conn: Open database connection
+    :param cursor: Cursor on that connection
+    :return: Number of migrations applied
+    """
+    version = get_schema_version(cursor)
+    if version > SCHEMA_VERSION:
+        logger.warning(
+            f"Database schema version {version} is newer than this program's ({SCHEMA_VERSION})")
+        return 0
+
+    applied = 0
+    for target, migration in MIGRATIONS:
+        if target <= version:
+            continue
+        logger.info(f"Migrating database schema to version {target}...")
+        migration(conn, cursor)
+        # PRAGMA values can't be bound as parameters
+        cursor.execute(f"PRAGMA user_version = {int(target)}")
+        conn.commit()
+        applied += 1
+    return applied
@@ -0,0 +1,337 @@
+import json
+import logging
+import os
+import threading
+from .dedup_index import question_digest
+from .database_operations import get_db_connection, get_cursor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = 0.92
+
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError(
+            "Semantic deduplication requires the 'numpy' package (pip install numpy)")
+    return numpy
+
+
+def _contains(sorted_keys, keys):
+    """Return a boolean mask of which keys appear in the sorted array."""
+    np = _import_numpy()
+    if len(sorted_keys) == 0:
+        return np.zeros(len(keys), dtype=bool)
+    positions = np.searchsorted(sorted_keys, keys).clip(max=len(sorted_keys) - 1)
+    return sorted_keys[positions] == keys
+
+
+class EmbeddingIndex:
+    """
+    Append-only store of unit-length question embeddings, next to the database.
+
+    Vectors live in <path>.f32 as raw float32 rows and their question
+    digests in <path>.keys as int64, in the same order; <path>.json records
+    the dimension, the embedding model and how far the backfill got. Lookups
+    go through a read-only memory map of the vector file, so the OS pages
+    rows in as they are scanned and nothing is loaded up front. The map is
+    only recreated when rows have been appended since the last lookup.
+
+    :param path: Base path of the index files
+    :param model: Name of the embedding model; vectors from another model are
+        not comparable, so an index built with one is discarded
+    """
+
+    def __init__(self, path, model=None):
+        self.np = _import_numpy()
+        self.path = path
+        self.model = model
+        self._vectors_path = f"{path}.f32"
+        self._keys_path = f"{path}.keys"
+        self._meta_path = f"{path}.json"
+        self._lock = threading.Lock()
+        self._matrix = None
+
+        meta = self._read_meta()
+        if meta and model is not None and meta.get("model") != model:
+            logger.warning(f"Embedding index {path} was built with model {meta.get('model')!r}; "
+                           f"rebuilding it for {model!r}")
+            self._reset()
+            meta = {}
+        self.dim = meta.get("dim")
+        self.backfilled_id = meta.get("backfilled_id", 0)
+        self.count = self._repair()
+
+    def _read_meta(self):
+        try:
+            with open(self._meta_path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read {self._meta_path}, rebuilding the index: {str(e)}")
+            self._reset()
+            return {}
+
+    def _write_meta(self):
+        temp_path = f"{self._meta_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"dim": self.dim, "model": self.model, "backfilled_id": self.backfilled_id}, f)
+        os.replace(temp_path, self._meta_path)
+
+    def _reset(self):
+        for path in (self._vectors_path, self._keys_path, self._meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _repair(self):
+        """Drop a partially written last row, e.g. after a crash, and return the row count."""
+        if not self.dim:
+            return 0
+        row_bytes = self.dim * 4
+        sizes = [os.path.getsize(path) if os.path.exists(path) else 0
+                 for path in (self._vectors_path, self._keys_path)]
+        count = min(sizes[0] // row_bytes, sizes[1] // 8)
+        if sizes != [count * row_bytes, count * 8]:
+            logger.warning(f"Truncating embedding index {self.path} to {count} complete rows")
+            for path, size in ((self._vectors_path, count * row_bytes), (self._keys_path, count * 8)):
+                with open(path, "ab") as f:
+                    f.truncate(size)
+        return count
+
+    def __len__(self):
+        return self.count
+
+    def normalize(self, vectors):
+        """Return vectors as a C-contiguous float32 matrix of unit-length rows."""
+        np = self.np
+        matrix = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return np.ascontiguousarray(matrix / np.maximum(norms, 1e-12))
+
+    def add(self, keys, vectors):
+        """
+        Append embeddings to the index.
+
+        :param keys: Question digests (see question_digest), one per vector
+        :param vectors: Vectors as returned by normalize()
+        """
+        np = self.np
+        if len(keys) == 0:
+            return
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._write_meta()
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding has {vectors.shape[1]} dimensions, "
+                                 f"the index holds {self.dim}")
+            # Vectors first: a row only counts once its key is written too
+            with open(self._vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self._keys_path, "ab") as f:
+                f.write(np.asarray(keys, dtype=np.int64).tobytes())
+            self.count += len(keys)
+
+    def _mapped(self):
+        with self._lock:
+            if self.count == 0:
+                return None
+            if self._matrix is None or self._matrix.shape[0] != self.count:
+                self._matrix = self.np.memmap(self._vectors_path, dtype=self.np.float32, mode="r",
+                                              shape=(self.count, self.dim))
+            return self._matrix
+
+    def max_similarity(self, queries, chunk_rows=16384):
+        """
+        Find each query's highest cosine similarity to any stored vector.
+
+        The whole batch of queries is scored with one matrix product per
+        chunk of stored rows, so memory use stays at chunk_rows x batch size.
+
+        :param queries: Vectors as returned by normalize()
+        :param chunk_rows: Stored rows to score per matrix product
+        :return: Array with one similarity per query; -1 when the index is empty
+        """
+        np = self.np
+        best = np.full(len(queries), -1.0, dtype=np.float32)
+        matrix = self._mapped()
+        if matrix is None:
+            return best
+        queries_t = np.ascontiguousarray(queries.T)
+        for start in range(0, matrix.shape[0], chunk_rows):
+            scores = matrix[start:start + chunk_rows] @ queries_t
+            np.maximum(best, scores.max(axis=0), out=best)
+        return best
+
+    def keys(self):
+        """Return the stored question digests as a sorted array."""
+        np = self.np
+        with self._lock:
+            if self.count == 0:
+                return np.empty(0, dtype=np.int64)
+            return np.sort(np.fromfile(self._keys_path, dtype=np.int64, count=self.count))
+
+    def set_backfilled_id(self, qa_id):
+        with self._lock:
+            self.backfilled_id = qa_id
+            if self.dim is not None:
+                self._write_meta()
+
+
+class SemanticDeduplicator:
+    """
+    Rejects questions whose embedding is too close to one already stored.
+
+    Catches paraphrases that the lexical checks miss. Accepted questions
+    are held as pending until the writer reports them committed (see
+    settle()), and only then appended to the index; later checks compare
+    against pending questions too, so they are seen before they are
+    committed, but a pair the database rejects leaves nothing behind.
+
+    :param index: EmbeddingIndex to check against and extend
+    :param embedder: Callable mapping a list of texts to a list of vectors
+    :param threshold: Cosine similarity above which a question is a duplicate
+    """
+
+    def __init__(self, index, embedder, threshold=DEFAULT_THRESHOLD):
+        self.index = index
+        self.embedder = embedder
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        # Question digest -> vector of accepted questions not yet committed
+        self._pending = {}
+
+    def drop_duplicates(self, qa_pairs):
+        """
+        Filter out QA pairs whose questions are semantic duplicates.
+
+        All questions are embedded in one request and scored against the
+        index in one pass; they are also compared with each other. If the
+        embedder fails, the pairs are let through unchecked.
+
+        :param qa_pairs: List of (question, answer, category) tuples
+        :return: The pairs to keep, in order
+        """
+        np = self.index.np
+        if not qa_pairs:
+            return []
+        questions = [question for question, _, _ in qa_pairs]
+        try:
+            vectors = self.index.normalize(self.embedder(questions))
+        except Exception as e:
+            logger.warning(f"Skipping semantic duplicate check, embedding failed: {str(e)}")
+            return list(qa_pairs)
+
+        with self._lock:
+            best = self.index.max_similarity(vectors)
+            if self._pending:
+                pending = np.stack(list(self._pending.values()))
+                np.maximum(best, (vectors @ pending.T).max(axis=1), out=best)
+            kept = []
+            for i, question in enumerate(questions):
+                if best[i] > self.threshold:
+                    logger.info(f"Semantic duplicate detected and skipped "
+                                f"(similarity {best[i]:.3f}): {question[:50]}...")
+                    continue
+                if kept and float(np.max(vectors[kept] @ vectors[i])) > self.threshold:
+                    logger.info(f"Semantic duplicate within one response skipped: {question[:50]}...")
+                    continue
+                kept.append(i)
+            for i in kept:
+                self._pending[question_digest(questions[i])] = vectors[i]
+        return [qa_pairs[i] for i in kept]
+
+    def settle(self, committed, dropped):
+        """
+        Move pending questions into the index once the database has them.
+
+        Pass as QAPairWriter's on_commit callback.
+
+        :param committed: Questions that were committed
+        :param dropped: Questions the database rejected or that were lost
+        """
+        np = self.index.np
+        with self._lock:
+            for question in dropped:
+                self._pending.pop(question_digest(question), None)
+            keys = []
+            vectors = []
+            for question in committed:
+                key = question_digest(question)
+                vector = self._pending.pop(key, None)
+                if vector is not None:
+                    keys.append(key)
+                    vectors.append(vector)
+            if keys:
+                self.index.add(keys, np.stack(vectors))
+
+    def backfill(self, db_path, batch_size=64):
+        """
+        Embed rows stored before semantic deduplication was turned on.
+
+        Rows above the index's backfill watermark are embedded in batches,
+        skipping questions the index already holds; the watermark is saved
+        after each batch, so an interrupted backfill picks up where it left off.
+
+        :param db_path: Path to the SQLite database
+        :param batch_size: Rows per embedding request
+        :return: Number of rows embedded
+        """
+        np = self.index.np
+        known = self.index.keys()
+        last_id = self.index.backfilled_id
+        embedded = 0
+        with get_db_connection(db_path) as conn:
+            with get_cursor(conn) as cursor:
+                while True:
+                    cursor.execute("SELECT id, question FROM qa_pairs WHERE id > ? ORDER BY id LIMIT ?",
+                                   (last_id, batch_size))
+                    rows = cursor.fetchall()
+                    if not rows:
+                        break
+                    keys = np.array([question_digest(question) for _, question in rows], dtype=np.int64)
+                    missing = np.flatnonzero(~_contains(known, keys))
+                    if len(missing):
+                        vectors = self.index.normalize(self.embedder([rows[i][1] for i in missing]))
+                        self.index.add(keys[missing], vectors)
+                        if (embedded + len(missing)) // 1000 > embedded // 1000:
+                            logger.info(f"Embedded {embedded + len(missing)} existing entries "
+                                        f"for semantic dedup...")
+                        embedded += len(missing)
+                    last_id = rows[-1][0]
+                    self.index.set_backfilled_id(last_id)
+        return embedded
+
+
+def get_semantic_deduplicator(db_path, settings):
+    """
+    Set up semantic deduplication for a job, if the settings turn it on.
+
+    The index is kept in <db_path>.embeddings and is first brought up to
+    date with the database (see SemanticDeduplicator.backfill).
+
+    :param db_path: Path to the SQLite database
+    :param settings: Settings snapshot of the job
+    :return: A SemanticDeduplicator, or None when semantic_dedup is off
+    """
+    if not settings.get("semantic_dedup", False):
+        return None
+    from ..utils.embeddings import DEFAULT_EMBEDDING_MODEL, load_embedder
+
+    model = settings.get("embedding_model", DEFAULT_EMBEDDING_MODEL)
+    if settings.get("embedder", "ollama") != "ollama":
+        model = settings["embedder"]
+    deduplicator = SemanticDeduplicator(
+        EmbeddingIndex(f"{db_path}.embeddings", model), load_embedder(settings),
+        settings.get("semantic_dedup_threshold", DEFAULT_THRESHOLD))
+    try:
+        embedded = deduplicator.backfill(db_path)
+        if embedded:
+            logger.info(f"Embedded {embedded} existing entries for semantic dedup")
+    except Exception as e:
+        # The watermark keeps what was done; the next job carries on from there
+        logger.warning(f"Semantic dedup backfill stopped early: {str(e)}")
+    return deduplicator
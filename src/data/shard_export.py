@@ -0,0 +1,188 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .database_operations import get_db_connection, get_cursor, iter_qa_pairs, to_jsonl_line
+
+logger = logging.getLogger(__name__)
+
+SHARD_EXTENSIONS = {
+    'gzip': '.jsonl.gz',
+    'zstd': '.jsonl.zst',
+    'none': '.jsonl',
+}
+
+
+class _HashingWriter:
+    """File wrapper that computes the SHA-256 of everything written through it."""
+
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.f.write(data)
+
+    def flush(self):
+        self.f.flush()
+
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            "zstd compression requires the 'zstandard' package (pip install zstandard)")
+    return zstandard
+
+
+def _open_compressed(raw, compression, level):
+    if compression == 'gzip':
+        # mtime=0 keeps the output, and so its checksum, reproducible
+        return gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=level or 6, mtime=0)
+    if compression == 'zstd':
+        zstandard = _import_zstandard()
+        return zstandard.ZstdCompressor(level=level or 3).stream_writer(raw, closefd=False)
+    return raw
+
+
+def _snapshot_ranges(db_path, num_shards):
+    """
+    Take the rows present now and split them into id ranges of roughly equal size.
+
+    The row count, the boundaries and the highest id come from one read
+    transaction, and the last range ends at that id. Rows are never updated
+    or deleted once committed and new rows always get higher ids, so every
+    worker reads exactly the rows counted here, even while a job is writing.
+
+    :return: Tuple of (list of (start_id, end_id) tuples, number of rows)
+    """
+    with get_db_connection(db_path) as conn:
+        with get_cursor(conn) as cursor:
+            cursor.execute("BEGIN")
+            cursor.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM qa_pairs")
+            total_rows, max_id = cursor.fetchone()
+            num_shards = max(1, min(num_shards, total_rows))
+
+            boundaries = []
+            for k in range(1, num_shards):
+                cursor.execute("SELECT id FROM qa_pairs ORDER BY id LIMIT 1 OFFSET ?",
+                               (k * total_rows // num_shards,))
+                boundaries.append(cursor.fetchone()[0])
+            conn.rollback()
+
+    starts = [None] + boundaries
+    ends = boundaries + [max_id + 1]
+    return list(zip(starts, ends)), total_rows
+
+
+def compute_shard_ranges(db_path, num_shards):
+    """
+    Split the rows of the qa_pairs table into id ranges holding roughly equal row counts.
+
+    :param db_path: Path to the SQLite database
+    :param num_shards: Number of ranges to create
+    :return: List of (start_id, end_id) tuples; start is inclusive (None
+        for the first range), end is exclusive, and the last range ends just
+        past the highest id present when this was called
+    """
+    return _snapshot_ranges(db_path, num_shards)[0]
+
+
+def _write_shard(db_path, shard_path, compression, level, start_id, end_id, chunk_size):
+    # Runs in a worker process, so it opens its own connection
+    rows = 0
+    with open(shard_path, 'wb') as raw:
+        hashing = _HashingWriter(raw)
+        stream = _open_compressed(hashing, compression, level)
+        with get_db_connection(db_path) as conn:
+            with get_cursor(conn) as cursor:
+                buffer = []
+                for qa_pair in iter_qa_pairs(cursor, chunk_size, start_id, end_id):
+                    buffer.append(to_jsonl_line(qa_pair))
+                    rows += 1
+                    if len(buffer) >= chunk_size:
+                        stream.write(''.join(buffer).encode('utf-8'))
+                        buffer = []
+                if buffer:
+                    stream.write(''.join(buffer).encode('utf-8'))
+        if stream is not hashing:
+            stream.close()
+
+    return {
+        "file": os.path.basename(shard_path),
+        "rows": rows,
+        "bytes": hashing.size,
+        "sha256": hashing.sha256.hexdigest(),
+        "start_id": start_id,
+        "end_id": end_id,
+    }
+
+
+def export_sharded_jsonl(db_path, output_dir, progress_callback, num_shards=8, compression='gzip',
+                         level=None, max_workers=None, prefix='qa_dataset', chunk_size=1000):
+    """
+    Export all QA pairs as compressed JSONL shards, written in parallel.
+
+    The rows present when the export starts are partitioned into id ranges
+    of roughly equal size, and each shard is compressed by its own worker
+    process; rows committed meanwhile are left for the next export. A manifest.json listing row
+    counts and SHA-256 checksums of every shard is written next to them.
+
+    :param db_path: Path to the SQLite database
+    :param output_dir: Directory to write the shards and manifest to
+    :param progress_callback: Function to call to update progress
+    :param num_shards: Number of shards to write (default: 8)
+    :param compression: 'gzip', 'zstd' or 'none' (default: 'gzip')
+    :param level: Compression level (default: the codec's default)
+    :param max_workers: Number of worker processes (default: one per CPU)
+    :param prefix: File name prefix for the shards
+    :param chunk_size: Number of rows to fetch and compress at a time
+    :return: The manifest as a dictionary
+    """
+    if compression not in SHARD_EXTENSIONS:
+        raise ValueError(f"Unsupported compression: {compression}")
+    if compression == 'zstd':
+        # Fail before any worker starts if the codec is missing
+        _import_zstandard()
+
+    os.makedirs(output_dir, exist_ok=True)
+    ranges, total_rows = _snapshot_ranges(db_path, num_shards)
+
+    extension = SHARD_EXTENSIONS[compression]
+    shard_paths = [os.path.join(output_dir, f"{prefix}-{i:05d}-of-{len(ranges):05d}{extension}")
+                   for i in range(len(ranges))]
+
+    shards = [None] * len(ranges)
+    exported = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_write_shard, db_path, shard_path, compression, level,
+                            start_id, end_id, chunk_size): i
+            for i, (shard_path, (start_id, end_id)) in enumerate(zip(shard_paths, ranges))
+        }
+        for future in as_completed(futures):
+            shard = future.result()
+            shards[futures[future]] = shard
+            exported += shard["rows"]
+            progress_callback(exported, total_rows)
+            logger.info(f"Wrote shard {shard['file']} ({shard['rows']} entries)")
+
+    manifest = {
+        "format": "jsonl",
+        "compression": compression,
+        "total_rows": sum(shard["rows"] for shard in shards),
+        "num_shards": len(shards),
+        "shards": shards,
+    }
+    with open(os.path.join(output_dir, "manifest.json"), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4)
+
+    logger.info(
+        f"Successfully exported {manifest['total_rows']} entries to {len(shards)} shards in {output_dir}")
+    return manifest
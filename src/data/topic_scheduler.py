@@ -0,0 +1,228 @@
+import logging
+import random
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+class YieldStats:
+    """Counts of what the requests for one topic or prompt template produced."""
+
+    def __init__(self):
+        self.requests = 0
+        self.pairs = 0
+        self.accepted = 0
+        self.failed = 0
+
+    def add(self, pairs, accepted, failed):
+        self.requests += 1
+        self.pairs += pairs
+        self.accepted += accepted
+        self.failed += failed
+
+    @property
+    def accepted_per_request(self):
+        return self.accepted / self.requests if self.requests else 0.0
+
+    @property
+    def acceptance_rate(self):
+        return self.accepted / self.pairs if self.pairs else 0.0
+
+    def as_dict(self):
+        return {"requests": self.requests, "pairs": self.pairs, "accepted": self.accepted,
+                "failed": self.failed, "accepted_per_request": self.accepted_per_request,
+                "acceptance_rate": self.acceptance_rate}
+
+
+class TopicScheduler:
+    """
+    Chooses the topic of each generation request, uniformly at random.
+
+    Subclasses change how a topic is chosen by overriding _choose(). Every
+    scheduler tracks yield per topic and per prompt template, and stops
+    choosing a topic once it has met its quota, counting the pairs that
+    requests in flight may still add.
+
+    :param topics: Topics to choose from
+    :param quotas: Optional dict of topic -> maximum number of pairs to accept
+    :param rng: Optional random.Random, for repeatable choices
+    """
+
+    def __init__(self, topics, quotas=None, rng=None):
+        self.topics = list(dict.fromkeys(topics))
+        self.quotas = {topic: int(quota) for topic, quota in (quotas or {}).items()
+                       if topic in self.topics}
+        self.rng = rng or random.Random()
+        self.stats = {topic: YieldStats() for topic in self.topics}
+        self.template_stats = {}
+        self._in_flight = Counter()
+        self._lock = threading.Lock()
+
+    def remaining_quota(self, topic):
+        """
+        Return how many more pairs a topic may accept, or None if it has no quota.
+        """
+        with self._lock:
+            if topic not in self.quotas:
+                return None
+            return max(0, self.quotas[topic] - self.stats[topic].accepted)
+
+    def next_topic(self, pairs=1):
+        """
+        Choose the topic of the next request and count it as in flight.
+
+        :param pairs: Number of pairs the request asks for
+        :return: A topic, or None once every topic has met its quota
+        """
+        with self._lock:
+            candidates = [topic for topic in self.topics
+                          if topic not in self.quotas
+                          or self.stats[topic].accepted + self._in_flight[topic] < self.quotas[topic]]
+            if not candidates:
+                return None
+            topic = self._choose(candidates)
+            self._in_flight[topic] += pairs
+            return topic
+
+    def record(self, topic, pairs, accepted, failed=0, template=None):
+        """
+        Report what a request chosen by next_topic() produced.
+
+        :param topic: The request's topic
+        :param pairs: Number of pairs the request asked for
+        :param accepted: Number of pairs that were stored
+        :param failed: Number of pairs that were unusable (not duplicates)
+        :param template: Prompt template id the request used, if known
+        """
+        with self._lock:
+            self._in_flight[topic] = max(0, self._in_flight[topic] - pairs)
+            self.stats[topic].add(pairs, accepted, failed)
+            if template is not None:
+                self.template_stats.setdefault(template, YieldStats()).add(pairs, accepted, failed)
+            self._update(topic, pairs, accepted)
+
+    def release(self, topic, pairs):
+        """
+        Report that a request chosen by next_topic() failed to get a response.
+
+        Transport errors and timeouts say nothing about the topic, so
+        the request only stops counting as in flight; its yield is not recorded.
+
+        :param topic: The request's topic
+        :param pairs: Number of pairs the request asked for
+        """
+        with self._lock:
+            self._in_flight[topic] = max(0, self._in_flight[topic] - pairs)
+
+    def _choose(self, candidates):
+        return self.rng.choice(candidates)
+
+    def _update(self, topic, pairs, accepted):
+        pass
+
+    def report(self):
+        """
+        Summarize yield so far.
+
+        :return: Dict with "topics" and "templates", each mapping a name to
+            its counts, accepted pairs per request and acceptance rate
+        """
+        with self._lock:
+            return {"topics": {topic: stats.as_dict() for topic, stats in self.stats.items()},
+                    "templates": {template: stats.as_dict()
+                                  for template, stats in self.template_stats.items()}}
+
+
+class BanditTopicScheduler(TopicScheduler):
+    """
+    Steers requests toward the topics whose pairs are still being accepted.
+
+    Thompson sampling over each topic's acceptance rate: every request goes
+    to the topic with the highest draw from Beta(1 + accepted, 1 + rejected).
+    Counts decay by ``discount`` on each update, so a topic that saturates
+    and starts producing duplicates loses its share within a few dozen
+    requests, while topics that are rarely chosen still get retried.
+
+    :param topics: Topics to choose from
+    :param quotas: Optional dict of topic -> maximum number of pairs to accept
+    :param discount: Weight kept by past observations on each update
+    :param rng: Optional random.Random, for repeatable choices
+    """
+
+    def __init__(self, topics, quotas=None, discount=0.95, rng=None):
+        super().__init__(topics, quotas, rng)
+        self.discount = discount
+        self._accepted = dict.fromkeys(self.topics, 0.0)
+        self._rejected = dict.fromkeys(self.topics, 0.0)
+
+    def _choose(self, candidates):
+        return max(candidates, key=lambda topic: self.rng.betavariate(
+            1 + self._accepted[topic], 1 + self._rejected[topic]))
+
+    def _update(self, topic, pairs, accepted):
+        self._accepted[topic] = self._accepted[topic] * self.discount + accepted
+        self._rejected[topic] = self._rejected[topic] * self.discount + max(0, pairs - accepted)
+
+
+SCHEDULERS = {
+    "random": TopicScheduler,
+    "bandit": BanditTopicScheduler,
+}
+
+
+def make_topic_scheduler(topics, settings, quotas=None):
+    """
+    Create the topic scheduler named by the topic_scheduler setting.
+
+    :param topics: Topics to choose from
+    :param settings: Settings snapshot of the job
+    :param quotas: Per-topic quotas (default: the topic_quotas setting)
+    :return: A TopicScheduler
+    """
+    name = settings.get("topic_scheduler", "bandit")
+    if name not in SCHEDULERS:
+        logger.warning(f"Unknown topic scheduler {name!r}; using 'bandit'")
+        name = "bandit"
+    if quotas is None:
+        quotas = settings.get("topic_quotas") or {}
+    return SCHEDULERS[name](topics, quotas)
+
+
+def parse_topics(text):
+    """
+    Parse a comma-separated topic list, where topics may carry a quota.
+
+    "math:100, python, science:50" gives the topics math, python and
+    science, with at most 100 pairs about math and 50 about science.
+
+    :param text: The topic list
+    :return: Tuple of (list of topics, dict of topic -> quota)
+    :raises ValueError: If a quota is not a whole number
+    """
+    topics, quotas = [], {}
+    for item in text.split(","):
+        topic, _, quota = item.partition(":")
+        topic = topic.strip()
+        if not topic:
+            continue
+        topics.append(topic)
+        if quota.strip():
+            try:
+                quotas[topic] = int(quota)
+            except ValueError:
+                raise ValueError(f"Quota for topic '{topic}' must be a whole number, not '{quota.strip()}'")
+    return topics, quotas
+
+
+def log_yield_report(scheduler):
+    """Log a scheduler's per-topic and per-template yield, best first."""
+    report = scheduler.report()
+    for kind, rows in (("Topic", report["topics"]), ("Template", report["templates"])):
+        for name, stats in sorted(rows.items(), key=lambda item: -item[1]["accepted_per_request"]):
+            if not stats["requests"]:
+                continue
+            logger.info(
+                f"{kind} yield '{name}': {stats['accepted']} of {stats['pairs']} pairs accepted "
+                f"({stats['acceptance_rate']:.0%}) over {stats['requests']} requests, "
+                f"{stats['accepted_per_request']:.2f} accepted per request")
@@ -0,0 +1,362 @@
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from .database_operations import create_table
+from ..utils.metrics import WORK_UNITS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_UNIT_SIZE = 50
+DEFAULT_LEASE_SECONDS = 300
+# A unit that has been claimed this many times without being finished is given up on
+MAX_ATTEMPTS = 5
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class WorkUnit:
+    """A leased unit of work: generate ``count`` pairs about ``topic``."""
+
+    def __init__(self, unit_id, topic, count, attempts, lease_owner, lease_expires):
+        self.id = unit_id
+        self.topic = topic
+        self.count = count
+        self.attempts = attempts
+        self.lease_owner = lease_owner
+        self.lease_expires = lease_expires
+
+    def __repr__(self):
+        return f"WorkUnit(id={self.id}, topic={self.topic!r}, count={self.count})"
+
+
+@contextmanager
+def _queue_connection(db_path):
+    # Autocommit mode, so every claim can take the write lock up front with BEGIN IMMEDIATE
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def default_worker_id():
+    """Return an id that is unique across the machines sharing a database."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def plan_work_units(topics, total, unit_size=DEFAULT_UNIT_SIZE, quotas=None):
+    """
+    Split a job into (topic, count) units.
+
+    The total is shared out evenly between the topics; a topic with a
+    quota never gets more than its quota, and what it can't take goes to
+    the others. Each topic's share is then cut into units of at most
+    unit_size pairs.
+
+    :param topics: Topics to generate questions about
+    :param total: Number of pairs wanted in total
+    :param unit_size: Maximum number of pairs per unit
+    :param quotas: Optional dict of topic -> maximum number of pairs
+    :return: List of (topic, count) tuples
+    """
+    topics = list(dict.fromkeys(topics))
+    quotas = quotas or {}
+    shares = dict.fromkeys(topics, 0)
+    remaining = total
+    open_topics = [topic for topic in topics if quotas.get(topic, 1) > 0]
+    while remaining > 0 and open_topics:
+        share, extra = divmod(remaining, len(open_topics))
+        for i, topic in enumerate(list(open_topics)):
+            grant = share + (1 if i < extra else 0)
+            if topic in quotas:
+                grant = min(grant, quotas[topic] - shares[topic])
+            shares[topic] += grant
+            remaining -= grant
+            if topic in quotas and shares[topic] >= quotas[topic]:
+                open_topics.remove(topic)
+
+    unit_size = max(1, int(unit_size))
+    units = []
+    for topic in topics:
+        for start in range(0, shares[topic], unit_size):
+            units.append((topic, min(unit_size, shares[topic] - start)))
+    return units
+
+
+def enqueue_work(db_path, topics, total, unit_size=DEFAULT_UNIT_SIZE, quotas=None):
+    """
+    Add a job's units of work to the database's work queue.
+
+    :param db_path: Path to the SQLite database
+    :param topics: Topics to generate questions about
+    :param total: Number of pairs wanted in total
+    :param unit_size: Maximum number of pairs per unit
+    :param quotas: Optional dict of topic -> maximum number of pairs
+    :return: Number of units added
+    """
+    create_table(db_path)
+    units = plan_work_units(topics, total, unit_size, quotas)
+    with _queue_connection(db_path) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany("""INSERT INTO work_queue (topic, count, status, created_at, updated_at)
+                            VALUES (?, ?, 'pending', datetime('now'), datetime('now'))""", units)
+        conn.execute("COMMIT")
+    logger.info(f"Queued {len(units)} units of work for {sum(count for _, count in units)} pairs")
+    return len(units)
+
+
+def claim_work(db_path, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """
+    Lease the oldest unit that is pending or whose lease has expired.
+
+    The read and the update happen under SQLite's write lock, so two
+    workers can never lease the same unit.
+
+    Lease times are wall-clock seconds from the clock of the worker that
+    wrote them, and expiry is judged by the claiming worker's clock: SQLite
+    runs inside each worker, so there is no server clock to use instead.
+    The holder renews once a third of its lease has passed, which leaves at
+    least two thirds of it to run; workers' clocks may therefore differ by
+    up to about half of lease_seconds before a live lease is re-issued early.
+
+    :param db_path: Path to the SQLite database
+    :param worker_id: Id of the claiming worker
+    :param lease_seconds: How long the lease lasts unless renewed
+    :return: A WorkUnit, or None if nothing can be claimed right now
+    """
+    now = time.time()
+    with _queue_connection(db_path) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("""SELECT id, topic, count, attempts, status, lease_owner FROM work_queue
+                                  WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)
+                                  ORDER BY id LIMIT 1""", (now,)).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            unit_id, topic, count, attempts, status, previous_owner = row
+            if status == LEASED:
+                logger.warning(f"Lease of work unit {unit_id} held by {previous_owner} expired; re-issuing it")
+            conn.execute("""UPDATE work_queue
+                            SET status = 'leased', lease_owner = ?, lease_expires = ?,
+                                attempts = attempts + 1, updated_at = datetime('now')
+                            WHERE id = ?""", (worker_id, now + lease_seconds, unit_id))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    return WorkUnit(unit_id, topic, count, attempts + 1, worker_id, now + lease_seconds)
+
+
+def renew_lease(db_path, unit, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """
+    Extend a lease that is still held.
+
+    :param db_path: Path to the SQLite database
+    :param unit: WorkUnit returned by claim_work
+    :param lease_seconds: New lease duration, from now
+    :return: False if the lease was lost, e.g. it expired and was re-issued
+    """
+    expires = time.time() + lease_seconds
+    with _queue_connection(db_path) as conn:
+        cursor = conn.execute("""UPDATE work_queue SET lease_expires = ?, updated_at = datetime('now')
+                                 WHERE id = ? AND status = 'leased' AND lease_owner = ?""",
+                              (expires, unit.id, unit.lease_owner))
+        renewed = cursor.rowcount == 1
+    if renewed:
+        unit.lease_expires = expires
+    return renewed
+
+
+def produced_for_unit(db_path, unit_id):
+    """Return how many stored pairs were generated for a unit."""
+    with _queue_connection(db_path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM qa_pairs WHERE work_unit_id = ?", (unit_id,)).fetchone()[0]
+
+
+def finish_work(db_path, unit, produced, stopped=False):
+    """
+    Give a leased unit back: done once it produced its count, otherwise
+    pending again (or failed after MAX_ATTEMPTS claims).
+
+    :param db_path: Path to the SQLite database
+    :param unit: WorkUnit returned by claim_work
+    :param produced: Number of pairs stored for the unit so far
+    :param stopped: The worker was asked to stop, which doesn't count as a failed attempt
+    :return: The unit's new status, or None if the lease had already been lost
+    """
+    if produced >= unit.count:
+        status = DONE
+    elif unit.attempts >= MAX_ATTEMPTS and not stopped:
+        status = FAILED
+    else:
+        status = PENDING
+    with _queue_connection(db_path) as conn:
+        cursor = conn.execute("""UPDATE work_queue
+                                 SET status = ?, produced = ?, lease_owner = NULL, lease_expires = NULL,
+                                     updated_at = datetime('now')
+                                 WHERE id = ? AND status = 'leased' AND lease_owner = ?""",
+                              (status, produced, unit.id, unit.lease_owner))
+        if cursor.rowcount != 1:
+            return None
+    if status == FAILED:
+        logger.error(f"Giving up on work unit {unit.id} ({unit.topic}) after {unit.attempts} attempts")
+    return status
+
+
+def queue_status(db_path):
+    """
+    Summarize the work queue.
+
+    :param db_path: Path to the SQLite database
+    :return: Dict of status -> {"units": n, "pairs": pairs wanted, "produced": pairs stored};
+        empty if the database has no work queue
+    """
+    with _queue_connection(db_path) as conn:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'work_queue'").fetchone():
+            return {}
+        rows = conn.execute("""SELECT w.status, COUNT(*), SUM(w.count),
+                                      SUM((SELECT COUNT(*) FROM qa_pairs q WHERE q.work_unit_id = w.id))
+                               FROM work_queue w GROUP BY w.status""").fetchall()
+    return {status: {"units": units, "pairs": pairs, "produced": produced}
+            for status, units, pairs, produced in rows}
+
+
+def _has_live_leases(db_path):
+    with _queue_connection(db_path) as conn:
+        return conn.execute("SELECT 1 FROM work_queue WHERE status = 'leased' LIMIT 1").fetchone() is not None
+
+
+def _record_queue_depths(db_path):
+    with _queue_connection(db_path) as conn:
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM work_queue GROUP BY status").fetchall())
+    for status in (PENDING, LEASED, DONE, FAILED):
+        WORK_UNITS.set(counts.get(status, 0), status=status)
+
+
+class _LeaseKeeper(threading.Thread):
+    """
+    Renews a unit's lease while it is being worked on.
+
+    Sets unit_stop when the worker is asked to stop or the lease is lost,
+    so generation for the unit winds down either way.
+    """
+
+    def __init__(self, db_path, unit, lease_seconds, stop_event, unit_stop):
+        super().__init__(name=f"lease-{unit.id}", daemon=True)
+        self.db_path = db_path
+        self.unit = unit
+        self.lease_seconds = lease_seconds
+        self.stop_event = stop_event
+        self.unit_stop = unit_stop
+        self.finished = threading.Event()
+        self.lost = False
+
+    def run(self):
+        renew_every = max(1.0, self.lease_seconds / 3)
+        next_renewal = time.monotonic() + renew_every
+        while not self.finished.wait(0.5):
+            if self.stop_event.is_set():
+                self.unit_stop.set()
+            if time.monotonic() < next_renewal:
+                continue
+            try:
+                renewed = renew_lease(self.db_path, self.unit, self.lease_seconds)
+            except sqlite3.Error as e:
+                # Try again next tick; the lease has time left
+                logger.warning(f"Could not renew the lease of work unit {self.unit.id}: {str(e)}")
+                continue
+            if not renewed:
+                logger.warning(f"Lost the lease of work unit {self.unit.id}; abandoning it")
+                self.lost = True
+                self.unit_stop.set()
+                return
+            next_renewal = time.monotonic() + renew_every
+
+
+def run_worker(db_path, api_choice, stop_event, concurrency=1, engine='threads', pairs_per_request=None,
+               worker_id=None, lease_seconds=DEFAULT_LEASE_SECONDS, progress_callback=None,
+               poll_interval=5.0):
+    """
+    Work through a database's work queue until it is empty.
+
+    Any number of workers, in this process or others, on this machine or
+    on others sharing the database file, can run against the same queue.
+    Each unit is generated with create_dataset while a background thread
+    renews its lease; the units share one GenerationSession, so the
+    writer, the request engine and the recent-question cache are set up
+    once per worker. A worker that dies stops renewing, so its unit is
+    re-issued once the lease expires; pairs it already stored count
+    towards the unit, since every pair records the unit that produced it.
+
+    Since workers on several machines can only share the database over a
+    network file system, where WAL doesn't work, the database is used in
+    rollback-journal ("DELETE") mode unless sqlite_journal_mode is set.
+
+    When nothing is claimable but other workers still hold leases, the
+    worker waits, in case one of them dies and its unit has to be picked up.
+
+    :param db_path: Path to the SQLite database
+    :param api_choice: Choice of API to use ('ollama' or 'openai')
+    :param stop_event: Threading event to signal when to stop; the current
+        unit is handed back to the queue
+    :param concurrency: Maximum number of API requests in flight
+    :param engine: 'threads' or 'asyncio' (see create_dataset)
+    :param pairs_per_request: Number of QA pairs to ask for in each API request
+    :param worker_id: Id recorded on leases (default: host name and pid)
+    :param lease_seconds: Lease duration; renewed every third of it
+    :param progress_callback: Optional function called with (current, total) for each unit
+    :param poll_interval: Seconds to wait between claims while others hold leases
+    :return: Dict with the number of units finished and pairs generated
+    """
+    from .dataset_creator import GenerationSession, create_dataset
+    from ..utils.settings import get_settings
+
+    worker_id = worker_id or default_worker_id()
+    settings = get_settings()
+    if settings.get("semantic_dedup", False):
+        # The embedding index files are appended to by one process at a time only
+        logger.warning("Semantic dedup is not shared between workers; it is off for this worker")
+        settings = dict(settings, semantic_dedup=False)
+    if not settings.get("sqlite_journal_mode"):
+        settings = dict(settings, sqlite_journal_mode="DELETE")
+
+    summary = {"units": 0, "pairs": 0}
+    with GenerationSession(db_path, concurrency, settings) as session:
+        while not stop_event.is_set():
+            unit = claim_work(db_path, worker_id, lease_seconds)
+            _record_queue_depths(db_path)
+            if unit is None:
+                if not _has_live_leases(db_path):
+                    break
+                stop_event.wait(poll_interval)
+                continue
+
+            remaining = unit.count - produced_for_unit(db_path, unit.id)
+            logger.info(f"Worker {worker_id} leased work unit {unit.id}: "
+                        f"{remaining} of {unit.count} pairs about '{unit.topic}'")
+            unit_stop = threading.Event()
+            keeper = _LeaseKeeper(db_path, unit, lease_seconds, stop_event, unit_stop)
+            keeper.start()
+            try:
+                if remaining > 0:
+                    summary["pairs"] += create_dataset(
+                        remaining, db_path, [unit.topic], progress_callback or (lambda current, total: None),
+                        unit_stop, api_choice, concurrency, engine, pairs_per_request,
+                        job_metadata={"work_unit_id": unit.id}, session=session)
+            finally:
+                keeper.finished.set()
+                keeper.join()
+                if not keeper.lost:
+                    status = finish_work(db_path, unit, produced_for_unit(db_path, unit.id),
+                                         stopped=stop_event.is_set())
+                    if status == DONE:
+                        summary["units"] += 1
+    return summary
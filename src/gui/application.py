@@ -2,10 +2,14 @@ import ttkbootstrap as ttk
 from ttkbootstrap.scrolled import ScrolledText
 from ttkbootstrap.dialogs import Messagebox
 from ..utils.logging_config import QueueHandler
+from ..utils.metrics import MetricsExporters
+from ..utils.settings import get_settings
 from ..data.database_operations import export_to_json
-from ..data.dataset_creator import create_dataset
+from ..data.job_journal import COMPLETED, create_job, get_job, list_jobs, run_job
+from ..data.topic_scheduler import parse_topics
 from .settings_page import SettingsPage
 from .openai_settings_page import OpenAISettingsPage
+import os
 import queue
 import threading
 import tkinter.filedialog as filedialog
@@ -44,6 +48,13 @@ class Application(ttk.Window):
 
         self.bind("<<SettingsUpdated>>", self.on_settings_updated)
 
+        # Metrics endpoint and snapshot file, if configured in settings.json
+        try:
+            self.metrics = MetricsExporters.from_settings(get_settings())
+        except OSError as e:
+            self.logger.warning(f"Could not start the metrics endpoint: {str(e)}")
+            self.metrics = MetricsExporters()
+
         # Set up periodic memory check
         self.after(60000, self.check_memory_usage)  # Check every 60 seconds
 
@@ -60,8 +71,8 @@ class Application(ttk.Window):
         self.num_entries.insert(0, "20")
 
         # Topics
-        ttk.Label(self.main_page, text="Topics (comma-separated):").grid(row=1,
-                                                                         column=0, padx=5, pady=5, sticky="w")
+        ttk.Label(self.main_page, text="Topics (comma-separated, optional topic:quota):").grid(
+            row=1, column=0, padx=5, pady=5, sticky="w")
         self.topics = ttk.Entry(self.main_page)
         self.topics.grid(row=1, column=1, columnspan=2,
                          padx=5, pady=5, sticky="ew")
@@ -93,40 +104,63 @@ class Application(ttk.Window):
             self.main_page, textvariable=self.api_var, values=["Ollama", "OpenAI"])
         self.api_dropdown.grid(row=4, column=1, padx=5, pady=5, sticky="ew")
 
+        # Concurrent requests
+        ttk.Label(self.main_page, text="Concurrent requests:").grid(
+            row=5, column=0, padx=5, pady=5, sticky="w")
+        self.concurrency = ttk.Spinbox(self.main_page, from_=1, to=64, width=5)
+        self.concurrency.grid(row=5, column=1, padx=5, pady=5, sticky="w")
+        self.concurrency.set(1)
+        self.asyncio_var = ttk.BooleanVar(value=False)
+        ttk.Checkbutton(self.main_page, text="Use asyncio engine",
+                        variable=self.asyncio_var).grid(row=5, column=2, padx=5, pady=5, sticky="w")
+
         # Generate and Stop buttons
         self.generate_button = ttk.Button(
             self.main_page, text="Generate Dataset", command=self.generate_dataset, style='success.TButton')
         self.generate_button.grid(
-            row=5, column=0, columnspan=2, padx=5, pady=20, sticky="ew")
+            row=6, column=0, columnspan=2, padx=5, pady=20, sticky="ew")
 
         self.stop_button = ttk.Button(self.main_page, text="Stop Generation",
                                       command=self.stop_generation, state="disabled", style='danger.TButton')
-        self.stop_button.grid(row=5, column=2, padx=5, pady=20, sticky="ew")
+        self.stop_button.grid(row=6, column=2, padx=5, pady=20, sticky="ew")
+
+        # Jobs of the current database that stopped, failed or crashed part way;
+        # the list is refreshed whenever it is opened
+        ttk.Label(self.main_page, text="Resumable jobs:").grid(
+            row=7, column=0, padx=5, pady=5, sticky="w")
+        self.resumable_jobs = {}
+        self.job_var = ttk.StringVar()
+        self.job_dropdown = ttk.Combobox(
+            self.main_page, textvariable=self.job_var, state="readonly", postcommand=self.refresh_jobs)
+        self.job_dropdown.grid(row=7, column=1, padx=5, pady=5, sticky="ew")
+        self.resume_button = ttk.Button(self.main_page, text="Resume Job", command=self.resume_job,
+                                        style='Outline.TButton')
+        self.resume_button.grid(row=7, column=2, padx=5, pady=5, sticky="ew")
 
         # Export button
         self.export_button = ttk.Button(
             self.main_page, text="Export to JSON", command=self.export_dataset, style='info.TButton')
         self.export_button.grid(
-            row=6, column=0, columnspan=3, padx=5, pady=5, sticky="ew")
+            row=8, column=0, columnspan=3, padx=5, pady=5, sticky="ew")
 
         # Progress bar
         self.progress_var = ttk.DoubleVar()
         self.progress_bar = ttk.Progressbar(
             self.main_page, orient="horizontal", length=600, mode="determinate", variable=self.progress_var)
         self.progress_bar.grid(
-            row=7, column=0, columnspan=3, padx=5, pady=5, sticky="ew")
+            row=9, column=0, columnspan=3, padx=5, pady=5, sticky="ew")
 
         # Status label
         self.status_var = ttk.StringVar()
         ttk.Label(self.main_page, textvariable=self.status_var).grid(
-            row=8, column=0, columnspan=3, padx=5, pady=5, sticky="w")
+            row=10, column=0, columnspan=3, padx=5, pady=5, sticky="w")
 
         # Log output
         self.log_output = ScrolledText(self.main_page, height=10)
-        self.log_output.grid(row=9, column=0, columnspan=3,
+        self.log_output.grid(row=11, column=0, columnspan=3,
                              padx=5, pady=5, sticky="nsew")
 
-        self.main_page.rowconfigure(9, weight=1)
+        self.main_page.rowconfigure(11, weight=1)
 
     def toggle_theme(self):
         if self.style.theme_use() == 'litera':
@@ -155,25 +189,20 @@ class Application(ttk.Window):
         try:
             num_entries = int(self.num_entries.get())
             db_path = self.db_path.get()
-            topics = [topic.strip() for topic in self.topics.get().split(",")]
+            topics, quotas = parse_topics(self.topics.get())
             api_choice = self.api_var.get().lower()
+            concurrency = int(self.concurrency.get())
+            engine = 'asyncio' if self.asyncio_var.get() else 'threads'
 
             if not db_path or not topics:
                 raise ValueError(
                     "Please provide valid database path and topics.")
+            if concurrency < 1:
+                raise ValueError("Concurrent requests must be at least 1.")
 
-            self.stop_event.clear()
-            self.generate_button.config(state="disabled")
-            self.stop_button.config(state="normal")
-
-            self.progress_var.set(0)
-            self.status_var.set("Generating dataset...")
-
-            self.generate_thread = threading.Thread(
-                target=self.generate_dataset_thread,
-                args=(num_entries, db_path, topics, api_choice)
-            )
-            self.generate_thread.start()
+            self.start_job_thread(
+                self.generate_dataset_thread,
+                (num_entries, db_path, topics, api_choice, concurrency, engine, quotas))
 
         except ValueError as e:
             Messagebox.show_error(str(e), "Input Error")
@@ -181,21 +210,67 @@ class Application(ttk.Window):
             self.logger.error(f"Error starting dataset generation: {str(e)}")
             Messagebox.show_error(f"An error occurred: {str(e)}", "Error")
 
-    def generate_dataset_thread(self, num_entries, db_path, topics, api_choice):
+    def start_job_thread(self, target, args):
+        self.stop_event.clear()
+        self.generate_button.config(state="disabled")
+        self.resume_button.config(state="disabled")
+        self.stop_button.config(state="normal")
+
+        self.progress_var.set(0)
+        self.status_var.set("Generating dataset...")
+
+        self.generate_thread = threading.Thread(target=target, args=args)
+        self.generate_thread.start()
+
+    def refresh_jobs(self):
+        db_path = self.db_path.get()
+        try:
+            jobs = list_jobs(db_path, resumable_only=True) if os.path.exists(db_path) else []
+        except Exception as e:
+            self.logger.error(f"Could not list the jobs in {db_path}: {str(e)}")
+            jobs = []
+        self.resumable_jobs = {
+            f"#{job['id']} {', '.join(job['topics'])}: {job['committed']}/{job['total']} "
+            f"({job['status']}, {job['updated_at']})": job["id"]
+            for job in jobs}
+        self.job_dropdown.config(values=list(self.resumable_jobs))
+        if self.job_var.get() not in self.resumable_jobs:
+            self.job_var.set(next(iter(self.resumable_jobs), ""))
+
+    def resume_job(self):
+        self.refresh_jobs()
+        job_id = self.resumable_jobs.get(self.job_var.get())
+        if job_id is None:
+            Messagebox.show_info("There is no job to resume in this database.", "Resume Job")
+            return
+        self.start_job_thread(self.run_job_thread, (self.db_path.get(), job_id))
+
+    def generate_dataset_thread(self, num_entries, db_path, topics, api_choice, concurrency, engine,
+                                quotas=None):
+        try:
+            # Recorded first, so the job can be resumed if it is stopped or crashes
+            job_id = create_job(db_path, topics, num_entries, api_choice, concurrency, engine, quotas=quotas)
+        except Exception as e:
+            self.logger.error(f"Error in dataset generation: {str(e)}")
+            self.after(0, lambda: self.status_var.set(f"Error: {str(e)}"))
+            self.after(0, self.reset_ui)
+            return
+        self.run_job_thread(db_path, job_id)
+
+    def run_job_thread(self, db_path, job_id):
         try:
-            generated_count = create_dataset(
-                num_entries, db_path, topics, self.update_progress, self.stop_event, api_choice
-            )
+            generated_count = run_job(db_path, job_id, self.update_progress, self.stop_event)
+            job = get_job(db_path, job_id)
             if self.stop_event.is_set():
-                self.logger.info(
-                    f"Generation stopped. Generated {generated_count} entries.")
-                self.after(0, lambda: self.status_var.set(
-                    f"Generation stopped. Generated {generated_count} entries."))
+                message = (f"Generation stopped. Generated {generated_count} entries "
+                           f"(job #{job_id} can be resumed).")
+            elif job["status"] == COMPLETED:
+                message = f"Dataset generation complete! Generated {generated_count} entries."
             else:
-                self.logger.info(
-                    f"Dataset generation complete! Generated {generated_count} entries.")
-                self.after(0, lambda: self.status_var.set(
-                    f"Dataset generation complete! Generated {generated_count} entries."))
+                message = (f"Generation failed after {generated_count} entries "
+                           f"(job #{job_id} can be resumed).")
+            self.logger.info(message)
+            self.after(0, lambda: self.status_var.set(message))
         except Exception as e:
             self.logger.error(f"Error in dataset generation: {str(e)}")
             # Log the full stack trace
@@ -212,6 +287,7 @@ class Application(ttk.Window):
 
     def reset_ui(self):
         self.generate_button.config(state="normal")
+        self.resume_button.config(state="normal")
         self.stop_button.config(state="disabled")
 
     def export_dataset(self):
@@ -286,4 +362,5 @@ class Application(ttk.Window):
                 self.stop_event.set()
                 # Wait for up to 5 seconds for the thread to finish
                 self.generate_thread.join(timeout=5)
+        self.metrics.close()
         self.destroy()
@@ -1,6 +1,7 @@
 import ttkbootstrap as ttk
 import json
-import os
+from ..utils.settings import get_settings, settings_store
+from ..utils.rate_limiter import DEFAULT_OPENAI_RPM
 
 
 class OpenAISettingsPage(ttk.Frame):
@@ -48,24 +49,36 @@ class OpenAISettingsPage(ttk.Frame):
         self.max_tokens.set(self.settings.get("openai_max_tokens", 150))
         self.max_tokens.grid(row=3, column=1, padx=5, pady=5, sticky="w")
 
+        # Rate limits for your OpenAI tier
+        ttk.Label(self, text="Requests/min limit:").grid(
+            row=4, column=0, padx=5, pady=5, sticky="w")
+        self.rpm = ttk.Spinbox(self, from_=1, to=100000, width=8)
+        self.rpm.set(self.settings.get("openai_rpm", DEFAULT_OPENAI_RPM))
+        self.rpm.grid(row=4, column=1, padx=5, pady=5, sticky="w")
+
+        ttk.Label(self, text="Tokens/min limit (blank for none):").grid(
+            row=5, column=0, padx=5, pady=5, sticky="w")
+        self.tpm = ttk.Entry(self, width=10)
+        self.tpm.insert(0, str(self.settings.get("openai_tpm") or ""))
+        self.tpm.grid(row=5, column=1, padx=5, pady=5, sticky="w")
+
         # Save Button
         ttk.Button(self, text="Save Settings", command=self.save_settings,
-                   style='success.TButton').grid(row=4, column=0, columnspan=3, padx=5, pady=20)
+                   style='success.TButton').grid(row=6, column=0, columnspan=3, padx=5, pady=20)
 
     def update_temp_value(self, event=None):
         self.temp_value.set(f"{self.temperature.get():.2f}")
 
     def load_settings(self):
-        if os.path.exists("settings.json"):
-            with open("settings.json", "r") as f:
-                return json.load(f)
-        return {}
+        return dict(get_settings())
 
     def save_settings(self):
         settings = {
             "openai_model": self.model_var.get(),
             "openai_temperature": float(self.temperature.get()),
             "openai_max_tokens": int(self.max_tokens.get()),
+            "openai_rpm": int(self.rpm.get()),
+            "openai_tpm": int(self.tpm.get()) if self.tpm.get().strip() else None,
         }
         with open("settings.json", "r+") as f:
             existing_settings = json.load(f)
@@ -73,4 +86,5 @@ class OpenAISettingsPage(ttk.Frame):
             f.seek(0)
             json.dump(existing_settings, f, indent=4)
             f.truncate()
+        settings_store.invalidate()
         self.parent.event_generate("<<SettingsUpdated>>")
@@ -1,7 +1,8 @@
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 import json
-import os
+from ..utils.settings import get_settings, settings_store
+from ..utils.ollama_pool import parse_api_urls
 
 
 class SettingsPage(ttk.Frame):
@@ -68,26 +69,50 @@ class SettingsPage(ttk.Frame):
         ])
         self.model_combo.grid(row=4, column=1, padx=5, pady=5, sticky="ew")
 
-        # API URL
-        ttk.Label(self, text="API URL:").grid(
+        # API URL(s); requests are balanced across several Ollama hosts
+        ttk.Label(self, text="API URL(s), comma-separated:").grid(
             row=5, column=0, padx=5, pady=5, sticky="w")
-        self.api_url_var = ttk.StringVar(value=self.settings.get(
-            "api_url", "http://localhost:11434/api/generate"))
+        self.api_url_var = ttk.StringVar(value=", ".join(parse_api_urls(
+            self.settings.get("api_url", "http://localhost:11434/api/generate"))))
         self.api_url_entry = ttk.Entry(self, textvariable=self.api_url_var)
         self.api_url_entry.grid(row=5, column=1, padx=5, pady=5, sticky="ew")
 
+        # QA pairs asked for in each API request
+        ttk.Label(self, text="Pairs per Request:").grid(
+            row=6, column=0, padx=5, pady=5, sticky="w")
+        self.pairs_per_request = ttk.Spinbox(self, from_=1, to=20, width=5)
+        self.pairs_per_request.set(self.settings.get("pairs_per_request", 1))
+        self.pairs_per_request.grid(row=6, column=1, padx=5, pady=5, sticky="w")
+
+        # Structured output
+        ttk.Label(self, text="Structured Output:").grid(
+            row=7, column=0, padx=5, pady=5, sticky="w")
+        self.structured_output_var = ttk.BooleanVar(
+            value=self.settings.get("structured_output", False))
+        ttk.Checkbutton(self, variable=self.structured_output_var,
+                        text="Request JSON responses").grid(row=7, column=1, padx=5, pady=5, sticky="w")
+
+        # Semantic deduplication
+        ttk.Label(self, text="Semantic Dedup:").grid(
+            row=8, column=0, padx=5, pady=5, sticky="w")
+        self.semantic_dedup_var = ttk.BooleanVar(
+            value=self.settings.get("semantic_dedup", False))
+        ttk.Checkbutton(self, variable=self.semantic_dedup_var,
+                        text="Reject paraphrased questions (needs numpy)").grid(
+            row=8, column=1, padx=5, pady=5, sticky="w")
+
         # Dark Mode Toggle
         ttk.Label(self, text="Dark Mode:").grid(
-            row=6, column=0, padx=5, pady=5, sticky="w")
+            row=9, column=0, padx=5, pady=5, sticky="w")
         self.dark_mode_var = ttk.BooleanVar(
             value=self.settings.get("dark_mode", False))
         self.dark_mode_toggle = ttk.Checkbutton(
             self, variable=self.dark_mode_var, command=self.toggle_theme, text="Enable Dark Mode")
-        self.dark_mode_toggle.grid(row=6, column=1, padx=5, pady=5, sticky="w")
+        self.dark_mode_toggle.grid(row=9, column=1, padx=5, pady=5, sticky="w")
 
         # Save Button
         ttk.Button(self, text="Save Settings", command=self.save_settings,
-                   style='success.TButton').grid(row=7, column=0, columnspan=3, padx=5, pady=20)
+                   style='success.TButton').grid(row=10, column=0, columnspan=3, padx=5, pady=20)
 
     def update_temp_value(self, event=None):
         self.temp_value.set(f"{self.temperature.get():.2f}")
@@ -99,10 +124,7 @@ class SettingsPage(ttk.Frame):
         self.toggle_theme_callback()
 
     def load_settings(self):
-        if os.path.exists("settings.json"):
-            with open("settings.json", "r") as f:
-                return json.load(f)
-        return {}
+        return dict(get_settings())
 
     def save_settings(self):
         settings = {
@@ -110,10 +132,17 @@ class SettingsPage(ttk.Frame):
             "top_p": float(self.top_p.get()),
             "max_retries": int(self.max_retries.get()),
             "timeout": int(self.timeout.get()),
+            "pairs_per_request": int(self.pairs_per_request.get()),
+            "structured_output": self.structured_output_var.get(),
+            "semantic_dedup": self.semantic_dedup_var.get(),
             "dark_mode": self.dark_mode_var.get(),
             "model": self.model_var.get(),
             "api_url": self.api_url_var.get()
         }
+        # Keep keys owned by other pages (OpenAI settings, etc.)
+        merged_settings = dict(get_settings())
+        merged_settings.update(settings)
         with open("settings.json", "w") as f:
-            json.dump(settings, f)
+            json.dump(merged_settings, f)
+        settings_store.invalidate()
         self.parent.event_generate("<<SettingsUpdated>>")
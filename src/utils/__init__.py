@@ -1,4 +1,10 @@
-from .logging_config import setup_logger
-from .api_client import generate_qa_pair
+from .lazy import lazy_exports
 
-__all__ = ['setup_logger', 'generate_qa_pair']
+# Imported on first access, so setting up logging doesn't load the API clients
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    'setup_logger': '.logging_config',
+    'generate_qa_pair': '.api_client',
+    'generate_qa_pairs': '.api_client',
+    'agenerate_qa_pair': '.async_api_client',
+    'agenerate_qa_pairs': '.async_api_client',
+})
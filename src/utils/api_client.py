@@ -1,103 +1,354 @@
-import requests
 import time
+import json
 import logging
 import random
 import re
-import json
-import os
-from requests.exceptions import RequestException, Timeout
-from ratelimit import limits, sleep_and_retry
-from openai import OpenAI
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from collections import deque
+import threading
+from requests.exceptions import RequestException, RetryError, Timeout
 import hashlib
+from .settings import get_settings
+from .clients import clients
+from .rate_limiter import get_rate_limiter, parse_retry_after
+from .ollama_pool import get_ollama_pool
+from .structured_output import decode_qa_records, parse_stats, qa_json_schema
+from .metrics import REJECTED_PAIRS, REQUEST_FAILURES, record_request
+from .response_cache import get_response_cache
 
 logger = logging.getLogger(__name__)
 
-CALLS_PER_MINUTE = 60
+SYSTEM_MESSAGE = """You are a helpful assistant that generates questions and answers. 
+    Always include a specific category or subtopic for each question-answer pair you generate. 
+    The category should be more specific than the general topic provided.
+    Format your response exactly as follows:
+    Question: [Your question here]
+    Answer: [Your detailed answer here]
+    Category: [A specific category or subtopic]"""
+
+STRUCTURED_SYSTEM_MESSAGE = """You are a helpful assistant that generates questions and answers. 
+    Always include a specific category or subtopic for each question-answer pair you generate. 
+    The category should be more specific than the general topic provided.
+    Respond only with JSON in the format you are asked for."""
 
 
 class QuestionCache:
+    """
+    Fixed-size set of recently generated questions.
+
+    Questions are stored as 8-byte digests in a ring buffer, with a set
+    alongside for O(1) lookups; once full, each new question evicts the
+    oldest one.
+    """
+
     def __init__(self, max_size=1000):
-        self.cache = deque(maxlen=max_size)
+        self.max_size = max_size
+        self._ring = [None] * max_size
+        self._next = 0
+        self._digests = set()
+        # generate_qa_pair may run on several worker threads at once
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _digest(question):
+        return hashlib.md5(question.lower().encode()).digest()[:8]
+
+    def __len__(self):
+        return len(self._digests)
+
+    def _add_digest(self, digest):
+        if digest in self._digests:
+            return False
+        evicted = self._ring[self._next]
+        if evicted is not None:
+            self._digests.discard(evicted)
+        self._ring[self._next] = digest
+        self._digests.add(digest)
+        self._next = (self._next + 1) % self.max_size
+        return True
 
     def add(self, question):
-        question_hash = hashlib.md5(question.lower().encode()).hexdigest()
-        self.cache.append(question_hash)
+        with self.lock:
+            self._add_digest(self._digest(question))
+
+    def add_if_new(self, question):
+        """
+        Remember a question unless it is already recent, atomically.
+
+        :param question: The question to add
+        :return: True if it was added, False if it was already recent
+        """
+        digest = self._digest(question)
+        with self.lock:
+            return self._add_digest(digest)
 
     def is_recent(self, question):
-        question_hash = hashlib.md5(question.lower().encode()).hexdigest()
-        return question_hash in self.cache
+        digest = self._digest(question)
+        with self.lock:
+            return digest in self._digests
+
+    def resize(self, max_size):
+        """
+        Change the capacity, keeping the most recent questions that still fit.
+
+        :param max_size: New number of questions to remember
+        """
+        max_size = max(1, int(max_size))
+        with self.lock:
+            if max_size == self.max_size:
+                return
+            # Oldest first, starting from the slot that would be overwritten next
+            ordered = [digest for digest in self._ring[self._next:] + self._ring[:self._next]
+                       if digest is not None]
+            self.max_size = max_size
+            self._ring = [None] * max_size
+            self._next = 0
+            self._digests = set()
+            for digest in ordered[-max_size:]:
+                self._add_digest(digest)
+
+    def warm_start(self, questions):
+        """
+        Pre-load questions, e.g. the newest rows of the dataset being extended.
+
+        :param questions: Questions ordered oldest to newest
+        :return: Number of questions added
+        """
+        digests = [self._digest(question) for question in questions]
+        with self.lock:
+            return sum(self._add_digest(digest) for digest in digests[-self.max_size:])
+
+    def clear(self):
+        with self.lock:
+            self._ring = [None] * self.max_size
+            self._next = 0
+            self._digests = set()
 
 
 question_cache = QuestionCache()
 
 
-def create_session():
-    session = requests.Session()
-    retries = Retry(total=5, backoff_factor=0.1,
-                    status_forcelist=[500, 502, 503, 504])
-    session.mount('http://', HTTPAdapter(max_retries=retries))
-    session.mount('https://', HTTPAdapter(max_retries=retries))
-    return session
+class DuplicateQuestion(Exception):
+    """Generation was stopped early because the question is already in the dataset."""
 
-
-session = create_session()
+    def __init__(self, question):
+        super().__init__(f"Duplicate question: {question[:50]}...")
+        self.question = question
 
 
 def load_settings():
-    if os.path.exists("settings.json"):
-        with open("settings.json", "r") as f:
-            return json.load(f)
-    return {}
+    return get_settings()
+
+
+# response_format types to fall back through, most constrained first, when
+# a model rejects one (strict json_schema needs gpt-4o-2024-08-06 or later,
+# json_object gpt-3.5-turbo-1106 or later)
+RESPONSE_FORMAT_FALLBACKS = ("json_schema", "json_object", None)
+
+# response_format type to use per (base URL, model), once one was rejected
+_response_formats = {}
+_response_formats_lock = threading.Lock()
+
 
+def _openai_model_key(settings):
+    return (settings.get("openai_base_url") or 'default',
+            settings.get("openai_model", "gpt-3.5-turbo"))
 
-@sleep_and_retry
-@limits(calls=CALLS_PER_MINUTE, period=60)
-def make_api_request(prompt, api_choice):
-    settings = load_settings()
+
+def openai_response_format(json_schema, format_type="json_schema"):
+    """
+    Build the OpenAI response_format for a JSON schema.
+
+    :param json_schema: Schema the response must match
+    :param format_type: One of RESPONSE_FORMAT_FALLBACKS
+    :return: The response_format, or None to rely on the prompt alone
+    """
+    if format_type == "json_schema":
+        return {"type": "json_schema",
+                "json_schema": {"name": "qa_pairs", "schema": json_schema, "strict": True}}
+    if format_type == "json_object":
+        return {"type": "json_object"}
+    return None
+
+
+def openai_request(settings, system_message, prompt, max_tokens, json_schema=None):
+    """Build the keyword arguments of an OpenAI chat completion request."""
+    request = {
+        "model": settings.get("openai_model", "gpt-3.5-turbo"),
+        "messages": [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": settings.get("openai_temperature", 0.7),
+        "max_tokens": max_tokens,
+    }
+    if json_schema:
+        with _response_formats_lock:
+            format_type = _response_formats.get(_openai_model_key(settings), RESPONSE_FORMAT_FALLBACKS[0])
+        response_format = openai_response_format(json_schema, format_type)
+        if response_format:
+            request["response_format"] = response_format
+    return request
+
+
+def downgrade_response_format(settings, request, error):
+    """
+    Fall back to a simpler response_format after the model rejected one.
+
+    The choice is remembered for the model, so later requests go straight
+    to the format it accepts.
+
+    :param settings: Settings the request was built from
+    :param request: Request that got a 400; its response_format is replaced
+    :param error: The openai.BadRequestError
+    :return: True if the request was changed and should be retried
+    """
+    response_format = request.get("response_format")
+    if response_format is None or (getattr(error, "param", None) != "response_format"
+                                   and "response_format" not in str(error)):
+        return False
+    index = RESPONSE_FORMAT_FALLBACKS.index(response_format["type"]) + 1
+    key = _openai_model_key(settings)
+    with _response_formats_lock:
+        # Another request may already have stepped further down
+        index = max(index, RESPONSE_FORMAT_FALLBACKS.index(_response_formats.get(key, "json_schema")))
+        format_type = RESPONSE_FORMAT_FALLBACKS[index]
+        _response_formats[key] = format_type
+    logger.warning(f"Model {key[1]} rejected response_format {response_format['type']!r}; "
+                   f"using {format_type or 'prompt-only JSON'} instead")
+    if format_type is None:
+        del request["response_format"]
+    else:
+        request["response_format"] = {"type": format_type}
+    return True
+
+
+def record_response(cache, key, api_choice, result):
+    """
+    Store a live response in the response cache.
+
+    Streamed Ollama responses that were stopped early are incomplete and
+    are not stored.
+    """
+    if api_choice == 'openai':
+        cache.record(key, result.model_dump(mode="json"))
+    elif not result.get("aborted"):
+        cache.record(key, result)
+
+
+def replay_response(cache, key, api_choice, on_question=None):
+    """
+    Answer a request from the response cache.
+
+    :param cache: ResponseCache in replay mode
+    :param key: Cache key of the request
+    :param api_choice: Backend the request was for
+    :param on_question: Early-abort callback, applied as if the response streamed in
+    :return: The recorded response, or None if nothing was recorded for the request
+    """
+    data = cache.replay(key)
+    if data is None:
+        logger.warning(f"No recorded {api_choice} response for this request in {cache.directory}")
+        return None
+    if api_choice == 'openai':
+        from openai.types.chat import ChatCompletion
+        return ChatCompletion.model_validate(data)
+
+    if on_question is not None:
+        question = _streamed_question(data.get("response", ""))
+        reason = on_question(question) if question is not None else None
+        if reason:
+            return {"response": data.get("response", ""), "aborted": reason, "question": question}
+    return data
+
+
+def ollama_payload(model, full_prompt, stream, temperature, top_p, json_schema=None):
+    """Build the body of an Ollama /api/generate request."""
+    payload = {
+        "model": model,
+        "prompt": full_prompt,
+        "stream": stream,
+        "temperature": temperature,
+        "top_p": top_p,
+        "seed": int(time.time() * 1000)
+    }
+    if json_schema:
+        # Constrains decoding to valid JSON; the prompt spells out the shape
+        payload["format"] = "json"
+    return payload
+
+
+def estimate_tokens(text):
+    # Rough rule of thumb for English text; only used to pace token budgets
+    return len(text) // 4
+
+
+def make_api_request(prompt, api_choice, settings=None, max_tokens=None, on_question=None,
+                     json_schema=None):
+    if settings is None:
+        settings = load_settings()
     max_retries = settings.get("max_retries", 3)
     timeout = settings.get("timeout", 30)
 
-    system_message = """You are a helpful assistant that generates questions and answers. 
-    Always include a specific category or subtopic for each question-answer pair you generate. 
-    The category should be more specific than the general topic provided.
-    Format your response exactly as follows:
-    Question: [Your question here]
-    Answer: [Your detailed answer here]
-    Category: [A specific category or subtopic]"""
-
+    system_message = STRUCTURED_SYSTEM_MESSAGE if json_schema else SYSTEM_MESSAGE
     full_prompt = f"{system_message}\n\n{prompt}"
 
     logger.debug(
         f"Making API request with {api_choice}. Full prompt:\n{full_prompt}")
 
+    cache = get_response_cache(settings)
+
     if api_choice == 'openai':
-        client = OpenAI()  # This will use the OPENAI_API_KEY environment variable
-        model = settings.get("openai_model", "gpt-3.5-turbo")
-        temperature = settings.get("openai_temperature", 0.7)
-        max_tokens = settings.get("openai_max_tokens", 500)
+        # Imported here so Ollama-only jobs never load the OpenAI SDK
+        import openai
+
+        base_url = settings.get("openai_base_url")
+        if max_tokens is None:
+            max_tokens = settings.get("openai_max_tokens", 500)
+        request = openai_request(settings, system_message, prompt, max_tokens, json_schema)
+        cache_key = cache.key('openai', request)
+        if cache.replaying:
+            return replay_response(cache, cache_key, api_choice)
+
+        client = clients.openai(base_url)
+        limiter = get_rate_limiter('openai', base_url or 'default', settings)
+        # OpenAI counts max_tokens against the tokens/min limit up front
+        reserved_tokens = estimate_tokens(full_prompt) + max_tokens
 
         for attempt in range(max_retries):
+            wait_time = (attempt + 1) * 2
+            limiter.acquire(reserved_tokens)
+            start = time.monotonic()
             try:
-                response = client.chat.completions.create(
-                    model=model,
-                    messages=[
-                        {"role": "system", "content": system_message},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=temperature,
-                    max_tokens=max_tokens
-                )
+                response = client.chat.completions.create(**request)
+                usage = getattr(response, "usage", None)
+                limiter.record_success(time.monotonic() - start,
+                                       usage.total_tokens if usage else None, reserved_tokens)
                 logger.debug(f"OpenAI API Response: {response}")
+                if cache.recording:
+                    record_response(cache, cache_key, api_choice, response)
                 return response
+            except openai.RateLimitError as e:
+                retry_after = parse_retry_after(e.response.headers.get("retry-after"))
+                limiter.record_throttle(retry_after)
+                logger.warning(
+                    f"OpenAI API rate limited (attempt {attempt + 1}/{max_retries}): {str(e)}")
+                if retry_after is not None:
+                    wait_time = 0  # The limiter holds requests back until Retry-After passes
+            except openai.BadRequestError as e:
+                if not downgrade_response_format(settings, request, e):
+                    logger.error(f"OpenAI API rejected the request: {str(e)}")
+                    return None
+                # Retry straight away with the simpler format
+                cache_key = cache.key('openai', request)
+                wait_time = 0
+            except (openai.APIConnectionError, openai.InternalServerError) as e:
+                limiter.record_error()
+                logger.error(
+                    f"OpenAI API request failed (attempt {attempt + 1}/{max_retries}): {str(e)}")
             except Exception as e:
                 logger.error(
                     f"OpenAI API request failed (attempt {attempt + 1}/{max_retries}): {str(e)}")
 
-            if attempt < max_retries - 1:
-                wait_time = (attempt + 1) * 2
+            if attempt < max_retries - 1 and wait_time:
                 logger.info(
                     f"Waiting for {wait_time} seconds before retrying...")
                 time.sleep(wait_time)
@@ -107,34 +358,77 @@ def make_api_request(prompt, api_choice):
         temperature = settings.get("temperature", 0.7)
         top_p = settings.get("top_p", 0.9)
         model = settings.get("model", "llama3:latest")
-        api_url = settings.get(
-            "api_url", "http://47.18.235.71:11434/api/generate")
+        cache_key = cache.key('ollama', ollama_payload(
+            model, full_prompt, False, temperature, top_p, json_schema))
+        if cache.replaying:
+            return replay_response(cache, cache_key, api_choice, on_question)
+
+        pool = get_ollama_pool(settings)
+        reserved_tokens = estimate_tokens(full_prompt)
 
         for attempt in range(max_retries):
+            wait_time = (attempt + 1) * 2
+            # Each attempt may go to a different host
+            host = pool.acquire()
+            api_url = host.url
+            limiter = get_rate_limiter('ollama', api_url, settings)
+            latency = None
+            aborted = False
             try:
-                response = session.post(
+                limiter.acquire(reserved_tokens)
+                start = time.monotonic()
+                # Streaming lets on_question stop a rejected generation early
+                stream = on_question is not None
+                response = clients.session(api_url).post(
                     api_url,
-                    json={
-                        "model": model,
-                        "prompt": full_prompt,
-                        "stream": False,
-                        "temperature": temperature,
-                        "top_p": top_p,
-                        "seed": int(time.time() * 1000)
-                    },
-                    timeout=timeout
+                    json=ollama_payload(model, full_prompt, stream, temperature, top_p, json_schema),
+                    timeout=timeout,
+                    stream=stream
                 )
-                response.raise_for_status()
-                return response.json()
+                if response.status_code == 429:
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    limiter.record_throttle(retry_after)
+                    if retry_after is not None:
+                        wait_time = 0
+                elif response.status_code >= 500:
+                    limiter.record_error()
+                try:
+                    response.raise_for_status()
+                    if stream:
+                        result = read_ollama_stream(response.iter_lines(), on_question)
+                        aborted = bool(result.get("aborted"))
+                    else:
+                        result = response.json()
+                finally:
+                    if stream:
+                        # Closing mid-stream drops the connection, which stops
+                        # generation; an error response must not keep it either
+                        response.close()
+                latency = time.monotonic() - start
+                limiter.record_success(
+                    latency,
+                    result.get("prompt_eval_count", 0) + result.get("eval_count", 0),
+                    reserved_tokens)
+                if cache.recording:
+                    record_response(cache, cache_key, api_choice, result)
+                return result
             except Timeout:
+                limiter.record_error()
                 logger.warning(
                     f"API request timed out (attempt {attempt + 1}/{max_retries})")
+            except RetryError as e:
+                # The session's own retries on 5xx responses ran out
+                limiter.record_error()
+                logger.error(
+                    f"API request failed (attempt {attempt + 1}/{max_retries}): {str(e)}")
             except RequestException as e:
                 logger.error(
                     f"API request failed (attempt {attempt + 1}/{max_retries}): {str(e)}")
+            finally:
+                # A stream cut short says nothing about how fast the host is
+                pool.release(host, None if aborted else latency, ok=latency is not None)
 
-            if attempt < max_retries - 1:
-                wait_time = (attempt + 1) * 2
+            if attempt < max_retries - 1 and wait_time:
                 logger.info(
                     f"Waiting for {wait_time} seconds before retrying...")
                 time.sleep(wait_time)
@@ -145,46 +439,276 @@ def make_api_request(prompt, api_choice):
         return None
 
 
-def generate_qa_pair(topic, stop_event, api_choice):
-    prompts = [
-        f"Generate a unique and specific question about {topic} that is unlikely to have been asked before. Provide a detailed answer.",
-        f"Create a challenging question related to an advanced aspect of {topic}. Include a comprehensive explanation in your answer.",
-        f"Devise a question about a lesser-known fact or concept within {topic}. Ensure your answer is informative and precise.",
-        f"Formulate a question that explores the relationship between {topic} and another field. Provide an in-depth answer."
-    ]
+class OllamaStreamReader:
+    """
+    Assembles a streamed Ollama response and spots the question early.
+
+    Feed it each NDJSON line with feed(). Once the Question line is complete
+    it is passed to on_question; if that returns a reason to reject it,
+    feed() returns True and the caller should close the connection, which
+    makes Ollama stop generating.
+    """
+
+    def __init__(self, on_question):
+        self.on_question = on_question
+        self.parts = []
+        self.final = None
+        self.aborted = None
+        self.question = None
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+    def feed(self, line):
+        """
+        Process one line of the stream.
+
+        :param line: A JSON line from the Ollama API (bytes or str)
+        :return: True once no more lines are needed
+        """
+        if not line:
+            return False
+        try:
+            chunk = json.loads(line)
+        except ValueError as e:
+            raise RequestException(f"Malformed Ollama stream line: {line!r}") from e
+        if "error" in chunk:
+            raise RequestException(f"Ollama error: {chunk['error']}")
+        self.parts.append(chunk.get("response", ""))
+        if chunk.get("done"):
+            self.final = chunk
+            return True
+
+        if self.question is None and ":" in chunk.get("response", ""):
+            # The question is complete once the next label or key has arrived
+            self.question = _streamed_question(self.text)
+            if self.question is not None:
+                self.aborted = self.on_question(self.question)
+                return bool(self.aborted)
+        return False
+
+    def result(self):
+        """Return the response in the shape of a non-streaming Ollama reply."""
+        result = dict(self.final or {})
+        result["response"] = self.text
+        if self.aborted:
+            result["aborted"] = self.aborted
+            result["question"] = self.question
+        return result
+
+
+def _streamed_question(text):
+    match = _STREAMED_QUESTION.search(text)
+    if match:
+        return match.group(1).strip().strip('*').strip()
+    match = _STREAMED_JSON_QUESTION.search(text)
+    if match:
+        try:
+            return json.loads(f'"{match.group(1)}"').strip()
+        except ValueError:
+            # A broken escape such as a cut-off \u sequence; the full
+            # response is parsed (and rejected) once it has arrived
+            return None
+    return None
+
+
+def read_ollama_stream(lines, on_question):
+    """
+    Read a streamed Ollama response, stopping early if on_question rejects it.
+
+    :param lines: Iterable of NDJSON lines
+    :param on_question: Called with the question once it has arrived; returns
+        a reason string to abort the generation, or None to continue
+    :return: The assembled response; "aborted" holds the reason if stopped early
+    """
+    reader = OllamaStreamReader(on_question)
+    for line in lines:
+        if reader.feed(line):
+            break
+    return reader.result()
 
-    prompt = random.choice(prompts) + """
+
+def early_rejection(question, question_filter=None):
+    """
+    Decide whether a streamed question should be dropped before its answer.
+
+    :param question: The question text
+    :param question_filter: Optional callable returning True for duplicates
+    :return: 'recent', 'duplicate', or None to keep generating
+    """
+    if question_cache.is_recent(question):
+        return 'recent'
+    if question_filter is not None and question_filter(question):
+        return 'duplicate'
+    return None
+
+
+# Generation prompts, keyed by the id stored with each row as prompt_template
+PROMPT_TEMPLATES = {
+    "unique": "Generate a unique and specific question about {topic} that is unlikely to have been asked before. Provide a detailed answer.",
+    "advanced": "Create a challenging question related to an advanced aspect of {topic}. Include a comprehensive explanation in your answer.",
+    "lesser_known": "Devise a question about a lesser-known fact or concept within {topic}. Ensure your answer is informative and precise.",
+    "cross_field": "Formulate a question that explores the relationship between {topic} and another field. Provide an in-depth answer.",
+}
+
+
+def choose_prompt_template():
+    return random.choice(list(PROMPT_TEMPLATES))
+
+
+def build_prompt(topic, count=1, structured=False, template_id=None):
+    """
+    Build a generation prompt for a topic.
+
+    :param topic: The topic to ask about
+    :param count: Number of QA pairs to ask for in one response
+    :param structured: Ask for JSON instead of labelled text
+    :param template_id: Key of PROMPT_TEMPLATES to use (default: a random one)
+    :return: The user prompt to send to the API
+    """
+    if template_id is None:
+        template_id = choose_prompt_template()
+    prompt = PROMPT_TEMPLATES[template_id].format(topic=topic)
+
+    if structured:
+        record = ('{"question": "Your unique question", "answer": "Your detailed answer", '
+                  '"category": "A specific category or subtopic within the given topic"}')
+        if count == 1:
+            return prompt + f"""
+    Respond with only a JSON object of this form:
+    {record}
+    """
+        return prompt + f"""
+    Do this {count} times, giving {count} different questions that do not overlap.
+    Respond with only a JSON object holding the {count} pairs, of this form:
+    {{"pairs": [{record}, ...]}}
+    """
+
+    if count == 1:
+        return prompt + """
     Format your response exactly as follows:
     Question: [Your unique question here]
     Answer: [Your detailed answer here]
     Category: [A specific category or subtopic within the given topic]
     """
 
-    if stop_event.is_set():
-        logger.info("Stopping QA pair generation due to stop event.")
-        return None, None, None
+    return prompt + f"""
+    Do this {count} times, giving {count} different questions that do not overlap.
+    Format each of the {count} pairs exactly as follows, with a blank line between pairs:
+    Question: [Your unique question here]
+    Answer: [Your detailed answer here]
+    Category: [A specific category or subtopic within the given topic]
+    """
 
-    result = make_api_request(prompt, api_choice)
-    if result is None:
-        logger.error("Failed to generate QA pair for topic '{}' after {} attempts".format(
-            topic, load_settings().get('max_retries', 3)))
-        return None, None, None
 
+def extract_response_text(result, api_choice):
+    """
+    Pull the generated text out of a raw API response.
+
+    :param result: Response returned by the Ollama or OpenAI API
+    :param api_choice: Choice of API that produced the response
+    :return: The generated text
+    """
     if api_choice == 'openai':
-        response_text = result.choices[0].message.content.strip()
-    else:  # ollama
-        response_text = result.get('response', '').strip()
+        return result.choices[0].message.content.strip()
+    return result.get('response', '').strip()  # ollama
 
-    logger.debug(f"Full API response for topic '{topic}':\n{response_text}")
 
-    components = ['Question', 'Answer', 'Category']
+def response_usage(result, api_choice):
+    """
+    Read the token counts a raw API response reports.
+
+    :param result: Response returned by the Ollama or OpenAI API
+    :param api_choice: The API that produced it
+    :return: Tuple of (prompt tokens, completion tokens); None where unknown
+    """
+    if api_choice == 'openai':
+        usage = getattr(result, "usage", None)
+        if usage is None:
+            return None, None
+        return usage.prompt_tokens, usage.completion_tokens
+    return result.get("prompt_eval_count"), result.get("eval_count")
+
+
+def backend_model(api_choice, settings):
+    """Return the model name a backend is configured to use."""
+    if api_choice == 'openai':
+        return settings.get("openai_model", "gpt-3.5-turbo")
+    return settings.get("model", "llama3:latest")
+
+
+def describe_generation(metadata, topic, api_choice, settings, template_id, latency, result, pairs=1):
+    """
+    Fill in the generation metadata stored with the pairs of one request,
+    and record the request's latency and token counts as metrics.
+
+    Token counts are split evenly across the pairs the request produced,
+    so summing a column over rows gives what those rows cost.
+
+    :param metadata: Dict to update, or None to do nothing
+    :param topic: The topic the pairs were generated for
+    :param api_choice: The API that was used
+    :param settings: Settings snapshot the request was made with
+    :param template_id: Key of the PROMPT_TEMPLATES entry that was used
+    :param latency: Seconds the request took, retries included
+    :param result: Raw API response
+    :param pairs: Number of QA pairs the response held
+    """
+    prompt_tokens, completion_tokens = response_usage(result, api_choice)
+    record_request(api_choice, latency, prompt_tokens, completion_tokens)
+    if metadata is None:
+        return
+    pairs = max(1, pairs)
+    metadata.update({
+        "topic": topic,
+        "backend": api_choice,
+        "model": backend_model(api_choice, settings),
+        "prompt_template": template_id,
+        "latency_ms": round(latency * 1000),
+        "prompt_tokens": None if prompt_tokens is None else round(prompt_tokens / pairs),
+        "completion_tokens": None if completion_tokens is None else round(completion_tokens / pairs),
+    })
+
+
+# Optional list or heading markers and markdown emphasis around a label,
+# e.g. "2. Question:", "**Answer:**" or "Question 3:"
+_LABEL = r'[ \t]*(?:(?:\d+[.)]|[-*#]+)[ \t]*)?[*_]*{}(?:[ \t]*\d+)?[*_]*[ \t]*:[*_]*'
+_QUESTION_START = re.compile(r'^' + _LABEL.format('Question'), re.IGNORECASE | re.MULTILINE)
+_COMPONENT_END = r'(?=\n' + _LABEL.format('(?:Question|Answer|Category)') + '|$)'
+_STREAMED_JSON_QUESTION = re.compile(r'"question"\s*:\s*"((?:[^"\\]|\\.)*)"\s*,')
+_STREAMED_QUESTION = re.compile(
+    _LABEL.format('Question') + r'\s*(.*?)\n' + _LABEL.format('(?:Answer|Category)'),
+    re.IGNORECASE | re.DOTALL)
+
+
+def split_qa_blocks(response_text):
+    """
+    Split generated text into one block per QA pair.
+
+    Each block starts at a Question label; anything before the first one
+    (such as "Here are your questions:") is dropped.
+
+    :param response_text: Text generated by the API
+    :return: List of text blocks, possibly empty
+    """
+    starts = [match.start() for match in _QUESTION_START.finditer(response_text)]
+    return [response_text[start:end]
+            for start, end in zip(starts, starts[1:] + [len(response_text)])]
+
+
+def _extract_components(block, topic):
     extracted = {}
 
-    for component in components:
-        pattern = rf'{component}:\s*(.*?)(?:\n(?:Question|Answer|Category):|$)'
-        match = re.search(pattern, response_text, re.DOTALL | re.IGNORECASE)
+    for component in ['Question', 'Answer', 'Category']:
+        pattern = _LABEL.format(component) + r'\s*(.*?)' + _COMPONENT_END
+        match = re.search(pattern, block, re.DOTALL | re.IGNORECASE)
         if match:
-            extracted[component.lower()] = match.group(1).strip()
+            value = match.group(1).strip().strip('*').strip()
+            if component == 'Category':
+                # The category is a short label; drop separators or chatter after it
+                value = value.split('\n', 1)[0].strip()
+            extracted[component.lower()] = value
             logger.debug(
                 f"Extracted {component}: {extracted[component.lower()]}")
         else:
@@ -199,26 +723,250 @@ def generate_qa_pair(topic, stop_event, api_choice):
         extracted['category'] = infer_category(
             extracted.get('question', ''), topic)
 
-    if all(key in extracted for key in ['question', 'answer', 'category']) and \
-       all(extracted[key] for key in ['question', 'answer', 'category']):
-        question = extracted['question']
-        answer = extracted['answer']
-        category = extracted['category']
+    return extracted
 
-        if len(question) > 10 and len(answer) > 20 and not question_cache.is_recent(question):
-            logger.info(f"Successfully generated QA pair for topic '{topic}'")
-            question_cache.add(question)
-            return question, answer, category
-        else:
-            logger.warning(
-                f"Generated QA pair too short or recently generated for topic '{topic}'")
-    else:
+
+def _accept_qa_pair(extracted, topic):
+    if not all(extracted.get(key) for key in ['question', 'answer', 'category']):
         logger.warning(
             f"Failed to extract all components from API response for topic '{topic}'")
+        REJECTED_PAIRS.inc(stage="parse", reason="incomplete")
+        return None, None, None
+
+    question = extracted['question']
+    answer = extracted['answer']
+    category = extracted['category']
+    if len(question) <= 10 or len(answer) <= 20:
+        reason = 'short'
+    elif not question_cache.add_if_new(question):
+        reason = 'recent'
+    else:
+        logger.info(f"Successfully generated QA pair for topic '{topic}'")
+        return question, answer, category
 
+    logger.warning(
+        f"Generated QA pair too short or recently generated for topic '{topic}'")
+    REJECTED_PAIRS.inc(stage="parse", reason=reason)
     return None, None, None
 
 
+def parse_qa_response(response_text, topic):
+    """
+    Extract a QA pair from generated text and check that it is usable.
+
+    :param response_text: Text generated by the API
+    :param topic: The topic the question was generated for
+    :return: Tuple of (question, answer, category), or (None, None, None)
+    """
+    logger.debug(f"Full API response for topic '{topic}':\n{response_text}")
+    return _accept_qa_pair(_extract_components(response_text, topic), topic)
+
+
+def parse_qa_responses(response_text, topic):
+    """
+    Extract every QA pair from generated text that asked for several.
+
+    Each candidate is checked on its own, so one malformed or repeated pair
+    doesn't cost the others.
+
+    :param response_text: Text generated by the API
+    :param topic: The topic the questions were generated for
+    :return: List of (question, answer, category) tuples that passed the checks
+    """
+    logger.debug(f"Full API response for topic '{topic}':\n{response_text}")
+    qa_pairs = []
+    for block in split_qa_blocks(response_text):
+        qa_pair = _accept_qa_pair(_extract_components(block, topic), topic)
+        if qa_pair[0]:
+            qa_pairs.append(qa_pair)
+    return qa_pairs
+
+
+def _records_to_qa_pairs(records, topic):
+    qa_pairs = []
+    for record in records:
+        extracted = {"question": record.question.strip(), "answer": record.answer.strip(),
+                     "category": record.category.strip()}
+        if not extracted["category"]:
+            extracted["category"] = infer_category(extracted["question"], topic)
+        qa_pair = _accept_qa_pair(extracted, topic)
+        if qa_pair[0]:
+            qa_pairs.append(qa_pair)
+    return qa_pairs
+
+
+def parse_structured_qa_responses(response_text, topic):
+    """
+    Decode a JSON response into QA pairs, falling back to the text parser.
+
+    :param response_text: Text generated by the API in structured-output mode
+    :param topic: The topic the questions were generated for
+    :return: List of (question, answer, category) tuples that passed the checks
+    """
+    records = decode_qa_records(response_text)
+    if records is None:
+        parse_stats.record('fallback')
+        logger.warning(
+            f"Structured response for topic '{topic}' is not valid QA JSON; parsing it as text")
+        qa_pairs = parse_qa_responses(response_text, topic)
+        if not qa_pairs:
+            parse_stats.record('fallback_failed')
+        return qa_pairs
+
+    parse_stats.record('structured')
+    return _records_to_qa_pairs(records, topic)
+
+
+def parse_structured_qa_response(response_text, topic):
+    """
+    Single-pair counterpart of parse_structured_qa_responses.
+
+    :return: Tuple of (question, answer, category), or (None, None, None)
+    """
+    records = decode_qa_records(response_text)
+    if records is None:
+        parse_stats.record('fallback')
+        logger.warning(
+            f"Structured response for topic '{topic}' is not valid QA JSON; parsing it as text")
+        qa_pair = parse_qa_response(response_text, topic)
+        if not qa_pair[0]:
+            parse_stats.record('fallback_failed')
+        return qa_pair
+
+    parse_stats.record('structured')
+    qa_pairs = _records_to_qa_pairs(records[:1], topic)
+    return qa_pairs[0] if qa_pairs else (None, None, None)
+
+
+def make_stream_filter(api_choice, settings, question_filter):
+    """
+    Build the on_question callback for make_api_request.
+
+    :return: The callback, or None when the response shouldn't be streamed
+    """
+    if api_choice != 'ollama' or not settings.get("ollama_stream", True):
+        return None
+    return lambda question: early_rejection(question, question_filter)
+
+
+def handle_early_abort(result, topic):
+    """
+    Check whether a request was stopped early by its on_question callback.
+
+    :return: True if it was, for a question that was recently generated
+    :raises DuplicateQuestion: If it was, for a duplicate question
+    """
+    reason = result.get("aborted") if isinstance(result, dict) else None
+    if reason is None:
+        return False
+    logger.info(
+        f"Stopped generation early for topic '{topic}': question was {reason}")
+    REJECTED_PAIRS.inc(stage="stream", reason=reason)
+    if reason == 'duplicate':
+        raise DuplicateQuestion(result["question"])
+    return True
+
+
+def generate_qa_pair(topic, stop_event, api_choice, settings=None, question_filter=None, metadata=None):
+    """
+    Generate one QA pair about a topic.
+
+    With Ollama the response is streamed, and generation stops as soon as
+    the question turns out to be a recent repeat or (per question_filter)
+    a duplicate, instead of paying for the whole answer.
+
+    :param topic: The topic to generate a question about
+    :param stop_event: Threading event to signal when to stop generation
+    :param api_choice: Choice of API to use ('ollama' or 'openai')
+    :param settings: Settings snapshot to use (default: the current settings)
+    :param question_filter: Optional callable returning True for questions
+        that are already in the dataset
+    :param metadata: Optional dict, filled in with describe_generation, or
+        with request_failed=True if every attempt failed
+    :return: Tuple of (question, answer, category), or (None, None, None)
+    :raises DuplicateQuestion: If question_filter rejected the question
+    """
+    if settings is None:
+        settings = load_settings()
+    structured = settings.get("structured_output", False)
+    template_id = choose_prompt_template()
+    prompt = build_prompt(topic, structured=structured, template_id=template_id)
+
+    if stop_event.is_set():
+        logger.info("Stopping QA pair generation due to stop event.")
+        return None, None, None
+
+    start = time.monotonic()
+    result = make_api_request(prompt, api_choice, settings,
+                              on_question=make_stream_filter(api_choice, settings, question_filter),
+                              json_schema=qa_json_schema() if structured else None)
+    if result is None:
+        logger.error("Failed to generate QA pair for topic '{}' after {} attempts".format(
+            topic, settings.get('max_retries', 3)))
+        REQUEST_FAILURES.inc(backend=api_choice)
+        if metadata is not None:
+            # Tells the caller this was a request error, not a bad response
+            metadata["request_failed"] = True
+        return None, None, None
+    if handle_early_abort(result, topic):
+        return None, None, None
+    describe_generation(metadata, topic, api_choice, settings, template_id,
+                        time.monotonic() - start, result)
+
+    response_text = extract_response_text(result, api_choice)
+    if structured:
+        return parse_structured_qa_response(response_text, topic)
+    return parse_qa_response(response_text, topic)
+
+
+def generate_qa_pairs(topic, stop_event, api_choice, count, settings=None, metadata=None):
+    """
+    Generate up to count QA pairs about a topic with a single API request.
+
+    :param topic: The topic to generate questions about
+    :param stop_event: Threading event to signal when to stop generation
+    :param api_choice: Choice of API to use ('ollama' or 'openai')
+    :param count: Number of pairs to ask for
+    :param settings: Settings snapshot to use (default: the current settings)
+    :param metadata: Optional dict, filled in with describe_generation, or
+        with request_failed=True if every attempt failed
+    :return: List of (question, answer, category) tuples that passed the checks
+    """
+    if settings is None:
+        settings = load_settings()
+    structured = settings.get("structured_output", False)
+    template_id = choose_prompt_template()
+    prompt = build_prompt(topic, count, structured, template_id)
+
+    if stop_event.is_set():
+        logger.info("Stopping QA pair generation due to stop event.")
+        return []
+
+    # The response has to hold count answers
+    max_tokens = settings.get("openai_max_tokens", 500) * count
+    start = time.monotonic()
+    result = make_api_request(prompt, api_choice, settings, max_tokens,
+                              json_schema=qa_json_schema(count) if structured else None)
+    if result is None:
+        logger.error("Failed to generate QA pairs for topic '{}' after {} attempts".format(
+            topic, settings.get('max_retries', 3)))
+        REQUEST_FAILURES.inc(backend=api_choice)
+        if metadata is not None:
+            # Tells the caller this was a request error, not a bad response
+            metadata["request_failed"] = True
+        return []
+
+    response_text = extract_response_text(result, api_choice)
+    if structured:
+        qa_pairs = parse_structured_qa_responses(response_text, topic)
+    else:
+        qa_pairs = parse_qa_responses(response_text, topic)
+    logger.info(f"Kept {len(qa_pairs)} of {count} requested QA pairs for topic '{topic}'")
+    describe_generation(metadata, topic, api_choice, settings, template_id,
+                        time.monotonic() - start, result, len(qa_pairs))
+    return qa_pairs
+
+
 def infer_category(question, topic):
     if "python" in question.lower():
         return "Python Programming"
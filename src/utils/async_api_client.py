@@ -0,0 +1,367 @@
+import asyncio
+import logging
+import random
+import time
+from requests.exceptions import RequestException
+from .rate_limiter import get_rate_limiter, parse_retry_after
+from .ollama_pool import get_ollama_pool
+from .structured_output import qa_json_schema
+from .response_cache import get_response_cache
+from .metrics import REQUEST_FAILURES
+from .api_client import (
+    SYSTEM_MESSAGE,
+    STRUCTURED_SYSTEM_MESSAGE,
+    openai_request,
+    downgrade_response_format,
+    ollama_payload,
+    record_response,
+    replay_response,
+    parse_structured_qa_response,
+    parse_structured_qa_responses,
+    load_settings,
+    estimate_tokens,
+    build_prompt,
+    choose_prompt_template,
+    describe_generation,
+    extract_response_text,
+    parse_qa_response,
+    parse_qa_responses,
+    OllamaStreamReader,
+    make_stream_filter,
+    handle_early_abort,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncBackendClients:
+    """
+    Async HTTP clients shared by every request of a single generation job.
+
+    Both clients pool their connections, so keep one instance open for the
+    whole job instead of creating clients per request. httpx and the OpenAI
+    SDK are imported when the clients are created, not with this module, so
+    thread-engine jobs don't pay for them.
+    """
+
+    def __init__(self, max_connections=100, openai_base_url=None):
+        import httpx
+
+        self.max_connections = max_connections
+        self.openai_base_url = openai_base_url
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_connections)
+        self.http = None
+        self._openai = None
+
+    async def __aenter__(self):
+        import httpx
+
+        self.http = httpx.AsyncClient(limits=self.limits)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    @property
+    def openai(self):
+        if self._openai is None:
+            import httpx
+            from openai import AsyncOpenAI
+
+            # This will use the OPENAI_API_KEY environment variable
+            self._openai = AsyncOpenAI(
+                base_url=self.openai_base_url,
+                max_retries=0,
+                http_client=httpx.AsyncClient(limits=self.limits))
+        return self._openai
+
+    async def aclose(self):
+        if self._openai is not None:
+            await self._openai.close()
+            self._openai = None
+        if self.http is not None:
+            await self.http.aclose()
+            self.http = None
+
+
+async def _aread_ollama_stream(response, on_question):
+    # on_question queries the database, so it runs in a worker thread
+    # rather than stalling every other request on the event loop
+    reader = OllamaStreamReader(lambda question: None)
+    async for line in response.aiter_lines():
+        spotted = reader.question is not None
+        if reader.feed(line):
+            break
+        if not spotted and reader.question is not None:
+            reader.aborted = await asyncio.to_thread(on_question, reader.question)
+            if reader.aborted:
+                break
+    return reader.result()
+
+
+def _backoff_delay(attempt):
+    # Exponential backoff with jitter, so hundreds of concurrent requests
+    # that failed together don't all retry at the same moment
+    return min(2 ** (attempt + 1), 30) * random.uniform(0.5, 1.0)
+
+
+async def amake_api_request(prompt, api_choice, clients, settings=None, max_tokens=None,
+                            on_question=None, json_schema=None):
+    """
+    Async counterpart of make_api_request.
+
+    :param prompt: The user prompt to send
+    :param api_choice: Choice of API to use ('ollama' or 'openai')
+    :param clients: Open AsyncBackendClients to send the request with
+    :param settings: Settings snapshot to use (default: the current settings)
+    :param max_tokens: OpenAI completion budget (default: openai_max_tokens)
+    :param on_question: Stream the Ollama response and call this with the
+        question as soon as it arrives; a returned reason aborts generation
+    :param json_schema: Ask for JSON matching this schema (structured-output mode)
+    :return: The raw API response, or None if every attempt failed
+    """
+    if settings is None:
+        settings = load_settings()
+    max_retries = settings.get("max_retries", 3)
+    timeout = settings.get("timeout", 30)
+
+    system_message = STRUCTURED_SYSTEM_MESSAGE if json_schema else SYSTEM_MESSAGE
+    full_prompt = f"{system_message}\n\n{prompt}"
+
+    logger.debug(
+        f"Making async API request with {api_choice}. Full prompt:\n{full_prompt}")
+
+    cache = get_response_cache(settings)
+
+    if api_choice == 'openai':
+        import openai
+
+        if max_tokens is None:
+            max_tokens = settings.get("openai_max_tokens", 500)
+        request = openai_request(settings, system_message, prompt, max_tokens, json_schema)
+        cache_key = cache.key('openai', request)
+        if cache.replaying:
+            return replay_response(cache, cache_key, api_choice)
+
+        limiter = get_rate_limiter(
+            'openai', settings.get("openai_base_url") or 'default', settings)
+        reserved_tokens = estimate_tokens(full_prompt) + max_tokens
+
+        for attempt in range(max_retries):
+            wait_time = _backoff_delay(attempt)
+            await limiter.aacquire(reserved_tokens)
+            start = time.monotonic()
+            try:
+                response = await clients.openai.chat.completions.create(**request, timeout=timeout)
+                usage = getattr(response, "usage", None)
+                limiter.record_success(time.monotonic() - start,
+                                       usage.total_tokens if usage else None, reserved_tokens)
+                logger.debug(f"OpenAI API Response: {response}")
+                if cache.recording:
+                    record_response(cache, cache_key, api_choice, response)
+                return response
+            except openai.RateLimitError as e:
+                retry_after = parse_retry_after(e.response.headers.get("retry-after"))
+                limiter.record_throttle(retry_after)
+                logger.warning(
+                    f"OpenAI API rate limited (attempt {attempt + 1}/{max_retries}): {str(e)}")
+                if retry_after is not None:
+                    wait_time = 0  # The limiter holds requests back until Retry-After passes
+            except openai.BadRequestError as e:
+                if not downgrade_response_format(settings, request, e):
+                    logger.error(f"OpenAI API rejected the request: {str(e)}")
+                    return None
+                # Retry straight away with the simpler format
+                cache_key = cache.key('openai', request)
+                wait_time = 0
+            except (openai.APIConnectionError, openai.InternalServerError) as e:
+                limiter.record_error()
+                logger.error(
+                    f"OpenAI API request failed (attempt {attempt + 1}/{max_retries}): {str(e)}")
+            except Exception as e:
+                logger.error(
+                    f"OpenAI API request failed (attempt {attempt + 1}/{max_retries}): {str(e)}")
+
+            if attempt < max_retries - 1 and wait_time:
+                await asyncio.sleep(wait_time)
+
+        return None
+    elif api_choice == 'ollama':
+        import httpx
+
+        temperature = settings.get("temperature", 0.7)
+        top_p = settings.get("top_p", 0.9)
+        model = settings.get("model", "llama3:latest")
+        cache_key = cache.key('ollama', ollama_payload(
+            model, full_prompt, False, temperature, top_p, json_schema))
+        if cache.replaying:
+            return replay_response(cache, cache_key, api_choice, on_question)
+
+        pool = get_ollama_pool(settings)
+        reserved_tokens = estimate_tokens(full_prompt)
+
+        for attempt in range(max_retries):
+            wait_time = _backoff_delay(attempt)
+            # Each attempt may go to a different host
+            host = pool.acquire()
+            api_url = host.url
+            limiter = get_rate_limiter('ollama', api_url, settings)
+            latency = None
+            aborted = False
+            cancelled = False
+            try:
+                await limiter.aacquire(reserved_tokens)
+                start = time.monotonic()
+                stream = on_question is not None
+                # Leaving the block closes the connection, which stops a
+                # generation that was abandoned mid-stream
+                async with clients.http.stream(
+                    "POST",
+                    api_url,
+                    json=ollama_payload(model, full_prompt, stream, temperature, top_p, json_schema),
+                    timeout=timeout
+                ) as response:
+                    if response.status_code == 429:
+                        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                        limiter.record_throttle(retry_after)
+                        if retry_after is not None:
+                            wait_time = 0
+                    elif response.status_code >= 500:
+                        limiter.record_error()
+                    response.raise_for_status()
+                    if stream:
+                        result = await _aread_ollama_stream(response, on_question)
+                        aborted = bool(result.get("aborted"))
+                    else:
+                        await response.aread()
+                        result = response.json()
+                latency = time.monotonic() - start
+                limiter.record_success(
+                    latency,
+                    result.get("prompt_eval_count", 0) + result.get("eval_count", 0),
+                    reserved_tokens)
+                if cache.recording:
+                    record_response(cache, cache_key, api_choice, result)
+                return result
+            except httpx.TimeoutException:
+                limiter.record_error()
+                logger.warning(
+                    f"API request timed out (attempt {attempt + 1}/{max_retries})")
+            except (httpx.HTTPError, RequestException) as e:
+                logger.error(
+                    f"API request failed (attempt {attempt + 1}/{max_retries}): {str(e)}")
+            except asyncio.CancelledError:
+                # The job is winding down; that says nothing about the host
+                cancelled = True
+                raise
+            finally:
+                # A stream cut short says nothing about how fast the host is
+                pool.release(host, None if aborted else latency,
+                             ok=cancelled or latency is not None)
+
+            if attempt < max_retries - 1 and wait_time:
+                await asyncio.sleep(wait_time)
+
+        return None
+    else:
+        logger.error(f"Invalid API choice: {api_choice}")
+        return None
+
+
+async def agenerate_qa_pair(topic, stop_event, api_choice, clients, settings=None, question_filter=None,
+                            metadata=None):
+    """
+    Async counterpart of generate_qa_pair.
+
+    :param topic: The topic to generate a question about
+    :param stop_event: Threading event to signal when to stop generation
+    :param api_choice: Choice of API to use ('ollama' or 'openai')
+    :param clients: Open AsyncBackendClients to send the request with
+    :param settings: Settings snapshot to use (default: the current settings)
+    :param question_filter: Optional callable returning True for questions
+        that are already in the dataset
+    :param metadata: Optional dict, filled in with describe_generation, or
+        with request_failed=True if every attempt failed
+    :return: Tuple of (question, answer, category), or (None, None, None)
+    :raises DuplicateQuestion: If question_filter rejected the question
+    """
+    if settings is None:
+        settings = load_settings()
+    structured = settings.get("structured_output", False)
+    template_id = choose_prompt_template()
+    prompt = build_prompt(topic, structured=structured, template_id=template_id)
+
+    if stop_event.is_set():
+        logger.info("Stopping QA pair generation due to stop event.")
+        return None, None, None
+
+    start = time.monotonic()
+    result = await amake_api_request(prompt, api_choice, clients, settings,
+                                     on_question=make_stream_filter(api_choice, settings, question_filter),
+                                     json_schema=qa_json_schema() if structured else None)
+    if result is None:
+        logger.error("Failed to generate QA pair for topic '{}' after {} attempts".format(
+            topic, settings.get('max_retries', 3)))
+        REQUEST_FAILURES.inc(backend=api_choice)
+        if metadata is not None:
+            # Tells the caller this was a request error, not a bad response
+            metadata["request_failed"] = True
+        return None, None, None
+    if handle_early_abort(result, topic):
+        return None, None, None
+    describe_generation(metadata, topic, api_choice, settings, template_id,
+                        time.monotonic() - start, result)
+
+    response_text = extract_response_text(result, api_choice)
+    if structured:
+        return parse_structured_qa_response(response_text, topic)
+    return parse_qa_response(response_text, topic)
+
+
+async def agenerate_qa_pairs(topic, stop_event, api_choice, clients, count, settings=None, metadata=None):
+    """
+    Async counterpart of generate_qa_pairs.
+
+    :param topic: The topic to generate questions about
+    :param stop_event: Threading event to signal when to stop generation
+    :param api_choice: Choice of API to use ('ollama' or 'openai')
+    :param clients: Open AsyncBackendClients to send the request with
+    :param count: Number of pairs to ask for
+    :param settings: Settings snapshot to use (default: the current settings)
+    :param metadata: Optional dict, filled in with describe_generation, or
+        with request_failed=True if every attempt failed
+    :return: List of (question, answer, category) tuples that passed the checks
+    """
+    if settings is None:
+        settings = load_settings()
+    structured = settings.get("structured_output", False)
+    template_id = choose_prompt_template()
+    prompt = build_prompt(topic, count, structured, template_id)
+
+    if stop_event.is_set():
+        logger.info("Stopping QA pair generation due to stop event.")
+        return []
+
+    max_tokens = settings.get("openai_max_tokens", 500) * count
+    start = time.monotonic()
+    result = await amake_api_request(prompt, api_choice, clients, settings, max_tokens,
+                                     json_schema=qa_json_schema(count) if structured else None)
+    if result is None:
+        logger.error("Failed to generate QA pairs for topic '{}' after {} attempts".format(
+            topic, settings.get('max_retries', 3)))
+        REQUEST_FAILURES.inc(backend=api_choice)
+        if metadata is not None:
+            # Tells the caller this was a request error, not a bad response
+            metadata["request_failed"] = True
+        return []
+
+    response_text = extract_response_text(result, api_choice)
+    if structured:
+        qa_pairs = parse_structured_qa_responses(response_text, topic)
+    else:
+        qa_pairs = parse_qa_responses(response_text, topic)
+    logger.info(f"Kept {len(qa_pairs)} of {count} requested QA pairs for topic '{topic}'")
+    describe_generation(metadata, topic, api_choice, settings, template_id,
+                        time.monotonic() - start, result, len(qa_pairs))
+    return qa_pairs
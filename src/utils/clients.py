@@ -0,0 +1,145 @@
+import logging
+import socket
+import threading
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 10
+
+
+class KeepAliveHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that enables TCP keep-alive so idle pooled connections survive."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs.setdefault("socket_options", HTTPConnection.default_socket_options + [
+            (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+        ])
+        super().init_poolmanager(*args, **kwargs)
+
+
+def create_session(pool_size=DEFAULT_POOL_SIZE):
+    """
+    Create a requests session whose connection pool holds pool_size connections.
+
+    :param pool_size: Maximum number of connections kept per host
+    :return: A configured requests.Session
+    """
+    session = requests.Session()
+    retries = Retry(total=5, backoff_factor=0.1,
+                    status_forcelist=[500, 502, 503, 504])
+    adapter = KeepAliveHTTPAdapter(
+        max_retries=retries, pool_connections=4, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def create_openai_client(pool_size=DEFAULT_POOL_SIZE, base_url=None):
+    """
+    Create an OpenAI client whose HTTP pool holds pool_size connections.
+
+    :param pool_size: Maximum number of concurrent connections
+    :param base_url: API base URL (default: the SDK default / OPENAI_BASE_URL)
+    :return: A configured OpenAI client
+    """
+    # The SDK (with httpx and pydantic) takes longer to import than everything
+    # else together, so it is only loaded once an OpenAI client is needed
+    import httpx
+    from openai import OpenAI
+
+    limits = httpx.Limits(max_connections=pool_size,
+                          max_keepalive_connections=pool_size)
+    # This will use the OPENAI_API_KEY environment variable. The SDK's own
+    # retries are off so 429s and Retry-After reach our rate limiter.
+    return OpenAI(base_url=base_url, max_retries=0, http_client=httpx.Client(limits=limits))
+
+
+def _origin(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class ClientRegistry:
+    """
+    Long-lived backend clients, one per backend and endpoint.
+
+    Clients are created on first use and reused for every request, so
+    connections and TLS sessions survive across the whole job. configure()
+    sizes the connection pools to the job's concurrency; a client whose pool
+    is too small is closed and replaced on its next use, so its sockets
+    don't leak.
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE):
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._openai_clients = {}
+
+    def configure(self, concurrency):
+        """
+        Make sure connection pools can hold one connection per in-flight request.
+
+        Pools that are already large enough are kept as they are.
+
+        :param concurrency: Maximum number of requests in flight
+        """
+        with self._lock:
+            if concurrency > self.pool_size:
+                logger.debug(f"Growing backend connection pools to {concurrency}")
+                self.pool_size = concurrency
+
+    def session(self, url):
+        """
+        Return the shared requests session for the host serving url.
+
+        :param url: Any URL on the host
+        :return: A requests.Session
+        """
+        key = _origin(url)
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is None or entry[1] < self.pool_size:
+                if entry is not None:
+                    # Closing only drops idle connections; requests still using
+                    # the old session finish normally
+                    entry[0].close()
+                entry = (create_session(self.pool_size), self.pool_size)
+                self._sessions[key] = entry
+            return entry[0]
+
+    def openai(self, base_url=None):
+        """
+        Return the shared OpenAI client for base_url.
+
+        :param base_url: API base URL (default: the SDK default)
+        :return: An OpenAI client
+        """
+        with self._lock:
+            entry = self._openai_clients.get(base_url)
+            if entry is None or entry[1] < self.pool_size:
+                if entry is not None:
+                    # Every request fetches its client here, so only requests of a job
+                    # started before the pool grew can still be using the old one
+                    entry[0].close()
+                entry = (create_openai_client(self.pool_size, base_url), self.pool_size)
+                self._openai_clients[base_url] = entry
+            return entry[0]
+
+    def close(self):
+        """Close every client and forget them."""
+        with self._lock:
+            for session, _ in self._sessions.values():
+                session.close()
+            for client, _ in self._openai_clients.values():
+                client.close()
+            self._sessions.clear()
+            self._openai_clients.clear()
+
+
+clients = ClientRegistry()
@@ -0,0 +1,99 @@
+import importlib
+import logging
+from urllib.parse import urlsplit
+from requests.exceptions import RequestException
+from .clients import clients
+from .ollama_pool import get_ollama_pool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDING_MODEL = "nomic-embed-text"
+
+
+class OllamaEmbedder:
+    """
+    Embeds text with an Ollama embedding model.
+
+    Uses the batch /api/embed endpoint, falling back to one /api/embeddings
+    call per text on Ollama versions that don't have it. Requests go to the
+    same hosts as generation, through the shared host pool.
+    """
+
+    def __init__(self, settings):
+        self.model = settings.get("embedding_model", DEFAULT_EMBEDDING_MODEL)
+        self.timeout = settings.get("timeout", 30)
+        self.max_retries = settings.get("max_retries", 3)
+        self.pool = get_ollama_pool(settings)
+        self._batch_endpoint = True
+
+    @staticmethod
+    def _origin(url):
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def _post(self, session, url, payload):
+        response = session.post(url, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def _embed_on(self, host, texts):
+        origin = self._origin(host.url)
+        session = clients.session(host.url)
+        if self._batch_endpoint:
+            response = session.post(f"{origin}/api/embed", json={"model": self.model, "input": texts},
+                                    timeout=self.timeout)
+            if response.status_code != 404:
+                response.raise_for_status()
+                return response.json()["embeddings"]
+            logger.info("Ollama has no /api/embed endpoint; using /api/embeddings instead")
+            self._batch_endpoint = False
+        return [self._post(session, f"{origin}/api/embeddings",
+                           {"model": self.model, "prompt": text})["embedding"]
+                for text in texts]
+
+    def __call__(self, texts):
+        """
+        Embed a batch of texts.
+
+        :param texts: List of strings
+        :return: List of embedding vectors, one per text
+        :raises RequestException: If every attempt failed
+        """
+        error = None
+        for attempt in range(self.max_retries):
+            host = self.pool.acquire()
+            ok = False
+            try:
+                embeddings = self._embed_on(host, texts)
+                ok = True
+                return embeddings
+            except (RequestException, KeyError, ValueError) as e:
+                error = e
+                logger.warning(
+                    f"Embedding request failed (attempt {attempt + 1}/{self.max_retries}): {str(e)}")
+            finally:
+                # Embedding latency says little about generation latency, so only report health
+                self.pool.release(host, None, ok=ok)
+        raise RequestException(f"Embedding request failed after {self.max_retries} attempts: {error}")
+
+
+def load_embedder(settings):
+    """
+    Create the embedder named by the embedder setting.
+
+    "ollama" (the default) embeds with OllamaEmbedder. Anything else is read
+    as "package.module:factory": the factory is called with the settings and
+    must return a callable that maps a list of texts to a list of vectors,
+    e.g. a wrapper around a local sentence-transformers model.
+
+    :param settings: Settings snapshot
+    :return: The embedder callable
+    """
+    spec = settings.get("embedder", "ollama")
+    if spec == "ollama":
+        return OllamaEmbedder(settings)
+    module_name, _, attribute = spec.partition(":")
+    if not attribute:
+        raise ValueError(f"Embedder must be 'ollama' or 'package.module:factory', not {spec!r}")
+    factory = getattr(importlib.import_module(module_name), attribute)
+    return factory(settings)
@@ -0,0 +1,30 @@
+import importlib
+import sys
+
+
+def lazy_exports(module_name, exports):
+    """
+    Build the module-level hooks of a package whose exports load on first access.
+
+    Use as ``__getattr__, __dir__, __all__ = lazy_exports(__name__, {...})``.
+    An export is imported the first time it is looked up and then cached in
+    the package's namespace, so later lookups don't go through __getattr__.
+
+    :param module_name: __name__ of the package
+    :param exports: Dict mapping each exported name to the module that
+        defines it, relative to the package (e.g. '.api_client')
+    :return: Tuple of (__getattr__, __dir__, __all__) for the package
+    """
+    names = list(exports)
+
+    def __getattr__(name):
+        if name not in exports:
+            raise AttributeError(f"module {module_name!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(exports[name], module_name), name)
+        setattr(sys.modules[module_name], name, value)
+        return value
+
+    def __dir__():
+        return sorted(set(vars(sys.modules[module_name])) | set(names))
+
+    return __getattr__, __dir__, names
@@ -13,7 +13,7 @@ class QueueHandler(logging.Handler):
         self.log_queue.put(self.format(record))
 
 
-def setup_logger(name='qa_dataset_generator', log_file=None, level=logging.DEBUG, gui_queue=None):
+def setup_logger(name='qa_dataset_generator', log_file=None, level=logging.DEBUG, gui_queue=None, stream=None):
     logger = logging.getLogger()  # Root logger
     logger.setLevel(level)
 
@@ -24,8 +24,8 @@ def setup_logger(name='qa_dataset_generator', log_file=None, level=logging.DEBUG
     formatter = logging.Formatter(
         '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
-    # Console Handler
-    console_handler = logging.StreamHandler(sys.stdout)
+    # Console Handler (stdout unless another stream is given)
+    console_handler = logging.StreamHandler(stream or sys.stdout)
     console_handler.setFormatter(formatter)
     logger.addHandler(console_handler)
 
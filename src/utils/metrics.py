@@ -0,0 +1,458 @@
+import bisect
+import json
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Bucket upper bounds in seconds, for request latencies and for the
+# sub-millisecond database and duplicate checks respectively
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+RATE_BUCKETS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class _Metric:
+    """Base of the metric types: one value per combination of label values."""
+
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames) or not all(name in labels for name in self.labelnames):
+            raise ValueError(f"{self.name} takes the labels {list(self.labelnames)}, not {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key):
+        return list(zip(self.labelnames, key))
+
+    def _items(self):
+        with self._lock:
+            return sorted(self._values.items())
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self):
+        """Return (sample name, [(label, value)], value) tuples for the text format."""
+        return [(self.name, self._labels(key), value) for key, value in self._items()]
+
+    def snapshot(self):
+        return [{"labels": dict(self._labels(key)), "value": value} for key, value in self._items()]
+
+
+class Counter(_Metric):
+    """A count that only goes up, such as requests made or pairs rejected."""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError(f"{self.name} is a counter and can't be decreased")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = self._key(labels)
+        with self._lock:
+            return self._values.get(key, 0)
+
+
+class Gauge(_Metric):
+    """
+    A value that goes up and down, such as a queue depth.
+
+    :param function: Optional callable returning the value (or None for no
+        value) whenever the gauge is read, for unlabelled gauges that are
+        cheaper to read than to keep up to date
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=(), function=None):
+        super().__init__(name, help_text, labelnames)
+        self.function = function
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        if self.function is not None:
+            return self.function()
+        key = self._key(labels)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def _items(self):
+        if self.function is None:
+            return super()._items()
+        value = self.function()
+        return [] if value is None else [((), value)]
+
+
+class Histogram(_Metric):
+    """
+    Counts of observations, such as latencies, in cumulative buckets.
+
+    :param buckets: Increasing bucket upper bounds; +Inf is added
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        # Buckets are "less than or equal", so a value on a bound counts in that bucket
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (the last one is +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the body of a with statement takes, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            return state[2] if state else 0
+
+    def _items(self):
+        with self._lock:
+            return sorted((key, (list(counts), total, count))
+                          for key, (counts, total, count) in self._values.items())
+
+    def samples(self):
+        samples = []
+        for key, (counts, total, count) in self._items():
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", labels + [("le", _format_value(bound))], cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+    def snapshot(self):
+        rows = []
+        for key, (counts, total, count) in self._items():
+            cumulative, buckets = 0, {}
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                buckets[_format_value(bound)] = cumulative
+            rows.append({"labels": dict(self._labels(key)), "count": count, "sum": total,
+                         "mean": total / count if count else None, "buckets": buckets})
+        return rows
+
+
+class MetricsRegistry:
+    """The metrics of a process, rendered together for an endpoint or a snapshot file."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"A metric named {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=(), function=None):
+        return self.register(Gauge(name, help_text, labelnames, function))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def metrics(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    def render(self):
+        """
+        Render every metric in the Prometheus text exposition format.
+
+        :return: The text, ending with a newline
+        """
+        lines = []
+        for metric in self.metrics():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_label_text(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """
+        Return every metric's current values, for a JSON snapshot.
+
+        :return: Dict of metric name -> {"type", "help", "values"}
+        """
+        return {metric.name: {"type": metric.kind, "help": metric.help, "values": metric.snapshot()}
+                for metric in self.metrics()}
+
+    def reset(self):
+        """Clear every recorded value, e.g. between tests."""
+        for metric in self.metrics():
+            metric.reset()
+
+
+registry = MetricsRegistry()
+
+
+def _resident_memory():
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+# The pipeline's metrics, in the order a QA pair meets them
+REQUEST_LATENCY = registry.histogram(
+    "qa_request_latency_seconds",
+    "Time taken by generation requests that got a response, retries included", ("backend",))
+REQUEST_FAILURES = registry.counter(
+    "qa_request_failures_total", "Generation requests that got no response after every retry", ("backend",))
+REQUESTS_IN_FLIGHT = registry.gauge(
+    "qa_requests_in_flight", "Generation requests sent and not yet handled", ("engine",))
+TOKENS = registry.counter(
+    "qa_tokens_total", "Tokens used by generation requests, as reported by the backend", ("backend", "kind"))
+TOKENS_PER_SECOND = registry.histogram(
+    "qa_completion_tokens_per_second", "Completion tokens per second of each generation request",
+    ("backend",), RATE_BUCKETS)
+PARSE_OUTCOMES = registry.counter(
+    "qa_structured_parse_total",
+    "How structured responses were parsed: structured, fallback (not valid JSON) or fallback_failed",
+    ("outcome",))
+REJECTED_PAIRS = registry.counter(
+    "qa_rejected_pairs_total",
+    "Generated pairs that were not stored; stage is parse, stream, dedup or database", ("stage", "reason"))
+DEDUP_CHECK_SECONDS = registry.histogram(
+    "qa_dedup_check_seconds", "Time taken by duplicate checks; check is lexical (per pair) or semantic "
+    "(per response)", ("check",), FAST_BUCKETS)
+WRITER_QUEUE_DEPTH = registry.gauge(
+    "qa_writer_queue_depth", "Accepted pairs waiting to be committed")
+DB_COMMIT_SECONDS = registry.histogram(
+    "qa_db_commit_seconds", "Time taken to insert and commit one batch of pairs", (), FAST_BUCKETS)
+PAIRS_COMMITTED = registry.counter(
+    "qa_pairs_committed_total", "Pairs committed to the database")
+WORK_UNITS = registry.gauge(
+    "qa_work_units", "Units in the work queue by status, as last seen by this worker", ("status",))
+RESIDENT_MEMORY = registry.gauge(
+    "qa_process_resident_memory_bytes", "Resident memory of this process", function=_resident_memory)
+
+
+def record_request(backend, latency, prompt_tokens, completion_tokens):
+    """
+    Record a generation request that got a response.
+
+    :param backend: The API that was used
+    :param latency: Seconds the request took, retries included
+    :param prompt_tokens: Prompt tokens reported by the backend, or None
+    :param completion_tokens: Completion tokens reported by the backend, or None
+    """
+    REQUEST_LATENCY.observe(latency, backend=backend)
+    if prompt_tokens:
+        TOKENS.inc(prompt_tokens, backend=backend, kind="prompt")
+    if completion_tokens:
+        TOKENS.inc(completion_tokens, backend=backend, kind="completion")
+        if latency > 0:
+            TOKENS_PER_SECOND.observe(completion_tokens / latency, backend=backend)
+
+
+def start_metrics_server(port, host="127.0.0.1", metrics=registry):
+    """
+    Serve metrics in the Prometheus text format at http://host:port/metrics.
+
+    The server runs in a daemon thread; stop it with shutdown() and
+    server_close(). It binds to localhost unless told otherwise, since the
+    metrics name topics and hosts.
+
+    :param port: Port to listen on; 0 picks a free one (see server_port)
+    :param host: Address to bind to
+    :param metrics: MetricsRegistry to serve
+    :return: The http.server.ThreadingHTTPServer
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(f"Metrics request from {self.address_string()}: {format % args}")
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Serving metrics at http://{host}:{server.server_port}/metrics")
+    return server
+
+
+def write_snapshot(path, metrics=registry):
+    """
+    Write metrics to a file, replacing it atomically.
+
+    A path ending in .json gets a JSON snapshot; anything else the
+    Prometheus text format, which node_exporter's textfile collector can
+    pick up from a *.prom file.
+
+    :param path: File to write
+    :param metrics: MetricsRegistry to write
+    """
+    if path.endswith(".json"):
+        text = json.dumps(dict(metrics.snapshot(), written_at=time.time()), indent=2)
+    else:
+        text = metrics.render()
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as f:
+        f.write(text)
+    os.replace(temporary, path)
+
+
+class MetricsSnapshotWriter(threading.Thread):
+    """Writes a metrics snapshot file every interval seconds, and a last one when stopped."""
+
+    def __init__(self, path, interval=15.0, metrics=registry):
+        super().__init__(name="metrics-snapshot", daemon=True)
+        self.path = path
+        self.interval = interval
+        self.metrics = metrics
+        self.finished = threading.Event()
+
+    def write(self):
+        try:
+            write_snapshot(self.path, self.metrics)
+        except OSError as e:
+            logger.warning(f"Could not write the metrics snapshot {self.path}: {str(e)}")
+
+    def run(self):
+        while not self.finished.wait(self.interval):
+            self.write()
+
+    def stop(self):
+        self.finished.set()
+        self.join()
+        self.write()
+
+
+class MetricsExporters:
+    """
+    The metrics endpoint and snapshot file of one process, whichever are configured.
+
+    Use as a context manager, or call close(), which writes a last snapshot
+    so a headless run leaves its final numbers behind.
+
+    :param port: Port for the HTTP endpoint, or None/0 for no endpoint
+    :param path: Snapshot file, or None for no file
+    :param interval: Seconds between snapshots
+    :param host: Address the endpoint binds to
+    """
+
+    def __init__(self, port=None, path=None, interval=15.0, host="127.0.0.1"):
+        self.server = start_metrics_server(port, host) if port else None
+        self.snapshots = None
+        if path:
+            self.snapshots = MetricsSnapshotWriter(path, interval)
+            self.snapshots.start()
+
+    @classmethod
+    def from_settings(cls, settings, port=None, path=None, interval=None):
+        """
+        Start the exporters named by the metrics_* settings.
+
+        :param settings: Settings snapshot
+        :param port: Overrides the metrics_port setting
+        :param path: Overrides the metrics_file setting
+        :param interval: Overrides the metrics_interval setting
+        :return: A MetricsExporters
+        """
+        return cls(port if port is not None else settings.get("metrics_port"),
+                   path or settings.get("metrics_file"),
+                   interval or settings.get("metrics_interval", 15.0),
+                   settings.get("metrics_host", "127.0.0.1"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if self.snapshots is not None:
+            self.snapshots.stop()
+            self.snapshots = None
@@ -0,0 +1,187 @@
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OLLAMA_URL = "http://47.18.235.71:11434/api/generate"
+
+# Ceiling in seconds for the latency estimate of a failing host, so that a
+# long outage doesn't keep it out of contention long after it recovers
+MAX_FAILURE_LATENCY = 60.0
+
+
+def parse_api_urls(value):
+    """
+    Normalise the api_url setting into a list of endpoints.
+
+    :param value: A single URL, a comma-separated string of URLs, or a list
+    :return: List of URLs
+    """
+    if not value:
+        return [DEFAULT_OLLAMA_URL]
+    if isinstance(value, str):
+        value = value.split(",")
+    return [url.strip() for url in value if url and url.strip()]
+
+
+class OllamaHost:
+    def __init__(self, url, initial_latency=1.0):
+        self.url = url
+        parts = urlsplit(url)
+        self.health_url = f"{parts.scheme}://{parts.netloc}/api/tags"
+        self.outstanding = 0
+        self.latency = initial_latency
+        self.healthy = True
+        self.consecutive_failures = 0
+
+    def score(self):
+        # Expected wait if we queue one more request on this host
+        return (self.outstanding + 1) * self.latency
+
+
+class OllamaHostPool:
+    """
+    Routes Ollama requests across several hosts.
+
+    Each request goes to the healthy host with the lowest
+    (outstanding requests + 1) x average latency. A host that fails
+    failure_threshold times in a row is taken out of rotation, and a
+    background thread probes every host's /api/tags so that hosts come back
+    once they recover (and go out if they stop answering while idle).
+    """
+
+    def __init__(self, urls, probe_interval=15, failure_threshold=3, probe_timeout=5):
+        self.hosts = [OllamaHost(url) for url in urls]
+        self.probe_interval = probe_interval
+        self.failure_threshold = failure_threshold
+        self.probe_timeout = probe_timeout
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._probe_thread = None
+        if len(self.hosts) > 1 and probe_interval:
+            self._probe_thread = threading.Thread(
+                target=self._probe_loop, name="ollama-health", daemon=True)
+            self._probe_thread.start()
+
+    def acquire(self):
+        """
+        Pick the host for the next request and count it as outstanding.
+
+        :return: The chosen OllamaHost; pass it to release() when done
+        """
+        with self._lock:
+            candidates = [host for host in self.hosts if host.healthy]
+            if not candidates:
+                # Everything looks down: keep trying rather than failing outright
+                candidates = self.hosts
+            host = min(candidates, key=OllamaHost.score)
+            host.outstanding += 1
+            return host
+
+    def release(self, host, latency=None, ok=True):
+        """
+        Report the outcome of a request sent to host.
+
+        :param host: Host returned by acquire()
+        :param latency: Seconds the request took, if it succeeded
+        :param ok: Whether the request succeeded
+        """
+        with self._lock:
+            host.outstanding -= 1
+            if ok:
+                host.consecutive_failures = 0
+                if latency is not None:
+                    host.latency = 0.8 * host.latency + 0.2 * latency
+                return
+
+            host.consecutive_failures += 1
+            # Steer traffic away right away, before the host is marked down
+            host.latency = min(host.latency * 2, max(MAX_FAILURE_LATENCY, host.latency))
+            if host.healthy and host.consecutive_failures >= self.failure_threshold \
+                    and len(self.hosts) > 1:
+                host.healthy = False
+                logger.warning(
+                    f"Ollama host {host.url} taken out of rotation after "
+                    f"{host.consecutive_failures} consecutive failures")
+
+    def healthy_hosts(self):
+        with self._lock:
+            return [host.url for host in self.hosts if host.healthy]
+
+    def probe(self, host):
+        """
+        Check whether a host answers and update its health accordingly.
+
+        :param host: Host to probe
+        :return: True if the host is healthy
+        """
+        # Imported here so that parse_api_urls (used by the settings page)
+        # doesn't load requests
+        from requests.exceptions import RequestException
+        from .clients import clients
+
+        start = time.monotonic()
+        try:
+            response = clients.session(host.health_url).get(
+                host.health_url, timeout=self.probe_timeout)
+            ok = response.status_code == 200
+        except RequestException:
+            ok = False
+        latency = time.monotonic() - start
+
+        with self._lock:
+            if ok and not host.healthy:
+                logger.info(f"Ollama host {host.url} is back in rotation")
+                host.healthy = True
+                host.consecutive_failures = 0
+                # Start from an optimistic estimate so it gets traffic again
+                host.latency = min(h.latency for h in self.hosts)
+            elif not ok and host.healthy and len(self.hosts) > 1:
+                logger.warning(f"Ollama host {host.url} failed its health check")
+                host.healthy = False
+        logger.debug(f"Probed {host.health_url}: ok={ok} in {latency:.2f}s")
+        return ok
+
+    def _probe_loop(self):
+        while not self._stop_event.wait(self.probe_interval):
+            for host in self.hosts:
+                self.probe(host)
+
+    def close(self):
+        """Stop the health probe thread."""
+        self._stop_event.set()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_ollama_pool(settings):
+    """
+    Return the shared host pool for the api_url setting.
+
+    The pool is rebuilt when the host list or any of the health check
+    options change.
+
+    :param settings: Settings providing api_url and the health check options
+    :return: An OllamaHostPool
+    """
+    urls = tuple(parse_api_urls(settings.get("api_url")))
+    options = (settings.get("ollama_probe_interval", 15),
+               settings.get("ollama_failure_threshold", 3),
+               settings.get("ollama_probe_timeout", 5))
+    with _pools_lock:
+        pool = _pools.get((urls, options))
+        if pool is None:
+            # The settings changed: retire the old pool's probe thread
+            for old_pool in _pools.values():
+                old_pool.close()
+            _pools.clear()
+            probe_interval, failure_threshold, probe_timeout = options
+            pool = OllamaHostPool(urls, probe_interval=probe_interval,
+                                  failure_threshold=failure_threshold, probe_timeout=probe_timeout)
+            _pools[(urls, options)] = pool
+        return pool
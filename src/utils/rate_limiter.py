@@ -0,0 +1,274 @@
+import asyncio
+import logging
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+# Requests per minute used for OpenAI when openai_rpm is not set
+DEFAULT_OPENAI_RPM = 60
+
+# Consecutive responses slower than latency_target before the rate is cut;
+# a single slow response only stops the rate from climbing
+SLOW_RESPONSES_BEFORE_DECREASE = 3
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at rate_per_minute.
+
+    Reservations may take the bucket below zero; the caller then waits until
+    the debt has been refilled. That keeps acquiring O(1) and fair without
+    a queue of waiters.
+    """
+
+    def __init__(self, rate_per_minute, burst_seconds=10):
+        self.burst_seconds = burst_seconds
+        self.rate_per_minute = rate_per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def capacity(self):
+        return max(1.0, self.rate_per_minute * self.burst_seconds / 60)
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        self.updated = now
+        self.level = min(self.capacity, self.level + elapsed * self.rate_per_minute / 60)
+
+    def reserve(self, amount, now):
+        """
+        Take amount from the bucket.
+
+        :param amount: Number of tokens to take
+        :param now: Current time.monotonic() value
+        :return: Seconds to wait before the reservation may be used
+        """
+        self._refill(now)
+        self.level -= amount
+        if self.level >= 0:
+            return 0.0
+        return -self.level * 60 / self.rate_per_minute
+
+    def adjust(self, amount, now):
+        """Give back (negative) or take (positive) tokens after the fact."""
+        self._refill(now)
+        self.level = min(self.capacity, self.level - amount)
+
+    def set_rate(self, rate_per_minute, now):
+        self._refill(now)
+        self.rate_per_minute = rate_per_minute
+        self.level = min(self.level, self.capacity)
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header value.
+
+    :param value: Header value, either delta-seconds or an HTTP date
+    :return: Seconds to wait, or None if the value can't be parsed
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveRateLimiter:
+    """
+    Per-endpoint limiter for requests/min and tokens/min with AIMD control.
+
+    The request rate starts at the configured ceiling (or unthrottled when
+    there is none), is cut multiplicatively on 429s, server errors and
+    latency that stays above latency_target, and climbs back additively on
+    successes within the target. Successes slower than the target hold the
+    rate where it is.
+    A Retry-After from the server pauses every caller of the endpoint.
+    """
+
+    def __init__(self, name, requests_per_minute=None, tokens_per_minute=None,
+                 latency_target=None, min_rpm=1.0, decrease_factor=0.5):
+        self.name = name
+        self.latency_target = latency_target
+        self.min_rpm = min_rpm
+        self.decrease_factor = decrease_factor
+
+        self._lock = threading.Lock()
+        self._max_rpm = requests_per_minute
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._blocked_until = 0.0
+        # Recent completion rate, used as the starting point when an
+        # unthrottled endpoint first pushes back
+        self._observed_rpm = None
+        self._last_completion = None
+        self._slow_streak = 0
+
+    @property
+    def current_rpm(self):
+        """Current request rate limit, or None when unthrottled."""
+        return self._requests.rate_per_minute if self._requests else None
+
+    def configure(self, requests_per_minute=None, tokens_per_minute=None, latency_target=None):
+        """Update the ceilings, e.g. after the settings changed."""
+        with self._lock:
+            now = time.monotonic()
+            self.latency_target = latency_target
+            if requests_per_minute != self._max_rpm:
+                self._max_rpm = requests_per_minute
+                if requests_per_minute is None:
+                    self._requests = None
+                elif self._requests is None:
+                    self._requests = TokenBucket(requests_per_minute)
+                else:
+                    self._requests.set_rate(min(self._requests.rate_per_minute, requests_per_minute), now)
+            if tokens_per_minute is None:
+                self._tokens = None
+            elif self._tokens is None:
+                self._tokens = TokenBucket(tokens_per_minute)
+            elif self._tokens.rate_per_minute != tokens_per_minute:
+                self._tokens.set_rate(tokens_per_minute, now)
+
+    def _reserve(self, tokens):
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._blocked_until - now)
+            if self._requests:
+                wait = max(wait, self._requests.reserve(1, now))
+            if self._tokens and tokens:
+                wait = max(wait, self._tokens.reserve(tokens, now))
+            return wait
+
+    def acquire(self, tokens=0):
+        """
+        Block until a request using about `tokens` tokens may be sent.
+
+        :param tokens: Estimated tokens the request will consume
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            logger.debug(f"Rate limiter '{self.name}' waiting {wait:.2f}s")
+            time.sleep(wait)
+
+    async def aacquire(self, tokens=0):
+        """Async counterpart of acquire()."""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def _decrease(self, now):
+        if self._requests is None:
+            if self._observed_rpm is None:
+                # No idea yet what rate this endpoint sustains; rely on
+                # Retry-After and the caller's backoff instead of guessing
+                return
+            self._requests = TokenBucket(
+                max(self.min_rpm, self._observed_rpm * self.decrease_factor))
+        else:
+            self._requests.set_rate(
+                max(self.min_rpm, self._requests.rate_per_minute * self.decrease_factor), now)
+        logger.info(
+            f"Rate limiter '{self.name}' backing off to {self._requests.rate_per_minute:.1f} requests/min")
+
+    def record_success(self, latency, tokens_used=None, tokens_reserved=0):
+        """
+        Report a successful request.
+
+        :param latency: Seconds the request took
+        :param tokens_used: Tokens actually consumed, if the backend reported them
+        :param tokens_reserved: Tokens that were passed to acquire()
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._last_completion is not None:
+                interval = max(now - self._last_completion, 1e-3)
+                rpm = 60 / interval
+                self._observed_rpm = rpm if self._observed_rpm is None else \
+                    0.9 * self._observed_rpm + 0.1 * rpm
+            self._last_completion = now
+
+            if self._tokens and tokens_used is not None:
+                self._tokens.adjust(tokens_used - tokens_reserved, now)
+
+            if self.latency_target and latency > self.latency_target:
+                self._slow_streak += 1
+                if self._slow_streak >= SLOW_RESPONSES_BEFORE_DECREASE:
+                    self._slow_streak = 0
+                    self._decrease(now)
+                return
+            self._slow_streak = 0
+
+            if self._requests is None:
+                return
+            # Additive increase, in steps of 2% of the ceiling
+            step = max(1.0, (self._max_rpm or self._observed_rpm or 0) / 50)
+            rate = self._requests.rate_per_minute + step
+            if self._max_rpm is None:
+                if self._observed_rpm and rate > 2 * self._observed_rpm:
+                    # Well above what we actually use: stop throttling altogether
+                    self._requests = None
+                    return
+            else:
+                rate = min(rate, self._max_rpm)
+            self._requests.set_rate(rate, now)
+
+    def record_throttle(self, retry_after=None):
+        """
+        Report a 429 (or similar) response.
+
+        :param retry_after: Seconds the server asked us to wait, if given
+        """
+        with self._lock:
+            now = time.monotonic()
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+            self._decrease(now)
+
+    def record_error(self):
+        """Report a server error or timeout, which is treated as congestion."""
+        with self._lock:
+            self._decrease(time.monotonic())
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def _limits_for(backend, settings):
+    if backend == 'openai':
+        return (settings.get("openai_rpm", DEFAULT_OPENAI_RPM),
+                settings.get("openai_tpm"),
+                settings.get("openai_latency_target"))
+    # Local Ollama hosts are unthrottled unless configured otherwise
+    return (settings.get("ollama_rpm"),
+            settings.get("ollama_tpm"),
+            settings.get("ollama_latency_target"))
+
+
+def get_rate_limiter(backend, endpoint, settings):
+    """
+    Return the shared limiter for a backend endpoint.
+
+    :param backend: 'ollama' or 'openai'
+    :param endpoint: URL (or other key) identifying the endpoint
+    :param settings: Settings providing the ceilings
+    :return: An AdaptiveRateLimiter
+    """
+    requests_per_minute, tokens_per_minute, latency_target = _limits_for(backend, settings)
+    with _limiters_lock:
+        limiter = _limiters.get((backend, endpoint))
+        if limiter is None:
+            limiter = AdaptiveRateLimiter(f"{backend}:{endpoint}", requests_per_minute,
+                                          tokens_per_minute, latency_target)
+            _limiters[(backend, endpoint)] = limiter
+            return limiter
+    limiter.configure(requests_per_minute, tokens_per_minute, latency_target)
+    return limiter
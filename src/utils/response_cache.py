@@ -0,0 +1,145 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+PASSTHROUGH = 'passthrough'
+RECORD = 'record'
+REPLAY = 'replay'
+MODES = (PASSTHROUGH, RECORD, REPLAY)
+
+DEFAULT_CACHE_DIR = "response_cache"
+
+# Request fields that don't affect what the model is asked to generate
+_UNKEYED_FIELDS = ("seed", "stream")
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk store of API responses ("cassettes").
+
+    Each request is keyed by a hash of its backend, model, prompt and
+    sampling parameters; the time-based Ollama seed is left out so the same
+    request maps to the same key on every run. A key holds every response
+    recorded for it, one JSON line per response, and replay hands them out
+    in order, wrapping around, so a job that sends the same prompt many
+    times still sees varied responses.
+
+    In 'record' mode live responses are stored, in 'replay' mode requests
+    are answered from the cache only, and in 'passthrough' mode the cache
+    is not used at all.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, mode=PASSTHROUGH):
+        if mode not in MODES:
+            raise ValueError(f"Invalid response cache mode: {mode}")
+        self.directory = directory
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._cursors = {}
+
+    @property
+    def recording(self):
+        return self.mode == RECORD
+
+    @property
+    def replaying(self):
+        return self.mode == REPLAY
+
+    @staticmethod
+    def key(backend, request):
+        """
+        Compute the cache key for a request.
+
+        :param backend: 'ollama' or 'openai'
+        :param request: Dict of everything sent to the backend
+        :return: Hex digest identifying the request
+        """
+        keyed = {name: value for name, value in request.items() if name not in _UNKEYED_FIELDS}
+        canonical = json.dumps({"backend": backend, "request": keyed},
+                               sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.jsonl")
+
+    def _load(self, key):
+        entries = self._entries.get(key)
+        if entries is None:
+            entries = []
+            try:
+                with open(self._path(key), "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            entries.append(json.loads(line))
+                        except ValueError:
+                            # A job interrupted mid-write leaves a partial last line
+                            logger.warning(f"Skipping truncated response in {self._path(key)}")
+            except FileNotFoundError:
+                pass
+            self._entries[key] = entries
+        return entries
+
+    def replay(self, key):
+        """
+        Return the next recorded response for a key.
+
+        :param key: Key from key()
+        :return: The recorded response data, or None if nothing was recorded
+        """
+        with self._lock:
+            entries = self._load(key)
+            if not entries:
+                return None
+            index = self._cursors.get(key, 0)
+            self._cursors[key] = index + 1
+            return entries[index % len(entries)]
+
+    def record(self, key, response):
+        """
+        Store a response for a key.
+
+        :param key: Key from key()
+        :param response: JSON-serialisable response data
+        """
+        line = (json.dumps(response) + "\n").encode("utf-8")
+        path = self._path(key)
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Appending keeps each recording O(1) however many responses
+            # the key already holds
+            with open(path, "ab+") as f:
+                if f.tell():
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        # Close off a line an interrupted job left unfinished
+                        line = b"\n" + line
+                f.write(line)
+            entries = self._entries.get(key)
+            if entries is not None:
+                entries.append(response)
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache(settings):
+    """
+    Return the shared response cache configured by the settings.
+
+    :param settings: Settings providing response_cache_mode and response_cache_dir
+    :return: A ResponseCache
+    """
+    mode = settings.get("response_cache_mode") or PASSTHROUGH
+    directory = settings.get("response_cache_dir") or DEFAULT_CACHE_DIR
+    with _caches_lock:
+        cache = _caches.get((directory, mode))
+        if cache is None:
+            cache = ResponseCache(directory, mode)
+            _caches[(directory, mode)] = cache
+        return cache
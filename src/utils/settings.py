@@ -0,0 +1,83 @@
+import json
+import logging
+import os
+import threading
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+SETTINGS_FILE = "settings.json"
+
+
+class SettingsStore:
+    """
+    Process-wide cache of settings.json.
+
+    The file is parsed once and only re-read when its modification time or
+    size changes, so checking for changes costs a single stat() call.
+    get() hands out read-only snapshots; a generation job takes one when it
+    starts and uses it for every request it makes.
+    """
+
+    def __init__(self, path=SETTINGS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._snapshot = MappingProxyType({})
+        self._signature = None
+        self._loaded = False
+
+    def _stat_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self):
+        """
+        Return the current settings.
+
+        :return: Read-only mapping of setting names to values
+        """
+        signature = self._stat_signature()
+        if self._loaded and signature == self._signature:
+            return self._snapshot
+
+        with self._lock:
+            # Another thread may have reloaded while we waited for the lock
+            if self._loaded and signature == self._signature:
+                return self._snapshot
+
+            if signature is None:
+                settings = {}
+            else:
+                try:
+                    with open(self.path, "r") as f:
+                        settings = json.load(f)
+                except (OSError, ValueError) as e:
+                    # Most likely caught the file mid-save; keep the last good
+                    # settings and try again on the next call
+                    logger.warning(f"Could not read {self.path}: {str(e)}")
+                    return self._snapshot
+
+            self._snapshot = MappingProxyType(settings)
+            self._signature = signature
+            self._loaded = True
+            return self._snapshot
+
+    def invalidate(self):
+        """Force the next get() to re-read the file, e.g. right after saving it."""
+        with self._lock:
+            self._loaded = False
+
+
+settings_store = SettingsStore()
+
+
+def get_settings():
+    """
+    Return a read-only snapshot of the current settings.
+
+    :return: Read-only mapping of setting names to values
+    """
+    return settings_store.get()
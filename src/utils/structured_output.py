@@ -0,0 +1,114 @@
+import json
+import logging
+import threading
+from collections import Counter
+from functools import lru_cache
+from typing import List
+from .metrics import PARSE_OUTCOMES
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def _records_adapter():
+    """
+    Build the validator for lists of QA records on first use.
+
+    Building a pydantic model costs tens of milliseconds, which jobs that
+    never ask for structured output shouldn't pay at import time.
+    """
+    from pydantic import BaseModel, TypeAdapter
+
+    class QAPairRecord(BaseModel):
+        question: str
+        answer: str
+        category: str = ""
+
+    return TypeAdapter(List[QAPairRecord])
+
+
+_RECORD_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "question": {"type": "string"},
+        "answer": {"type": "string"},
+        "category": {"type": "string"},
+    },
+    "required": ["question", "answer", "category"],
+    "additionalProperties": False,
+}
+
+
+def qa_json_schema(count=1):
+    """
+    JSON schema for a structured response holding count QA pairs.
+
+    The schema is written out rather than generated from QAPairRecord
+    because OpenAI's strict mode requires every property to be listed as
+    required and additionalProperties to be false.
+
+    :param count: Number of QA pairs the response should hold
+    :return: The schema as a dict
+    """
+    if count == 1:
+        return _RECORD_SCHEMA
+    return {
+        "type": "object",
+        "properties": {"pairs": {"type": "array", "items": _RECORD_SCHEMA}},
+        "required": ["pairs"],
+        "additionalProperties": False,
+    }
+
+
+def decode_qa_records(response_text):
+    """
+    Decode a structured response into validated records.
+
+    Accepts a single QA object, an object with a "pairs" list, or a bare
+    list, whatever was asked for, since models don't always match the
+    requested shape exactly.
+
+    :param response_text: Text generated by the API
+    :return: List of QAPairRecord, or None if the text isn't valid QA JSON
+    """
+    try:
+        data = json.loads(response_text)
+    except ValueError:
+        return None
+    if isinstance(data, dict) and "pairs" in data:
+        data = data["pairs"]
+    if isinstance(data, dict):
+        data = [data]
+    from pydantic import ValidationError
+
+    try:
+        return _records_adapter().validate_python(data)
+    except ValidationError as e:
+        logger.debug(f"Structured response failed validation: {e}")
+        return None
+
+
+class ParseStats:
+    """Thread-safe counts of how responses were parsed."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def record(self, outcome):
+        with self._lock:
+            self._counts[outcome] += 1
+        PARSE_OUTCOMES.inc(outcome=outcome)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+# 'structured': decoded as JSON; 'fallback': JSON decoding failed and the
+# text parser was used instead; 'fallback_failed': that found nothing either
+parse_stats = ParseStats()
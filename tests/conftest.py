@@ -0,0 +1,15 @@
+import pytest
+from src.data.database_operations import create_table
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Path to a database file that has not been created yet."""
+    return str(tmp_path / "test.db")
+
+
+@pytest.fixture
+def table_db_path(db_path):
+    """Path to a database with an empty qa_pairs table."""
+    create_table(db_path)
+    return db_path
@@ -0,0 +1,73 @@
+import asyncio
+import threading
+import uuid
+import httpx
+import pytest
+from unittest.mock import Mock, patch
+from src.data.dataset_creator import acreate_dataset, create_dataset
+from src.data.database_operations import get_dataset_stats
+from src.utils.async_api_client import AsyncBackendClients, amake_api_request
+
+
+def make_agenerate():
+    state = {"calls": 0, "active": 0, "peak": 0}
+
+    async def fake_agenerate(topic, stop_event, api_choice, clients, settings=None, question_filter=None,
+                             metadata=None):
+        state["calls"] += 1
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(0.01)
+        state["active"] -= 1
+        return f"What is {uuid.uuid4().hex} in {topic}?", "A sufficiently long answer.", topic
+
+    return fake_agenerate, state
+
+
+def test_acreate_dataset_keeps_many_requests_in_flight(db_path):
+    fake_agenerate, state = make_agenerate()
+    with patch('src.data.dataset_creator.agenerate_qa_pair', side_effect=fake_agenerate):
+        result = asyncio.run(acreate_dataset(
+            20, db_path, ["python"], Mock(), threading.Event(), 'ollama', concurrency=20))
+
+    assert result == 20
+    assert state["peak"] == 20
+    assert get_dataset_stats(db_path)["total_pairs"] == 20
+
+
+def test_create_dataset_asyncio_engine_adapter(db_path):
+    fake_agenerate, _ = make_agenerate()
+    with patch('src.data.dataset_creator.agenerate_qa_pair', side_effect=fake_agenerate):
+        result = create_dataset(5, db_path, ["python"], Mock(), threading.Event(), 'ollama',
+                                concurrency=8, engine='asyncio')
+
+    assert result == 5
+    assert get_dataset_stats(db_path)["total_pairs"] == 5
+
+
+@patch('src.utils.async_api_client._backoff_delay', return_value=0)
+@patch('src.utils.async_api_client.load_settings', return_value={"max_retries": 3})
+def test_amake_api_request_retries_ollama(mock_settings, mock_delay):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) < 3:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"response": "Question: Q?\nAnswer: A.\nCategory: C"})
+
+    async def run():
+        clients = AsyncBackendClients()
+        clients.http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await amake_api_request("prompt", 'ollama', clients)
+        finally:
+            await clients.aclose()
+
+    result = asyncio.run(run())
+    assert len(calls) == 3
+    assert result["response"].startswith("Question:")
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,87 @@
+import sqlite3
+import pytest
+from src.data import batch_writer
+from src.data.batch_writer import QAPairWriter
+from src.data.database_operations import get_dataset_stats, is_duplicate
+
+
+def test_flush_commits_queued_pairs(table_db_path):
+    writer = QAPairWriter(table_db_path, batch_size=100, flush_interval=60)
+    for i in range(10):
+        writer.submit(f"Question {i} about {'abcdefghij'[i] * 20}?", "Answer.", "test")
+
+    assert writer.flush(timeout=5) == 10
+    assert writer.queue_depth() == 0
+    assert get_dataset_stats(table_db_path)["total_pairs"] == 10
+    assert writer.close(timeout=5) == 10
+
+
+def test_close_commits_remaining_pairs(table_db_path):
+    with QAPairWriter(table_db_path, batch_size=100, flush_interval=60) as writer:
+        writer.submit("What is Python?", "A programming language.", "python")
+
+    assert writer.committed_count == 1
+    assert is_duplicate("What is python?", table_db_path) is True
+
+
+def test_pending_pairs_count_as_duplicates(table_db_path):
+    writer = QAPairWriter(table_db_path, batch_size=100, flush_interval=60)
+    writer.submit("What is the capital of France?", "Paris.", "geography")
+
+    assert writer.is_pending_duplicate("What is the capital of France?") is True
+    assert writer.is_pending_duplicate("How do vaccines work?") is False
+    writer.close(timeout=5)
+
+
+def test_database_rejections_are_counted(table_db_path):
+    with QAPairWriter(table_db_path) as writer:
+        writer.submit("What is Python?", "A programming language.", "python")
+        writer.submit("What is Python?", "A snake.", "biology")
+
+    assert writer.committed_count == 1
+    assert writer.failed_count == 1
+
+
+def test_submit_after_close_raises(table_db_path):
+    writer = QAPairWriter(table_db_path)
+    writer.close(timeout=5)
+    with pytest.raises(RuntimeError):
+        writer.submit("What is Python?", "A programming language.", "python")
+
+
+def test_failed_commits_are_retried(table_db_path, monkeypatch):
+    write_qa_pair = batch_writer.write_qa_pair
+    calls = []
+
+    def locked_once(cursor, *args):
+        calls.append(args[0])
+        if len(calls) == 2:
+            raise sqlite3.OperationalError("database is locked")
+        return write_qa_pair(cursor, *args)
+
+    monkeypatch.setattr(batch_writer, "write_qa_pair", locked_once)
+    with QAPairWriter(table_db_path, retry_delay=0.01) as writer:
+        writer.submit("What is Python?", "A programming language.", "python")
+        writer.submit("What is Rust?", "A programming language.", "rust")
+
+    assert writer.committed_count == 2
+    assert writer.failed_count == 0
+    assert get_dataset_stats(table_db_path)["total_pairs"] == 2
+
+
+def test_batches_that_keep_failing_are_counted_as_lost(table_db_path, monkeypatch):
+    def locked(cursor, *args):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(batch_writer, "write_qa_pair", locked)
+    with QAPairWriter(table_db_path, max_retries=2, retry_delay=0.01) as writer:
+        writer.submit("What is Python?", "A programming language.", "python")
+        writer.submit("What is Rust?", "A programming language.", "rust")
+
+    assert writer.committed_count == 0
+    assert writer.failed_count == writer.lost_count == 2
+    assert writer.queue_depth() == 0
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,106 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import pytest
+from benchmarks.mock_server import MockConfig, MockServer
+from src.data.database_operations import create_table, insert_qa_pair
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs a CLI command in-process and reports which heavy modules it loaded
+PROBE = """
+import sys
+sys.argv = ['main.py'] + sys.argv[1:]
+import main
+try:
+    main.main()
+except SystemExit as e:
+    code = e.code
+loaded = [m for m in ('tkinter', 'ttkbootstrap', 'src.gui', 'src.utils.api_client', 'openai')
+          if m in sys.modules]
+sys.stderr.write('LOADED=' + ','.join(loaded) + '\\n')
+sys.exit(code)
+"""
+
+
+def run_cli(*args, cwd=ROOT):
+    result = subprocess.run([sys.executable, "-c", PROBE, *args], cwd=cwd,
+                            capture_output=True, text=True, timeout=120)
+    probe = [line for line in result.stderr.splitlines() if line.startswith("LOADED=")][-1]
+    return result, [m for m in probe[len("LOADED="):].split(",") if m]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "test.db")
+    create_table(path)
+    for i in range(5):
+        insert_qa_pair(path, f"Question {i}?", f"Answer {i}.", "python" if i < 3 else "math")
+    return path
+
+
+def test_stats_prints_json_without_gui_or_api_clients(db_path):
+    result, loaded = run_cli("stats", "--db", db_path, "--json")
+
+    assert result.returncode == 0, result.stderr
+    assert json.loads(result.stdout) == {"total_pairs": 5, "category_counts": {"math": 2, "python": 3}}
+    assert loaded == []
+
+
+def test_export_streams_progress_to_stderr(db_path, tmp_path):
+    output = str(tmp_path / "out.jsonl")
+    result, loaded = run_cli("export", "--db", db_path, "--output", output)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == ""
+    assert "Exported: 5/5 (100%)" in result.stderr
+    with open(output, encoding="utf-8") as f:
+        assert len(f.readlines()) == 5
+    assert loaded == []
+
+
+def test_missing_database_is_an_error(tmp_path):
+    result, _ = run_cli("stats", "--db", str(tmp_path / "missing.db"))
+
+    assert result.returncode != 0
+    assert "Database not found" in result.stderr
+    assert not os.path.exists(tmp_path / "missing.db")
+
+
+def test_database_without_qa_pairs_is_an_error(tmp_path):
+    path = str(tmp_path / "other.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE notes (body TEXT)")
+    conn.close()
+
+    result, _ = run_cli("stats", "--db", path)
+
+    assert result.returncode == 1
+    assert "stats failed: no such table: qa_pairs" in result.stderr
+    assert "Traceback" not in result.stderr
+
+
+def test_generate_against_mock_server(tmp_path):
+    db_path = str(tmp_path / "gen.db")
+    with MockServer(MockConfig(latency_ms=0, seed=3)) as server:
+        # settings.json is read from the working directory
+        with open(tmp_path / "settings.json", "w") as f:
+            json.dump({"api_url": f"{server.url}/api/generate", "max_retries": 1,
+                       "ollama_probe_interval": 0}, f)
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        result = subprocess.run(
+            [sys.executable, os.path.join(ROOT, "main.py"), "generate", "--db", db_path,
+             "--entries", "4", "--topics", "python, math", "--concurrency", "2"],
+            cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120)
+
+    assert result.returncode == 0, result.stderr
+    assert "Generated: 4/4 (100%)" in result.stderr
+
+    result, _ = run_cli("stats", "--db", db_path, "--json")
+    assert json.loads(result.stdout)["total_pairs"] == 4
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,57 @@
+from unittest.mock import Mock, patch
+import pytest
+from src.utils.clients import ClientRegistry
+
+
+@pytest.fixture
+def registry():
+    registry = ClientRegistry(pool_size=4)
+    yield registry
+    registry.close()
+
+
+def test_session_is_reused_per_host(registry):
+    a = registry.session("http://ollama-1:11434/api/generate")
+    b = registry.session("http://ollama-1:11434/api/tags")
+    c = registry.session("http://ollama-2:11434/api/generate")
+
+    assert a is b
+    assert a is not c
+
+
+def test_pool_is_sized_to_concurrency(registry):
+    registry.configure(16)
+    session = registry.session("http://ollama-1:11434/api/generate")
+    assert session.get_adapter("http://ollama-1:11434")._pool_maxsize == 16
+
+
+def test_configure_rebuilds_undersized_pools_only(registry):
+    small = registry.session("http://ollama-1:11434/api/generate")
+    registry.configure(2)
+    assert registry.session("http://ollama-1:11434/api/generate") is small
+
+    registry.configure(32)
+    assert registry.session("http://ollama-1:11434/api/generate") is not small
+
+
+def test_replaced_clients_are_closed(registry):
+    with patch("src.utils.clients.create_session", side_effect=lambda size: Mock()), \
+            patch("src.utils.clients.create_openai_client", side_effect=lambda size, base_url: Mock()):
+        session = registry.session("http://ollama-1:11434/api/generate")
+        client = registry.openai()
+        registry.configure(32)
+        registry.session("http://ollama-1:11434/api/generate")
+        registry.openai()
+
+    session.close.assert_called_once_with()
+    client.close.assert_called_once_with()
+
+
+def test_openai_client_is_reused(registry, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    assert registry.openai() is registry.openai()
+    assert registry.openai("http://localhost:8000/v1") is not registry.openai()
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,92 @@
+import threading
+import uuid
+import time
+import pytest
+from unittest.mock import Mock, patch
+from src.data import batch_writer
+from src.data.dataset_creator import create_dataset
+from src.data.database_operations import get_dataset_stats
+
+
+def make_generator(delay=0.05):
+    """Return a fake generate_qa_pair that yields unique pairs and tracks concurrency."""
+    lock = threading.Lock()
+    state = {"calls": 0, "active": 0, "peak": 0}
+
+    def fake_generate(topic, stop_event, api_choice, settings=None, question_filter=None, metadata=None):
+        with lock:
+            state["calls"] += 1
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+        time.sleep(delay)
+        with lock:
+            state["active"] -= 1
+        return f"What is {uuid.uuid4().hex} in {topic}?", "A sufficiently long answer.", topic
+
+    return fake_generate, state
+
+
+def test_create_dataset_runs_requests_concurrently(db_path):
+    fake_generate, state = make_generator()
+    with patch('src.data.dataset_creator.generate_qa_pair', side_effect=fake_generate):
+        result = create_dataset(8, db_path, ["python"], Mock(),
+                                threading.Event(), 'ollama', concurrency=4)
+
+    assert result == 8
+    assert state["peak"] > 1
+    assert get_dataset_stats(db_path)["total_pairs"] == 8
+
+
+def test_create_dataset_stops_exactly_at_num_entries(db_path):
+    fake_generate, _ = make_generator(delay=0.01)
+    with patch('src.data.dataset_creator.generate_qa_pair', side_effect=fake_generate):
+        result = create_dataset(5, db_path, ["python"], Mock(),
+                                threading.Event(), 'ollama', concurrency=8)
+
+    assert result == 5
+    assert get_dataset_stats(db_path)["total_pairs"] == 5
+
+
+def test_create_dataset_replaces_pairs_the_database_rejects(db_path, monkeypatch):
+    write_qa_pair = batch_writer.write_qa_pair
+    rejected = []
+
+    def reject_first_two(cursor, question, *args):
+        if len(rejected) < 2:
+            rejected.append(question)
+            return None
+        return write_qa_pair(cursor, question, *args)
+
+    monkeypatch.setattr(batch_writer, "write_qa_pair", reject_first_two)
+    fake_generate, _ = make_generator(delay=0.01)
+    with patch('src.data.dataset_creator.generate_qa_pair', side_effect=fake_generate):
+        result = create_dataset(5, db_path, ["python"], Mock(),
+                                threading.Event(), 'ollama', concurrency=2)
+
+    assert len(rejected) == 2
+    assert result == 5
+    assert get_dataset_stats(db_path)["total_pairs"] == 5
+
+
+def test_create_dataset_concurrent_error_limit(db_path):
+    with patch('src.data.dataset_creator.generate_qa_pair', return_value=(None, None, None)):
+        result = create_dataset(10, db_path, ["python"], Mock(),
+                                threading.Event(), 'ollama', concurrency=4)
+
+    assert result == 0
+
+
+def test_create_dataset_concurrent_stop_event(db_path):
+    stop_event = threading.Event()
+    stop_event.set()
+    generate = Mock()
+    with patch('src.data.dataset_creator.generate_qa_pair', generate):
+        result = create_dataset(10, db_path, ["python"], Mock(),
+                                stop_event, 'ollama', concurrency=4)
+
+    assert result == 0
+    generate.assert_not_called()
+
+
+if __name__ == "__main__":
+    pytest.main()
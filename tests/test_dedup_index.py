@@ -0,0 +1,88 @@
+import random
+import sqlite3
+import pytest
+from benchmarks.lsh_candidates import near_duplicate, synthetic_questions
+from src.data.dedup_index import lsh_buckets, minhash_signature, shingles, NUM_BANDS
+from src.data.database_operations import create_table, insert_qa_pair, is_duplicate
+
+
+def test_shingles_are_case_insensitive():
+    assert shingles("ABcd") == {"abc", "bcd"}
+    assert shingles("ab") == {"ab"}
+
+
+def test_signature_is_deterministic():
+    assert minhash_signature("What is Python?") == minhash_signature("What is Python?")
+    assert len(lsh_buckets("What is Python?")) == NUM_BANDS
+
+
+def test_near_duplicates_share_a_bucket():
+    a = set(lsh_buckets("What is the capital city of France?"))
+    b = set(lsh_buckets("What is the capital city of France ?"))
+    assert a & b
+
+
+def test_is_duplicate_uses_index(table_db_path):
+    insert_qa_pair(table_db_path, "What is the capital of France?", "Paris.", "geography")
+
+    assert is_duplicate("What is the capital of France?", table_db_path) is True
+    assert is_duplicate("what is the capital of france?", table_db_path) is True
+    assert is_duplicate("How do vaccines train the immune system?", table_db_path) is False
+    assert is_duplicate("What is the capital of Spain?", table_db_path, threshold=0.9) is False
+
+
+def test_create_table_backfills_existing_rows(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    conn.execute('''CREATE TABLE qa_pairs
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     question TEXT UNIQUE,
+                     answer TEXT,
+                     category TEXT)''')
+    conn.execute("INSERT INTO qa_pairs (question, answer, category) VALUES (?, ?, ?)",
+                 ("What is Python?", "A programming language.", "python"))
+    conn.commit()
+    conn.close()
+
+    create_table(path)
+
+    assert is_duplicate("What is python?", path) is True
+
+
+def test_same_topic_questions_rarely_become_candidates():
+    rng = random.Random(3)
+    questions = synthetic_questions(400, rng)
+    stored, probes = questions[:350], questions[350:]
+    index = {}
+    for qa_id, question in enumerate(stored):
+        for bucket in lsh_buckets(question):
+            index.setdefault(bucket, set()).add(qa_id)
+
+    def candidates(question):
+        return set().union(*(index.get(bucket, set()) for bucket in lsh_buckets(question)))
+
+    # 32 bands of 3 rows made ~15% of a single-topic table candidates for every probe
+    mean = sum(len(candidates(question)) for question in probes) / len(probes)
+    assert mean / len(stored) < 0.06
+    edits = [(qa_id, near_duplicate(stored[qa_id], rng)) for qa_id in range(0, 350, 7)]
+    assert all(qa_id in candidates(edited) for qa_id, edited in edits if edited is not None)
+
+
+def test_create_table_rebuilds_buckets_of_older_layouts(tmp_path):
+    path = str(tmp_path / "v4.db")
+    create_table(path)
+    insert_qa_pair(path, "What is the capital city of France?", "Paris.", "geography")
+    conn = sqlite3.connect(path)
+    # Buckets as an older band layout stored them
+    conn.execute("UPDATE qa_lsh_buckets SET bucket = bucket + 1")
+    conn.execute("PRAGMA user_version = 4")
+    conn.commit()
+    conn.close()
+
+    create_table(path)
+
+    assert is_duplicate("What is the capital city of Frances?", path) is True
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,106 @@
+import json
+import sqlite3
+from contextlib import contextmanager
+from unittest.mock import Mock, patch
+import pytest
+from src.data import database_operations
+from src.data.database_operations import (
+    create_table,
+    export_to_json,
+    get_cursor,
+    get_db_connection,
+    insert_qa_pair,
+    iter_qa_pairs,
+)
+
+
+class CursorSpy:
+    """Wraps a cursor, recording fetchmany() calls and refusing fetchall()."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.fetches = []
+
+    def fetchmany(self, size):
+        rows = self._cursor.fetchmany(size)
+        self.fetches.append((size, len(rows)))
+        return rows
+
+    def fetchall(self):
+        raise AssertionError("fetchall() loads every row at once")
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "test.db")
+    create_table(path)
+    for i in range(250):
+        insert_qa_pair(path, f"Question {i}?\nMore", f"Answer {i}.", "cat")
+    return path
+
+
+def test_iter_qa_pairs_fetches_one_chunk_at_a_time(db_path):
+    with get_db_connection(db_path) as conn:
+        with get_cursor(conn) as cursor:
+            spy = CursorSpy(cursor)
+            pairs = iter_qa_pairs(spy, chunk_size=100)
+
+            first = next(pairs)
+            # Nothing beyond the first chunk is read until it is consumed
+            assert spy.fetches == [(100, 100)]
+            rest = list(pairs)
+
+    assert first["question"] == "Question 0?\nMore"
+    assert len(rest) == 249
+    assert spy.fetches == [(100, 100), (100, 100), (100, 50), (100, 0)]
+
+
+def test_export_to_json_streams_all_rows_in_chunks(db_path, tmp_path):
+    json_path = str(tmp_path / "test.json")
+    spies = []
+
+    @contextmanager
+    def spying_cursor(conn):
+        with get_cursor(conn) as cursor:
+            spies.append(CursorSpy(cursor))
+            yield spies[-1]
+
+    mock_progress = Mock()
+    with patch.object(database_operations, "get_cursor", spying_cursor):
+        export_to_json(db_path, json_path, mock_progress, chunk_size=64)
+
+    with open(json_path, encoding='utf-8') as f:
+        rows = [json.loads(line) for line in f]
+    assert len(rows) == 250
+    assert rows[0]["question"] == "Question 0? More"
+    assert [c.args for c in mock_progress.call_args_list] == [(100, 250), (200, 250), (250, 250)]
+    assert spies[0].fetches == [(64, 64), (64, 64), (64, 64), (64, 58)]
+
+
+def test_export_to_json_does_not_block_concurrent_writers(db_path, tmp_path):
+    json_path = str(tmp_path / "test.json")
+
+    def write_during_export(done, total):
+        # timeout=0 fails at once if the export still holds a read lock
+        conn = sqlite3.connect(db_path, timeout=0)
+        try:
+            conn.execute("INSERT INTO qa_pairs (question, answer, category) VALUES (?, ?, ?)",
+                         (f"Late question {done}?", "Late answer.", "cat"))
+            conn.commit()
+        finally:
+            conn.close()
+
+    export_to_json(db_path, json_path, write_during_export, chunk_size=64)
+
+    with open(json_path, encoding='utf-8') as f:
+        rows = [json.loads(line) for line in f]
+    # Rows committed mid-export are left for the next export
+    assert len(rows) == 250
+    assert not any(row["question"].startswith("Late") for row in rows)
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,119 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import pytest
+from benchmarks.mock_server import MockConfig, MockServer
+from src.data.database_operations import insert_qa_pair
+from src.data import job_journal
+from src.data.job_journal import (COMPLETED, RUNNING, JobError, create_job, get_job, job_events,
+                                  latest_resumable_job, list_jobs, run_job)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def mock_settings(tmp_path, monkeypatch):
+    with MockServer(MockConfig(latency_ms=0, seed=11)) as server:
+        with open(tmp_path / "settings.json", "w") as f:
+            json.dump({"api_url": f"{server.url}/api/generate", "max_retries": 1,
+                       "ollama_probe_interval": 0, "model": "mock-model"}, f)
+        monkeypatch.chdir(tmp_path)
+        yield server
+
+
+def crash(db_path, job_id, stored):
+    """Leave a job as a process that died mid-run would: running, stale heartbeat, some pairs stored."""
+    for i, topic in enumerate(stored):
+        insert_qa_pair(db_path, f"Question {i} stored before the crash?", "Yes.", topic,
+                       {"topic": topic, "job_id": job_id})
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE jobs SET status = ?, owner = 'dead-host:1', heartbeat_at = ? WHERE id = ?",
+                 (RUNNING, time.time() - 3600, job_id))
+    conn.commit()
+    conn.close()
+
+
+def test_resume_after_crash_adds_only_what_is_missing(tmp_path, mock_settings):
+    db_path = str(tmp_path / "jobs.db")
+    job_id = create_job(db_path, ["python", "math"], 6, 'ollama', concurrency=2, quotas={"python": 2})
+    crash(db_path, job_id, ["python", "python", "math"])
+
+    assert [job["id"] for job in list_jobs(db_path, resumable_only=True)] == [job_id]
+    assert latest_resumable_job(db_path) == job_id
+
+    progress = []
+    generated = run_job(db_path, job_id, lambda current, total: progress.append((current, total)),
+                        threading.Event())
+
+    job = get_job(db_path, job_id)
+    assert generated == 3
+    assert job["status"] == COMPLETED
+    # python had met its quota before the crash
+    assert job["topic_counts"] == {"python": 2, "math": 4}
+    assert progress[-1] == (6, 6)
+    assert [event for _, event, _ in job_events(db_path, job_id)] == ["created", "resumed", "completed"]
+    assert list_jobs(db_path, resumable_only=True) == []
+
+
+def test_job_running_elsewhere_is_not_resumed(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    job_id = create_job(db_path, ["python"], 5, 'ollama')
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE jobs SET status = ?, owner = 'other-host:1', heartbeat_at = ? WHERE id = ?",
+                 (RUNNING, time.time(), job_id))
+    conn.commit()
+    conn.close()
+
+    assert list_jobs(db_path, resumable_only=True) == []
+    with pytest.raises(JobError, match="still running"):
+        run_job(db_path, job_id, lambda current, total: None, threading.Event())
+
+
+def test_only_one_process_claims_a_job(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "jobs.db")
+    job_id = create_job(db_path, ["python"], 5, 'ollama')
+    # Both processes read the job before either marks it running
+    created = get_job(db_path, job_id)
+    monkeypatch.setattr(job_journal, "get_job", lambda db_path, job_id: created)
+
+    assert job_journal._claim_job(db_path, job_id, "started", None)
+    with pytest.raises(JobError, match="still running"):
+        run_job(db_path, job_id, lambda current, total: None, threading.Event())
+    assert [event for _, event, _ in job_events(db_path, job_id)] == ["created", "started"]
+
+
+def test_cli_generate_reports_job_errors_without_a_traceback(tmp_path):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    result = subprocess.run([sys.executable, os.path.join(ROOT, "main.py"), "generate", "--db",
+                             str(tmp_path / "jobs.db"), "--entries", "0", "--topics", "python"],
+                            cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120)
+
+    assert result.returncode == 1
+    assert "already complete" in result.stderr
+    assert "Traceback" not in result.stderr
+
+
+def test_cli_resumes_the_newest_job(tmp_path, mock_settings):
+    db_path = str(tmp_path / "jobs.db")
+    job_id = create_job(db_path, ["python"], 3, 'ollama')
+    crash(db_path, job_id, ["python"])
+
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    main = os.path.join(ROOT, "main.py")
+    result = subprocess.run([sys.executable, main, "resume", "--db", db_path],
+                            cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert f"Job {job_id} completed: 2 entries added this run, 3 of 3 in total" in result.stderr
+
+    result = subprocess.run([sys.executable, main, "resume", "--db", db_path],
+                            cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 1
+    assert "No resumable job" in result.stderr
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,59 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def loaded_after_import(*modules):
+    code = ("import importlib, json, sys\n"
+            f"for name in {modules!r}:\n"
+            "    importlib.import_module(name)\n"
+            "print(json.dumps(sorted(sys.modules)))")
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True,
+                            capture_output=True, text=True, timeout=120)
+    return set(json.loads(result.stdout))
+
+
+def test_generation_modules_load_no_backend_sdk():
+    loaded = loaded_after_import("src.data.dataset_creator")
+
+    assert not {"openai", "httpx", "pydantic"} & loaded
+
+
+def test_export_and_stats_load_no_http_client():
+    loaded = loaded_after_import("main", "src.data.database_operations", "src.data.shard_export")
+
+    assert not {"requests", "src.utils.api_client", "tkinter"} & loaded
+
+
+def test_gui_defers_the_generation_pipeline():
+    pytest.importorskip("ttkbootstrap")
+    loaded = loaded_after_import("src.gui.application")
+
+    assert not {"src.data.dataset_creator", "requests", "openai"} & loaded
+
+
+def test_package_exports_resolve_on_access():
+    import src.data
+    from src.data.shard_export import export_sharded_jsonl
+
+    assert "export_sharded_jsonl" in dir(src.data)
+    assert src.data.export_sharded_jsonl is export_sharded_jsonl
+    assert src.data.__all__ == ['create_dataset', 'acreate_dataset', 'export_to_json', 'export_sharded_jsonl']
+    with pytest.raises(AttributeError):
+        src.data.missing
+
+
+def test_structured_output_validates_on_first_use():
+    from src.utils.structured_output import decode_qa_records
+
+    records = decode_qa_records('{"pairs": [{"question": "Q?", "answer": "A.", "category": "c"}]}')
+    assert [(r.question, r.answer, r.category) for r in records] == [("Q?", "A.", "c")]
+    assert decode_qa_records('{"pairs": [{"question": 1}]}') is None
+
+
+if __name__ == "__main__":
+    pytest.main()
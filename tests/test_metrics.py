@@ -0,0 +1,123 @@
+import json
+import os
+import subprocess
+import sys
+import urllib.error
+import urllib.request
+import pytest
+from benchmarks.mock_server import MockConfig, MockServer
+from src.data.batch_writer import QAPairWriter
+from src.data.database_operations import create_table
+from src.utils.api_client import parse_qa_response
+from src.utils.metrics import (
+    DB_COMMIT_SECONDS,
+    PAIRS_COMMITTED,
+    REJECTED_PAIRS,
+    WRITER_QUEUE_DEPTH,
+    MetricsExporters,
+    MetricsRegistry,
+    start_metrics_server,
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def metrics():
+    metrics = MetricsRegistry()
+    requests = metrics.counter("requests_total", "Requests made", ("backend",))
+    requests.inc(backend='ol"lama')
+    requests.inc(2, backend="openai")
+    metrics.gauge("queue_depth", "Pairs waiting").set(3)
+    latency = metrics.histogram("latency_seconds", "Request latency", buckets=(0.5, 1))
+    for value in (0.2, 0.5, 3):
+        latency.observe(value)
+    return metrics
+
+
+def test_renders_prometheus_text_format(metrics):
+    lines = metrics.render().splitlines()
+
+    assert lines[:4] == ["# HELP requests_total Requests made", "# TYPE requests_total counter",
+                         'requests_total{backend="ol\\"lama"} 1', 'requests_total{backend="openai"} 2']
+    assert "queue_depth 3" in lines
+    # Buckets are cumulative and include their upper bound
+    assert lines[-5:] == ['latency_seconds_bucket{le="0.5"} 2', 'latency_seconds_bucket{le="1"} 2',
+                          'latency_seconds_bucket{le="+Inf"} 3', "latency_seconds_sum 3.7",
+                          "latency_seconds_count 3"]
+
+
+def test_labels_must_match_the_declaration(metrics):
+    counter = metrics.counter("errors_total", "Errors", ("backend",))
+
+    with pytest.raises(ValueError):
+        counter.inc(host="a")
+    with pytest.raises(ValueError):
+        metrics.counter("errors_total", "Registered twice")
+
+
+def test_endpoint_serves_metrics_on_localhost(metrics):
+    server = start_metrics_server(0, metrics=metrics)
+    try:
+        url = f"http://127.0.0.1:{server.server_port}"
+        with urllib.request.urlopen(f"{url}/metrics", timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert 'requests_total{backend="openai"} 2' in response.read().decode()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{url}/other", timeout=5)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_exporters_write_a_last_snapshot_on_close(tmp_path):
+    path = str(tmp_path / "metrics.json")
+    MetricsExporters(path=path, interval=60).close()
+
+    with open(path) as f:
+        snapshot = json.load(f)
+    assert snapshot["qa_pairs_committed_total"]["type"] == "counter"
+    assert not os.path.exists(f"{path}.tmp")
+
+
+def test_pipeline_records_rejections_and_commits(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    create_table(db_path)
+    short_before = REJECTED_PAIRS.value(stage="parse", reason="short")
+    commits_before = DB_COMMIT_SECONDS.count()
+    committed_before = PAIRS_COMMITTED.value()
+
+    assert parse_qa_response("Question: What is it?\nAnswer: Short.\nCategory: test", "test")[0] is None
+    with QAPairWriter(db_path, batch_size=100, flush_interval=60) as writer:
+        writer.submit("What is a metrics registry for?", "Collecting counters and histograms.", "test")
+        assert WRITER_QUEUE_DEPTH.value() == 1
+
+    assert REJECTED_PAIRS.value(stage="parse", reason="short") == short_before + 1
+    assert DB_COMMIT_SECONDS.count() == commits_before + 1
+    assert PAIRS_COMMITTED.value() == committed_before + 1
+    assert WRITER_QUEUE_DEPTH.value() == 0
+
+
+def test_generate_writes_metrics_snapshot(tmp_path):
+    db_path = str(tmp_path / "gen.db")
+    metrics_path = str(tmp_path / "metrics.json")
+    with MockServer(MockConfig(latency_ms=0, seed=5)) as server:
+        with open(tmp_path / "settings.json", "w") as f:
+            json.dump({"api_url": f"{server.url}/api/generate", "max_retries": 1,
+                       "ollama_probe_interval": 0}, f)
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        result = subprocess.run(
+            [sys.executable, os.path.join(ROOT, "main.py"), "--metrics-file", metrics_path, "generate",
+             "--db", db_path, "--entries", "3", "--topics", "python"],
+            cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120)
+
+    assert result.returncode == 0, result.stderr
+    with open(metrics_path) as f:
+        snapshot = json.load(f)
+    latency = snapshot["qa_request_latency_seconds"]["values"]
+    assert latency[0]["labels"] == {"backend": "ollama"} and latency[0]["count"] >= 3
+    assert snapshot["qa_pairs_committed_total"]["values"][0]["value"] == 3
+
+
+if __name__ == "__main__":
+    pytest.main()
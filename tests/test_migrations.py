@@ -0,0 +1,77 @@
+import sqlite3
+import threading
+import pytest
+from benchmarks.mock_server import MockConfig, MockServer
+from src.data.database_operations import create_table, insert_qa_pair
+from src.data.migrations import METADATA_COLUMNS, SCHEMA_VERSION, migrate
+from src.utils.api_client import PROMPT_TEMPLATES, generate_qa_pairs
+
+
+def make_legacy_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute('''CREATE TABLE qa_pairs
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     question TEXT UNIQUE,
+                     answer TEXT,
+                     category TEXT)''')
+    conn.execute("INSERT INTO qa_pairs (question, answer, category) VALUES (?, ?, ?)",
+                 ("What is Python?", "A programming language.", "python"))
+    conn.commit()
+    conn.close()
+
+
+def test_upgrades_legacy_database_in_place(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    make_legacy_db(path)
+
+    create_table(path)
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(qa_pairs)")}
+    assert {column for column, _ in METADATA_COLUMNS} <= columns
+    indexes = {row[1] for row in conn.execute("PRAGMA index_list(qa_pairs)")}
+    assert {"idx_qa_pairs_topic", "idx_qa_pairs_backend_model", "idx_qa_pairs_created_at"} <= indexes
+    assert conn.execute("SELECT question, topic FROM qa_pairs").fetchall() == [("What is Python?", None)]
+
+    # Already current: nothing left to apply
+    assert migrate(conn, conn.cursor()) == 0
+    conn.close()
+
+
+def test_stores_generation_metadata(tmp_path):
+    path = str(tmp_path / "test.db")
+    create_table(path)
+    insert_qa_pair(path, "What is Python?", "A language.", "python",
+                   {"topic": "python", "backend": "ollama", "model": "llama3:latest",
+                    "prompt_template": "advanced", "latency_ms": 120,
+                    "prompt_tokens": 40, "completion_tokens": 90})
+
+    conn = sqlite3.connect(path)
+    row = conn.execute("""SELECT topic, backend, model, prompt_template, latency_ms,
+                                 prompt_tokens, completion_tokens, created_at IS NOT NULL
+                          FROM qa_pairs""").fetchone()
+    conn.close()
+    assert row == ("python", "ollama", "llama3:latest", "advanced", 120, 40, 90, 1)
+
+
+def test_generation_fills_in_metadata():
+    with MockServer(MockConfig(latency_ms=0, seed=1)) as server:
+        settings = {"api_url": f"{server.url}/api/generate", "max_retries": 1,
+                    "ollama_probe_interval": 0, "model": "mock-model"}
+        metadata = {}
+        qa_pairs = generate_qa_pairs("python", threading.Event(), 'ollama', 2, settings,
+                                     metadata=metadata)
+
+    assert len(qa_pairs) == 2
+    assert metadata["topic"] == "python"
+    assert metadata["backend"] == "ollama"
+    assert metadata["model"] == "mock-model"
+    assert metadata["prompt_template"] in PROMPT_TEMPLATES
+    assert metadata["latency_ms"] >= 0
+    # Per-pair share of the request's tokens
+    assert metadata["completion_tokens"] > 0
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,71 @@
+import json
+import threading
+import pytest
+import requests
+from openai import OpenAI
+from benchmarks.mock_server import MockConfig, MockServer
+from benchmarks.run_benchmark import StageTimer, percentile
+from src.utils.api_client import generate_qa_pairs, make_api_request
+
+
+@pytest.fixture
+def server():
+    with MockServer(MockConfig(latency_ms=0, seed=1)) as server:
+        yield server
+
+
+def settings_for(server, **overrides):
+    settings = {"api_url": f"{server.url}/api/generate", "max_retries": 1,
+                "ollama_probe_interval": 0}
+    settings.update(overrides)
+    return settings
+
+
+def test_ollama_generate(server):
+    result = make_api_request("prompt", 'ollama', settings_for(server))
+    assert result["done"] is True
+    assert result["response"].startswith("Question: ")
+    assert server.backend.stats["requests"] == 1
+
+
+def test_ollama_stream_and_early_abort(server):
+    seen = []
+    result = make_api_request("prompt", 'ollama', settings_for(server),
+                              on_question=lambda question: seen.append(question) or 'duplicate')
+    assert result["aborted"] == 'duplicate'
+    assert result["question"] == seen[0]
+
+
+def test_multi_pair_and_structured(server):
+    qa_pairs = generate_qa_pairs("python", threading.Event(), 'ollama', 4,
+                                 settings_for(server, structured_output=True))
+    assert len(qa_pairs) == 4
+
+
+def test_openai_chat_completions(server):
+    client = OpenAI(api_key="mock-key", base_url=f"{server.url}/v1", max_retries=0)
+    response = client.chat.completions.create(
+        model="gpt-test", messages=[{"role": "user", "content": "prompt"}])
+    assert response.choices[0].message.content.startswith("Question: ")
+    assert response.usage.total_tokens > 0
+
+
+def test_error_and_throttle_rates():
+    with MockServer(MockConfig(latency_ms=0, throttle_rate=1.0)) as server:
+        response = requests.post(f"{server.url}/api/generate", json={"prompt": "p", "stream": False})
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "1"
+
+    with MockServer(MockConfig(latency_ms=0, error_rate=1.0)) as server:
+        response = requests.post(f"{server.url}/api/generate", data=json.dumps({"prompt": "p"}))
+        assert response.status_code == 503
+        assert server.backend.stats["errors"] == 1
+
+
+def test_stage_timer_counts_pairs():
+    timer = StageTimer()
+    generate = timer.wrap_generator(lambda: [("q", "a", "c")] * 3)
+    generate()
+    assert len(timer.pair_latencies) == 3
+    assert timer.calls["request"] == 1
+    assert percentile([3, 1, 2], 0.5) == 2
@@ -0,0 +1,88 @@
+import threading
+import uuid
+from unittest.mock import Mock, patch
+from src.data.dataset_creator import create_dataset
+from src.data.database_operations import get_dataset_stats
+from src.utils.api_client import build_prompt, parse_qa_responses, split_qa_blocks
+
+
+def unique_question():
+    return f"What does {uuid.uuid4().hex} mean?"
+
+
+def test_build_prompt_asks_for_count_pairs():
+    assert "5 different questions" in build_prompt("python", 5)
+    assert "different questions" not in build_prompt("python")
+
+
+def test_split_ignores_preamble_and_markers():
+    text = ("Sure, here you go:\n\n"
+            "1. **Question:** First?\n**Answer:** One.\n\n"
+            "Question 2: Second?\nAnswer: Two.\n")
+    blocks = split_qa_blocks(text)
+    assert len(blocks) == 2
+    assert blocks[0].startswith("1. **Question:**")
+    assert blocks[1].startswith("Question 2:")
+
+
+def test_parse_qa_responses_checks_each_candidate():
+    first, second = unique_question(), unique_question()
+    text = (f"1. **Question:** {first}\n"
+            f"**Answer:** A detailed answer to the first question.\n"
+            f"**Category:** Basics\n\n"
+            f"2. Question: Short?\nAnswer: Too short to keep\nCategory: Basics\n\n"
+            f"3. Question: {second}\n"
+            f"Answer: Another detailed answer, this one for the last question.\n"
+            f"Category: Internals\n---\n")
+
+    qa_pairs = parse_qa_responses(text, "python")
+
+    assert qa_pairs == [
+        (first, "A detailed answer to the first question.", "Basics"),
+        (second, "Another detailed answer, this one for the last question.", "Internals"),
+    ]
+    # Already seen, so the recency check now drops them
+    assert parse_qa_responses(text, "python") == []
+
+
+def make_batch_generator():
+    calls = []
+
+    def fake_generate(topic, stop_event, api_choice, count, settings=None, metadata=None):
+        calls.append(count)
+        return [(unique_question(), "A sufficiently long answer.", topic) for _ in range(count)]
+
+    return fake_generate, calls
+
+
+def test_create_dataset_counts_accepted_pairs_not_requests(db_path):
+    fake_generate, calls = make_batch_generator()
+    progress = Mock()
+    with patch('src.data.dataset_creator.generate_qa_pairs', side_effect=fake_generate):
+        result = create_dataset(10, db_path, ["python"], progress, threading.Event(), 'ollama',
+                                pairs_per_request=4)
+
+    assert result == 10
+    assert calls == [4, 4, 4]
+    assert get_dataset_stats(db_path)["total_pairs"] == 10
+    progress.assert_called_with(10, 10)
+
+
+def test_create_dataset_empty_batches_count_as_errors(db_path):
+    with patch('src.data.dataset_creator.generate_qa_pairs', return_value=[]):
+        result = create_dataset(10, db_path, ["python"], Mock(), threading.Event(), 'ollama',
+                                concurrency=4, pairs_per_request=3)
+
+    assert result == 0
+
+
+def test_acreate_dataset_multi_pair(db_path):
+    async def fake_agenerate(topic, stop_event, api_choice, clients, count, settings=None, metadata=None):
+        return [(unique_question(), "A sufficiently long answer.", topic) for _ in range(count)]
+
+    with patch('src.data.dataset_creator.agenerate_qa_pairs', side_effect=fake_agenerate):
+        result = create_dataset(7, db_path, ["python"], Mock(), threading.Event(), 'ollama',
+                                concurrency=2, engine='asyncio', pairs_per_request=3)
+
+    assert result == 7
+    assert get_dataset_stats(db_path)["total_pairs"] == 7
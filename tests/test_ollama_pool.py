@@ -0,0 +1,122 @@
+import pytest
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from src.utils.clients import clients
+from src.utils.ollama_pool import (
+    DEFAULT_OLLAMA_URL,
+    MAX_FAILURE_LATENCY,
+    OllamaHostPool,
+    get_ollama_pool,
+    parse_api_urls,
+)
+
+HOST_A = "http://ollama-a:11434/api/generate"
+HOST_B = "http://ollama-b:11434/api/generate"
+
+
+@pytest.fixture
+def pool():
+    # probe_interval=0 keeps the background thread out of the tests
+    pool = OllamaHostPool([HOST_A, HOST_B], probe_interval=0, failure_threshold=2)
+    yield pool
+    pool.close()
+
+
+def test_parse_api_urls():
+    assert parse_api_urls(None) == [DEFAULT_OLLAMA_URL]
+    assert parse_api_urls(HOST_A) == [HOST_A]
+    assert parse_api_urls(f"{HOST_A}, {HOST_B},") == [HOST_A, HOST_B]
+    assert parse_api_urls([HOST_A, " ", HOST_B]) == [HOST_A, HOST_B]
+
+
+def test_health_url_uses_host_origin(pool):
+    assert pool.hosts[0].health_url == "http://ollama-a:11434/api/tags"
+
+
+def test_routes_to_least_loaded_host(pool):
+    first = pool.acquire()
+    second = pool.acquire()
+    assert first is not second
+
+    pool.release(first, latency=0.1)
+    pool.release(second, latency=10.0)
+    # The faster host takes several requests before the slow one is worth it
+    picks = [pool.acquire().url for _ in range(3)]
+    assert picks == [first.url] * 3
+
+
+def test_failing_host_taken_out_of_rotation(pool):
+    a, b = pool.hosts
+    host = pool.acquire()
+    assert host is a
+    pool.release(a, ok=False)
+    assert pool.healthy_hosts() == [HOST_A, HOST_B]
+
+    # The failure doubled a's latency, so b is preferred already
+    assert pool.acquire() is b
+    a.outstanding += 1
+    pool.release(a, ok=False)
+
+    assert pool.healthy_hosts() == [HOST_B]
+    assert all(pool.acquire() is b for _ in range(5))
+
+
+def test_failure_backoff_is_capped(pool):
+    a, _ = pool.hosts
+    for _ in range(50):
+        a.outstanding += 1
+        pool.release(a, ok=False)
+    assert a.latency == MAX_FAILURE_LATENCY
+
+
+def test_single_host_never_marked_unhealthy():
+    pool = OllamaHostPool([HOST_A], probe_interval=0, failure_threshold=1)
+    host = pool.acquire()
+    pool.release(host, ok=False)
+    assert pool.healthy_hosts() == [HOST_A]
+
+
+def test_probe_restores_recovered_host(pool, monkeypatch):
+    a, _ = pool.hosts
+    a.healthy = False
+
+    class FakeResponse:
+        status_code = 200
+
+    class FakeSession:
+        def __init__(self, fail):
+            self.fail = fail
+
+        def get(self, url, timeout):
+            if self.fail:
+                raise RequestsConnectionError("refused")
+            return FakeResponse()
+
+    monkeypatch.setattr(clients, "session", lambda url: FakeSession(fail=True))
+    assert pool.probe(a) is False
+    assert pool.healthy_hosts() == [HOST_B]
+
+    monkeypatch.setattr(clients, "session", lambda url: FakeSession(fail=False))
+    assert pool.probe(a) is True
+    assert pool.healthy_hosts() == [HOST_A, HOST_B]
+
+
+def test_get_ollama_pool_is_shared_per_url_list():
+    settings = {"api_url": f"{HOST_A},{HOST_B}", "ollama_probe_interval": 0}
+    pool = get_ollama_pool(settings)
+    assert get_ollama_pool(dict(settings)) is pool
+
+    other = get_ollama_pool({"api_url": HOST_A})
+    assert other is not pool
+    assert pool._stop_event.is_set()
+    other.close()
+
+
+def test_get_ollama_pool_is_rebuilt_when_health_options_change():
+    settings = {"api_url": f"{HOST_A},{HOST_B}", "ollama_probe_interval": 0}
+    pool = get_ollama_pool(settings)
+
+    other = get_ollama_pool(dict(settings, ollama_probe_timeout=1, ollama_failure_threshold=5))
+    assert other is not pool
+    assert pool._stop_event.is_set()
+    assert (other.probe_timeout, other.failure_threshold) == (1, 5)
+    other.close()
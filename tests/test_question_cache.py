@@ -0,0 +1,68 @@
+import pytest
+from src.data.database_operations import create_table, insert_qa_pair, get_recent_questions
+from src.data.dataset_creator import _prepare_question_cache
+from src.utils.api_client import QuestionCache, question_cache
+
+
+def test_evicts_oldest_when_full():
+    cache = QuestionCache(max_size=3)
+    for question in ["q1", "q2", "q3", "q4"]:
+        cache.add(question)
+
+    assert not cache.is_recent("q1")
+    assert all(cache.is_recent(q) for q in ["q2", "q3", "q4"])
+    assert len(cache) == 3
+
+
+def test_is_case_insensitive_and_add_if_new():
+    cache = QuestionCache(max_size=3)
+    assert cache.add_if_new("What is Python?")
+    assert cache.is_recent("what is python?")
+    assert not cache.add_if_new("WHAT IS PYTHON?")
+    assert len(cache) == 1
+
+
+def test_resize_keeps_newest():
+    cache = QuestionCache(max_size=4)
+    for i in range(6):
+        cache.add(f"q{i}")
+
+    cache.resize(2)
+    assert [cache.is_recent(f"q{i}") for i in range(6)] == [False] * 4 + [True] * 2
+
+    cache.resize(3)
+    cache.add("q6")
+    assert all(cache.is_recent(q) for q in ["q4", "q5", "q6"])
+
+
+def test_warm_start_keeps_most_recent_that_fit():
+    cache = QuestionCache(max_size=2)
+    assert cache.warm_start(["old", "newer", "newest"]) == 2
+    assert not cache.is_recent("old")
+    assert cache.is_recent("newest")
+
+
+@pytest.fixture
+def restore_question_cache():
+    yield
+    question_cache.resize(1000)
+    question_cache.clear()
+
+
+def test_job_start_warms_cache_from_database(tmp_path, restore_question_cache):
+    db_path = str(tmp_path / "test.db")
+    create_table(db_path)
+    for i in range(5):
+        insert_qa_pair(db_path, f"Stored question number {i}?", "A stored answer.", "Test")
+
+    assert get_recent_questions(db_path, 2) == ["Stored question number 3?", "Stored question number 4?"]
+
+    question_cache.clear()
+    _prepare_question_cache(db_path, {"question_cache_size": 3})
+    assert question_cache.max_size == 3
+    assert question_cache.is_recent("Stored question number 4?")
+    assert not question_cache.is_recent("Stored question number 1?")
+
+    question_cache.clear()
+    _prepare_question_cache(db_path, {"question_cache_warm_start": False})
+    assert len(question_cache) == 0
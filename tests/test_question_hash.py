@@ -0,0 +1,65 @@
+import sqlite3
+import pytest
+from src.data.batch_writer import QAPairWriter
+from src.data.database_operations import create_table, insert_qa_pair, is_duplicate
+from src.data.dedup_index import normalize_question, question_digest
+
+
+def test_normalize_ignores_case_whitespace_and_trailing_punctuation():
+    assert normalize_question("  What   is\nPython?! ") == "what is python"
+    assert question_digest("What is Python?") == question_digest("what is python")
+    assert question_digest("What is Python?") != question_digest("What is Java?")
+
+
+def test_exact_duplicates_are_ignored_on_insert(table_db_path):
+    assert insert_qa_pair(table_db_path, "What is Python?", "A language.", "python") is True
+    assert insert_qa_pair(table_db_path, "What is Python?", "Another answer.", "python") is False
+    assert insert_qa_pair(table_db_path, "WHAT  IS PYTHON", "Shouting.", "python") is False
+
+    conn = sqlite3.connect(table_db_path)
+    assert conn.execute("SELECT COUNT(*) FROM qa_pairs").fetchone()[0] == 1
+    conn.close()
+
+
+def test_is_duplicate_probes_hash_before_fuzzy_match(table_db_path, monkeypatch):
+    insert_qa_pair(table_db_path, "What is Python?", "A language.", "python")
+    monkeypatch.setattr("src.data.database_operations.is_similar_to_any",
+                        lambda *args, **kwargs: pytest.fail("fuzzy check should not run"))
+
+    assert is_duplicate("what is python.", table_db_path) is True
+
+
+def test_writer_counts_ignored_duplicates(table_db_path):
+    with QAPairWriter(table_db_path, flush_interval=0.01) as writer:
+        writer.submit("What is Python?", "A language.", "python")
+        writer.submit("what is python", "Same question.", "python")
+        writer.flush()
+    assert writer.committed_count == 1
+    assert writer.failed_count == 1
+
+
+def test_create_table_backfills_hashes_of_legacy_rows(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    conn.execute('''CREATE TABLE qa_pairs
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     question TEXT UNIQUE,
+                     answer TEXT,
+                     category TEXT)''')
+    conn.executemany("INSERT INTO qa_pairs (question, answer, category) VALUES (?, ?, ?)",
+                     [("What is Python?", "A language.", "python"),
+                      ("what is python", "A repeat from before the hash existed.", "python")])
+    conn.commit()
+    conn.close()
+
+    create_table(path)
+
+    conn = sqlite3.connect(path)
+    hashes = [row[0] for row in conn.execute("SELECT question_hash FROM qa_pairs ORDER BY id")]
+    conn.close()
+    assert hashes == [question_digest("What is Python?"), None]
+    assert insert_qa_pair(path, "What is python", "Still rejected.", "python") is False
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,90 @@
+import pytest
+from src.utils.rate_limiter import (
+    SLOW_RESPONSES_BEFORE_DECREASE,
+    AdaptiveRateLimiter,
+    TokenBucket,
+    get_rate_limiter,
+    parse_retry_after,
+)
+
+
+def test_token_bucket_reservations_wait_for_refill():
+    bucket = TokenBucket(60, burst_seconds=1)  # one token per second, burst of one
+    assert bucket.reserve(1, now=bucket.updated) == 0
+    assert bucket.reserve(1, now=bucket.updated) == pytest.approx(1.0)
+    assert bucket.reserve(1, now=bucket.updated) == pytest.approx(2.0)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("2") == 2.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+
+
+def test_unconfigured_endpoint_is_unthrottled():
+    limiter = AdaptiveRateLimiter("ollama:test")
+    assert limiter.current_rpm is None
+    assert limiter._reserve(1000) == 0
+
+
+def test_throttle_halves_rate_and_honours_retry_after():
+    limiter = AdaptiveRateLimiter("openai:test", requests_per_minute=600)
+    limiter.record_throttle(retry_after=5)
+
+    assert limiter.current_rpm == 300
+    assert limiter._reserve(0) >= 4.9
+
+
+def test_success_ramps_back_up_to_ceiling():
+    limiter = AdaptiveRateLimiter("openai:test", requests_per_minute=100)
+    limiter.record_error()
+    assert limiter.current_rpm == 50
+
+    for _ in range(100):
+        limiter.record_success(latency=0.1)
+    assert limiter.current_rpm == 100
+
+
+def test_sustained_slow_responses_count_as_congestion():
+    limiter = AdaptiveRateLimiter("openai:test", requests_per_minute=100, latency_target=1.0)
+    limiter.record_error()
+    for _ in range(SLOW_RESPONSES_BEFORE_DECREASE - 1):
+        limiter.record_success(latency=5.0)
+    # Slow but not yet sustained: no increase and no cut
+    assert limiter.current_rpm == 50
+
+    limiter.record_success(latency=5.0)
+    assert limiter.current_rpm == 25
+
+
+def test_fast_response_resets_the_slow_streak():
+    limiter = AdaptiveRateLimiter("openai:test", requests_per_minute=100, latency_target=1.0)
+    limiter.record_error()
+    for _ in range(2):
+        for _ in range(SLOW_RESPONSES_BEFORE_DECREASE - 1):
+            limiter.record_success(latency=5.0)
+        limiter.record_success(latency=0.5)
+    assert limiter.current_rpm == 54
+
+
+def test_token_budget_is_corrected_with_actual_usage():
+    limiter = AdaptiveRateLimiter("openai:test", tokens_per_minute=600)
+    # Burst capacity is 10 seconds' worth: 100 tokens
+    assert limiter._reserve(100) == 0
+    limiter.record_success(latency=0.1, tokens_used=10, tokens_reserved=100)
+    assert limiter._reserve(90) == 0
+
+
+def test_limiters_are_per_endpoint():
+    settings = {"openai_rpm": 500}
+    a = get_rate_limiter('ollama', "http://host-a:11434/api/generate", settings)
+    b = get_rate_limiter('ollama', "http://host-b:11434/api/generate", settings)
+    assert a is not b
+    assert a is get_rate_limiter('ollama', "http://host-a:11434/api/generate", settings)
+    assert a.current_rpm is None
+    assert get_rate_limiter('openai', "test-endpoint", settings).current_rpm == 500
+
+
+if __name__ == "__main__":
+    pytest.main()
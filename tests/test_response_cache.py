@@ -0,0 +1,146 @@
+import threading
+import uuid
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+from openai.types.chat import ChatCompletion
+from src.utils.api_client import DuplicateQuestion, generate_qa_pair, make_api_request
+from src.utils.response_cache import ResponseCache
+
+
+def settings_for(tmp_path, mode):
+    return {"api_url": "http://ollama-cache:11434/api/generate", "max_retries": 1,
+            "ollama_stream": False, "response_cache_mode": mode,
+            "response_cache_dir": str(tmp_path / f"cache-{uuid.uuid4().hex}")}
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, body):
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+
+class FakeSession:
+    def __init__(self, texts):
+        self.texts = iter(texts)
+        self.calls = 0
+
+    def post(self, url, json, timeout, stream):
+        self.calls += 1
+        return FakeResponse({"response": next(self.texts), "done": True})
+
+
+class OfflineSession:
+    def post(self, *args, **kwargs):
+        raise AssertionError("replay must not reach the backend")
+
+
+def qa_text():
+    question = f"What does {uuid.uuid4().hex} do in Python?"
+    return question, f"Question: {question}\nAnswer: Something specific and documented.\nCategory: Internals"
+
+
+def test_key_ignores_seed_and_stream():
+    request = {"model": "llama3", "prompt": "p", "temperature": 0.7, "seed": 1, "stream": False}
+    assert ResponseCache.key('ollama', request) == \
+        ResponseCache.key('ollama', dict(request, seed=2, stream=True))
+    assert ResponseCache.key('ollama', request) != ResponseCache.key('ollama', dict(request, prompt="q"))
+    assert ResponseCache.key('ollama', request) != ResponseCache.key('openai', request)
+
+
+def test_replay_cycles_through_recorded_responses(tmp_path):
+    recorder = ResponseCache(str(tmp_path), 'record')
+    recorder.record("abc123", {"response": "first"})
+    recorder.record("abc123", {"response": "second"})
+
+    # A fresh instance reads the cassette back from disk
+    player = ResponseCache(str(tmp_path), 'replay')
+    assert [player.replay("abc123")["response"] for _ in range(3)] == ["first", "second", "first"]
+    assert player.replay("missing") is None
+
+
+def test_record_appends_and_replay_skips_a_truncated_line(tmp_path):
+    recorder = ResponseCache(str(tmp_path), 'record')
+    recorder.record("abc123", {"response": "first"})
+    recorder.record("abc123", {"response": "second"})
+    path = tmp_path / "ab" / "abc123.jsonl"
+    assert path.read_text().splitlines() == ['{"response": "first"}', '{"response": "second"}']
+
+    with open(path, "a") as f:
+        f.write('{"response": "thi')
+    ResponseCache(str(tmp_path), 'record').record("abc123", {"response": "fourth"})
+    player = ResponseCache(str(tmp_path), 'replay')
+    assert [player.replay("abc123")["response"] for _ in range(4)] == ["first", "second", "fourth", "first"]
+
+
+def test_invalid_mode_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ResponseCache(str(tmp_path), 'rewind')
+
+
+def test_make_api_request_records_then_replays_ollama(tmp_path):
+    settings = settings_for(tmp_path, 'record')
+    texts = ["one", "two"]
+    session = FakeSession(texts)
+    with patch('src.utils.api_client.clients.session', return_value=session):
+        recorded = [make_api_request("prompt", 'ollama', settings)["response"] for _ in texts]
+
+    settings["response_cache_mode"] = 'replay'
+    with patch('src.utils.api_client.clients.session', return_value=OfflineSession()):
+        replayed = [make_api_request("prompt", 'ollama', settings)["response"] for _ in texts]
+        assert make_api_request("another prompt", 'ollama', settings) is None
+
+    assert recorded == replayed == texts
+
+
+def test_passthrough_does_not_write(tmp_path):
+    settings = settings_for(tmp_path, 'passthrough')
+    with patch('src.utils.api_client.clients.session', return_value=FakeSession(["x"])):
+        make_api_request("prompt", 'ollama', settings)
+
+    assert not (tmp_path / settings["response_cache_dir"]).exists()
+
+
+def test_replay_applies_early_duplicate_check(tmp_path):
+    settings = settings_for(tmp_path, 'record')
+    _, text = qa_text()
+    with patch('src.utils.api_client.random.choice', side_effect=lambda seq: seq[0]), \
+            patch('src.utils.api_client.clients.session', return_value=FakeSession([text])):
+        generate_qa_pair("python", threading.Event(), 'ollama', settings)
+
+    settings.update(response_cache_mode='replay', ollama_stream=True)
+    # Recording put the question in the recency cache; look past that
+    with patch('src.utils.api_client.random.choice', side_effect=lambda seq: seq[0]), \
+            patch('src.utils.api_client.question_cache.is_recent', return_value=False), \
+            patch('src.utils.api_client.clients.session', return_value=OfflineSession()):
+        with pytest.raises(DuplicateQuestion):
+            generate_qa_pair("python", threading.Event(), 'ollama', settings,
+                             question_filter=lambda question: True)
+
+
+def test_openai_round_trip(tmp_path):
+    completion = ChatCompletion.model_validate({
+        "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "gpt-test",
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": "Question: Q?"}}],
+    })
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(
+        create=lambda **request: completion)))
+    settings = settings_for(tmp_path, 'record')
+    with patch('src.utils.api_client.clients.openai', return_value=client):
+        make_api_request("prompt", 'openai', settings)
+
+    settings["response_cache_mode"] = 'replay'
+    with patch('src.utils.api_client.clients.openai', side_effect=AssertionError("offline")):
+        replayed = make_api_request("prompt", 'openai', settings)
+
+    assert isinstance(replayed, ChatCompletion)
+    assert replayed.choices[0].message.content == "Question: Q?"
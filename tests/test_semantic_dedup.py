@@ -0,0 +1,127 @@
+import threading
+import pytest
+from benchmarks.mock_server import MockConfig, MockServer, mock_embedding
+from src.data.database_operations import insert_qa_pair
+from src.data.dataset_creator import _store_results
+from src.data.batch_writer import QAPairWriter
+from src.utils.embeddings import OllamaEmbedder
+
+np = pytest.importorskip("numpy")
+
+from src.data.semantic_dedup import EmbeddingIndex, SemanticDeduplicator  # noqa: E402
+
+
+def embed(texts):
+    return [mock_embedding(text) for text in texts]
+
+
+def test_index_appends_and_reopens(tmp_path):
+    path = str(tmp_path / "index")
+    index = EmbeddingIndex(path, "bow")
+    vectors = index.normalize([[1, 0, 0], [0, 1, 0]])
+    index.add([1, 2], vectors)
+    assert index.max_similarity(index.normalize([[1, 0.1, 0]]))[0] > 0.99
+
+    index.add([3], index.normalize([[0, 0, 1]]))
+    reopened = EmbeddingIndex(path, "bow")
+    assert len(reopened) == 3
+    assert list(reopened.keys()) == [1, 2, 3]
+    # Scoring in small chunks gives the same answer
+    queries = reopened.normalize([[0, 0, 1], [1, 1, 0]])
+    assert np.allclose(reopened.max_similarity(queries, chunk_rows=1),
+                       reopened.max_similarity(queries))
+
+
+def test_index_drops_torn_row_and_other_models(tmp_path):
+    path = str(tmp_path / "index")
+    index = EmbeddingIndex(path, "bow")
+    index.add([1, 2], index.normalize([[1, 0], [0, 1]]))
+    with open(f"{path}.f32", "ab") as f:
+        f.write(b"\0" * 4)
+
+    assert len(EmbeddingIndex(path, "bow")) == 2
+    assert len(EmbeddingIndex(path, "another-model")) == 0
+
+
+def test_drops_duplicates_against_index_and_batch(tmp_path):
+    dedup = SemanticDeduplicator(EmbeddingIndex(str(tmp_path / "index"), "bow"), embed)
+    first = ("How does the Python garbage collector free memory?", "Answer.", "Python")
+    kept = dedup.drop_duplicates([first, ("How does the Python garbage collector free up memory?", "A.", "Python"),
+                                  ("What is a monad in Haskell?", "Answer.", "Haskell")])
+    assert [pair[0] for pair in kept] == [first[0], "What is a monad in Haskell?"]
+
+    # Pending questions are checked against before they are committed
+    assert dedup.drop_duplicates([("how does the python garbage collector free memory", "A.", "P")]) == []
+    assert len(dedup.index) == 0
+
+    dedup.settle([first[0], "What is a monad in Haskell?"], [])
+    assert len(dedup.index) == 2
+    assert dedup.drop_duplicates([("how does the python garbage collector free memory", "A.", "P")]) == []
+
+
+def test_only_committed_questions_reach_the_index(table_db_path, tmp_path):
+    insert_qa_pair(table_db_path, "What does the Python GIL protect?", "Interpreter state.", "Python")
+    dedup = SemanticDeduplicator(EmbeddingIndex(str(tmp_path / "index"), "bow"), embed)
+    pairs = [("What does the Python GIL protect?", "Interpreter state.", "Python"),
+             ("What is a monad in Haskell?", "A design pattern.", "Haskell")]
+    assert dedup.drop_duplicates(pairs) == pairs
+
+    with QAPairWriter(table_db_path, on_commit=dedup.settle) as writer:
+        for pair in pairs:
+            writer.submit(*pair)
+
+    # The database ignored the first pair as an exact duplicate
+    assert writer.committed_count == 1
+    assert len(dedup.index) == 1
+    assert dedup.drop_duplicates([("What does the Python GIL protect?", "A.", "Python")]) != []
+
+
+def test_embedding_failure_lets_pairs_through(tmp_path):
+    def broken(texts):
+        raise ConnectionError("down")
+
+    dedup = SemanticDeduplicator(EmbeddingIndex(str(tmp_path / "index"), "bow"), broken)
+    pairs = [("What is Python?", "A language.", "Python")]
+    assert dedup.drop_duplicates(pairs) == pairs
+
+
+def test_backfill_resumes_from_watermark(table_db_path):
+    for i in range(5):
+        insert_qa_pair(table_db_path, f"Question number {i} about topic {i}?", "Answer.", "cat")
+    calls = []
+
+    def counting(texts):
+        calls.append(len(texts))
+        return embed(texts)
+
+    dedup = SemanticDeduplicator(EmbeddingIndex(f"{table_db_path}.embeddings", "bow"), counting)
+    assert dedup.backfill(table_db_path, batch_size=2) == 5
+    assert calls == [2, 2, 1]
+
+    insert_qa_pair(table_db_path, "A completely new question?", "Answer.", "cat")
+    dedup = SemanticDeduplicator(EmbeddingIndex(f"{table_db_path}.embeddings", "bow"), counting)
+    assert dedup.backfill(table_db_path) == 1
+    assert len(dedup.index) == 6
+
+
+def test_store_results_uses_semantic_check(table_db_path, tmp_path):
+    dedup = SemanticDeduplicator(EmbeddingIndex(str(tmp_path / "index"), "bow"), embed)
+    dedup.drop_duplicates([("Why is the sky blue during the day?", "Scattering.", "Physics")])
+    with QAPairWriter(table_db_path) as writer:
+        added, failed = _store_results(
+            [("Why during the day is the sky blue?", "Rayleigh.", "Physics"),
+             ("What causes ocean tides?", "The moon.", "Physics")],
+            table_db_path, writer, 10, semantic=dedup)
+    assert (added, failed) == (1, 0)
+
+
+def test_ollama_embedder_against_mock_server():
+    with MockServer(MockConfig(latency_ms=0)) as server:
+        embedder = OllamaEmbedder({"api_url": f"{server.url}/api/generate", "max_retries": 1,
+                                   "ollama_probe_interval": 0})
+        vectors = embedder(["What is Python?", "What is Java?"])
+    assert vectors == embed(["What is Python?", "What is Java?"])
+
+
+if __name__ == "__main__":
+    pytest.main()
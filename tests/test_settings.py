@@ -0,0 +1,79 @@
+import json
+import os
+import pytest
+from src.utils.settings import SettingsStore
+
+
+@pytest.fixture
+def settings_path(tmp_path):
+    return str(tmp_path / "settings.json")
+
+
+def write_settings(path, settings, mtime_ns=None):
+    with open(path, "w") as f:
+        json.dump(settings, f)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_missing_file_gives_empty_settings(settings_path):
+    assert dict(SettingsStore(settings_path).get()) == {}
+
+
+def test_file_is_parsed_once(settings_path, monkeypatch):
+    write_settings(settings_path, {"timeout": 10})
+    store = SettingsStore(settings_path)
+    assert store.get()["timeout"] == 10
+
+    def fail(*args, **kwargs):
+        raise AssertionError("settings file should not be re-read")
+
+    monkeypatch.setattr(json, "load", fail)
+    assert store.get()["timeout"] == 10
+
+
+def test_changes_are_picked_up_by_mtime(settings_path):
+    write_settings(settings_path, {"timeout": 10}, mtime_ns=1_000_000_000)
+    store = SettingsStore(settings_path)
+    snapshot = store.get()
+
+    write_settings(settings_path, {"timeout": 20}, mtime_ns=2_000_000_000)
+
+    assert store.get()["timeout"] == 20
+    # Snapshots already handed out don't change
+    assert snapshot["timeout"] == 10
+
+
+def test_invalidate_forces_reload(settings_path):
+    write_settings(settings_path, {"timeout": 10}, mtime_ns=1_000_000_000)
+    store = SettingsStore(settings_path)
+    store.get()
+
+    # Same size and mtime, e.g. a save within the file system's mtime resolution
+    write_settings(settings_path, {"timeout": 20}, mtime_ns=1_000_000_000)
+    assert store.get()["timeout"] == 10
+
+    store.invalidate()
+    assert store.get()["timeout"] == 20
+
+
+def test_snapshot_is_read_only(settings_path):
+    write_settings(settings_path, {"timeout": 10})
+    with pytest.raises(TypeError):
+        SettingsStore(settings_path).get()["timeout"] = 20
+
+
+def test_invalid_file_keeps_last_good_settings(settings_path):
+    write_settings(settings_path, {"timeout": 10}, mtime_ns=1_000_000_000)
+    store = SettingsStore(settings_path)
+    store.get()
+
+    with open(settings_path, "w") as f:
+        f.write('{"timeout": ')
+    os.utime(settings_path, ns=(2_000_000_000, 2_000_000_000))
+
+    assert store.get()["timeout"] == 10
+
+
+if __name__ == "__main__":
+    pytest.main()
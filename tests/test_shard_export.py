@@ -0,0 +1,69 @@
+import gzip
+import hashlib
+import json
+import os
+import pytest
+from unittest.mock import Mock
+from src.data.database_operations import create_table, get_cursor, get_db_connection, insert_qa_pair, iter_qa_pairs
+from src.data.shard_export import compute_shard_ranges, export_sharded_jsonl
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "test.db")
+    create_table(path)
+    for i in range(103):
+        insert_qa_pair(path, f"Question {i}?", f"Answer {i}.", "cat")
+    return path
+
+
+def test_compute_shard_ranges_cover_all_rows(db_path):
+    ranges = compute_shard_ranges(db_path, 4)
+    assert len(ranges) == 4
+    assert ranges[0][0] is None and ranges[-1][1] == 104
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start
+
+
+def test_rows_committed_after_the_snapshot_are_left_out(db_path):
+    ranges = compute_shard_ranges(db_path, 4)
+    insert_qa_pair(db_path, "Question added during the export?", "Answer.", "cat")
+
+    with get_db_connection(db_path) as conn:
+        with get_cursor(conn) as cursor:
+            rows = [pair for start, end in ranges for pair in iter_qa_pairs(cursor, 50, start, end)]
+    assert [pair["question"] for pair in rows] == [f"Question {i}?" for i in range(103)]
+
+
+def test_export_sharded_jsonl_writes_manifest(db_path, tmp_path):
+    output_dir = str(tmp_path / "shards")
+    mock_progress = Mock()
+
+    manifest = export_sharded_jsonl(db_path, output_dir, mock_progress, num_shards=4, max_workers=2)
+
+    assert manifest["total_rows"] == 103
+    assert manifest["num_shards"] == 4
+    with open(os.path.join(output_dir, "manifest.json"), encoding='utf-8') as f:
+        assert json.load(f) == manifest
+
+    questions = []
+    for shard in manifest["shards"]:
+        path = os.path.join(output_dir, shard["file"])
+        with open(path, 'rb') as f:
+            assert hashlib.sha256(f.read()).hexdigest() == shard["sha256"]
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            lines = [json.loads(line) for line in f]
+        assert len(lines) == shard["rows"]
+        questions.extend(line["question"] for line in lines)
+
+    assert questions == [f"Question {i}?" for i in range(103)]
+    assert mock_progress.call_args_list[-1].args == (103, 103)
+
+
+def test_export_sharded_jsonl_rejects_unknown_compression(db_path, tmp_path):
+    with pytest.raises(ValueError):
+        export_sharded_jsonl(db_path, str(tmp_path), Mock(), compression='lz4')
+
+
+if __name__ == "__main__":
+    pytest.main()
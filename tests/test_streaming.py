@@ -0,0 +1,204 @@
+import asyncio
+import json
+import threading
+import uuid
+import httpx
+import pytest
+import requests
+from unittest.mock import patch
+from src.utils.api_client import DuplicateQuestion, generate_qa_pair, read_ollama_stream
+from src.utils.async_api_client import AsyncBackendClients, agenerate_qa_pair
+from src.utils.ollama_pool import get_ollama_pool
+
+SETTINGS = {"api_url": "http://ollama-stream:11434/api/generate", "max_retries": 1}
+
+
+def stream_lines(text, size=4):
+    """Split text into Ollama NDJSON stream lines of a few characters each."""
+    lines = [json.dumps({"response": text[i:i + size], "done": False})
+             for i in range(0, len(text), size)]
+    lines.append(json.dumps({"response": "", "done": True, "eval_count": 42}))
+    return lines
+
+
+def make_text():
+    question = f"What does {uuid.uuid4().hex} mean in Python?"
+    return question, f"Question: {question}\nAnswer: It means something quite specific.\nCategory: Python"
+
+
+class FakeStreamingResponse:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.consumed = 0
+        self.closed = False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self):
+        for line in self.lines:
+            self.consumed += 1
+            yield line
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    def __init__(self, response):
+        self.response = response
+        self.payloads = []
+
+    def post(self, url, json, timeout, stream):
+        self.payloads.append(json)
+        return self.response
+
+
+def test_read_ollama_stream_assembles_full_response():
+    _, text = make_text()
+    result = read_ollama_stream(stream_lines(text), lambda question: None)
+
+    assert result["response"] == text
+    assert result["eval_count"] == 42
+    assert "aborted" not in result
+
+
+def test_read_ollama_stream_stops_after_rejected_question():
+    question, text = make_text()
+    seen = []
+    result = read_ollama_stream(stream_lines(text),
+                                lambda q: seen.append(q) or 'duplicate')
+
+    assert seen == [question]
+    assert result["aborted"] == 'duplicate'
+    assert result["question"] == question
+    assert "Category" not in result["response"]
+
+
+def test_read_ollama_stream_ignores_a_broken_json_escape():
+    text = '{"question": "What does \\u12 mean?", "answer": "Nothing valid."}'
+    seen = []
+    result = read_ollama_stream(stream_lines(text), seen.append)
+
+    assert seen == []
+    assert result["response"] == text
+
+
+def test_generate_qa_pair_streams_and_keeps_accepted_question():
+    question, text = make_text()
+    response = FakeStreamingResponse(stream_lines(text))
+    session = FakeSession(response)
+    with patch('src.utils.api_client.clients.session', return_value=session):
+        qa_pair = generate_qa_pair("python", threading.Event(), 'ollama', SETTINGS,
+                                   question_filter=lambda q: False)
+
+    assert qa_pair == (question, "It means something quite specific.", "Python")
+    assert session.payloads[0]["stream"] is True
+    assert response.closed
+
+
+def test_generate_qa_pair_aborts_duplicate_mid_stream():
+    _, text = make_text()
+    lines = stream_lines(text)
+    response = FakeStreamingResponse(lines)
+    with patch('src.utils.api_client.clients.session', return_value=FakeSession(response)):
+        with pytest.raises(DuplicateQuestion):
+            generate_qa_pair("python", threading.Event(), 'ollama', SETTINGS,
+                             question_filter=lambda q: True)
+
+    assert response.consumed < len(lines)
+    assert response.closed
+
+
+def test_aborted_stream_leaves_host_latency_alone():
+    _, text = make_text()
+    settings = dict(SETTINGS, api_url=f"http://ollama-{uuid.uuid4().hex}:11434/api/generate")
+    response = FakeStreamingResponse(stream_lines(text))
+    with patch('src.utils.api_client.clients.session', return_value=FakeSession(response)):
+        with pytest.raises(DuplicateQuestion):
+            generate_qa_pair("python", threading.Event(), 'ollama', settings,
+                             question_filter=lambda q: True)
+
+    host, = get_ollama_pool(settings).hosts
+    assert host.latency == 1.0
+    assert host.outstanding == 0
+
+
+def test_error_stream_response_is_closed():
+    class ErrorResponse(FakeStreamingResponse):
+        status_code = 404
+
+        def raise_for_status(self):
+            raise requests.HTTPError("404 Not Found")
+
+    response = ErrorResponse([])
+    with patch('src.utils.api_client.clients.session', return_value=FakeSession(response)):
+        generate_qa_pair("python", threading.Event(), 'ollama', SETTINGS,
+                         question_filter=lambda q: True)
+
+    assert response.closed
+    assert response.consumed == 0
+
+
+def test_streaming_can_be_turned_off():
+    question, text = make_text()
+    settings = dict(SETTINGS, ollama_stream=False)
+
+    class JsonResponse(FakeStreamingResponse):
+        def json(self):
+            return {"response": text}
+
+    session = FakeSession(JsonResponse([]))
+    with patch('src.utils.api_client.clients.session', return_value=session):
+        qa_pair = generate_qa_pair("python", threading.Event(), 'ollama', settings,
+                                   question_filter=lambda q: True)
+
+    assert qa_pair[0] == question
+    assert session.payloads[0]["stream"] is False
+
+
+def test_agenerate_qa_pair_aborts_duplicate_mid_stream():
+    _, text = make_text()
+    body = "\n".join(stream_lines(text)).encode()
+
+    def handler(request):
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(200, content=body)
+
+    async def run():
+        clients = AsyncBackendClients()
+        clients.http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await agenerate_qa_pair("python", threading.Event(), 'ollama', clients,
+                                           SETTINGS, question_filter=lambda q: True)
+        finally:
+            await clients.aclose()
+
+    with pytest.raises(DuplicateQuestion):
+        asyncio.run(run())
+
+
+def test_agenerate_qa_pair_filters_streamed_question_off_the_event_loop():
+    _, text = make_text()
+    body = "\n".join(stream_lines(text)).encode()
+    filter_threads = []
+
+    def question_filter(question):
+        filter_threads.append(threading.current_thread())
+        return True
+
+    async def run():
+        clients = AsyncBackendClients()
+        clients.http = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=body)))
+        try:
+            return await agenerate_qa_pair("python", threading.Event(), 'ollama', clients,
+                                           SETTINGS, question_filter=question_filter)
+        finally:
+            await clients.aclose()
+
+    with pytest.raises(DuplicateQuestion):
+        asyncio.run(run())
+    assert filter_threads and threading.main_thread() not in filter_threads
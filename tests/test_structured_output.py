@@ -0,0 +1,156 @@
+import json
+import threading
+import uuid
+import httpx
+import openai
+import pytest
+from unittest.mock import Mock, patch
+from src.utils import api_client
+from src.utils.api_client import (
+    build_prompt,
+    generate_qa_pair,
+    generate_qa_pairs,
+    make_api_request,
+    parse_structured_qa_response,
+    read_ollama_stream,
+)
+from src.utils.structured_output import decode_qa_records, parse_stats, qa_json_schema
+
+SETTINGS = {"api_url": "http://ollama-json:11434/api/generate", "max_retries": 1,
+            "structured_output": True, "ollama_stream": False}
+
+
+@pytest.fixture(autouse=True)
+def reset_stats():
+    parse_stats.reset()
+
+
+def record(category="Internals"):
+    return {"question": f"What does {uuid.uuid4().hex} do in Python?",
+            "answer": "It does something specific and well documented.",
+            "category": category}
+
+
+def test_decode_accepts_object_pairs_and_list():
+    one, two = record(), record()
+    assert [r.question for r in decode_qa_records(json.dumps(one))] == [one["question"]]
+    assert len(decode_qa_records(json.dumps({"pairs": [one, two]}))) == 2
+    assert len(decode_qa_records(json.dumps([one, two]))) == 2
+
+
+def test_decode_rejects_invalid_json_and_wrong_shape():
+    assert decode_qa_records("Question: not JSON") is None
+    assert decode_qa_records(json.dumps({"question": "Missing answer"})) is None
+
+
+def test_schema_is_strict():
+    schema = qa_json_schema(3)
+    assert schema["additionalProperties"] is False
+    assert set(schema["properties"]["pairs"]["items"]["required"]) == {"question", "answer", "category"}
+
+
+def test_build_prompt_structured_asks_for_json():
+    assert '"question"' in build_prompt("python", structured=True)
+    assert '"pairs"' in build_prompt("python", 3, structured=True)
+
+
+def test_structured_parse_infers_missing_category():
+    data = record(category="")
+    qa_pair = parse_structured_qa_response(json.dumps(data), "python")
+    assert qa_pair == (data["question"], data["answer"], "Python Programming")
+    assert parse_stats.snapshot() == {"structured": 1}
+
+
+def test_structured_parse_falls_back_to_text():
+    question = f"What does {uuid.uuid4().hex} do?"
+    text = f"Question: {question}\nAnswer: A perfectly adequate answer here.\nCategory: Basics"
+
+    assert parse_structured_qa_response(text, "python")[0] == question
+    assert parse_structured_qa_response("nonsense", "python") == (None, None, None)
+    assert parse_stats.snapshot() == {"fallback": 2, "fallback_failed": 1}
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, body):
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+
+class FakeSession:
+    def __init__(self, text):
+        self.text = text
+        self.payloads = []
+
+    def post(self, url, json, timeout, stream):
+        self.payloads.append(json)
+        return FakeResponse({"response": self.text})
+
+
+def test_generate_qa_pair_requests_json_from_ollama():
+    data = record()
+    session = FakeSession(json.dumps(data))
+    with patch('src.utils.api_client.clients.session', return_value=session):
+        qa_pair = generate_qa_pair("python", threading.Event(), 'ollama', SETTINGS)
+
+    assert qa_pair == (data["question"], data["answer"], data["category"])
+    assert session.payloads[0]["format"] == "json"
+
+
+def test_generate_qa_pairs_structured_batch():
+    pairs = [record() for _ in range(3)]
+    session = FakeSession(json.dumps({"pairs": pairs}))
+    with patch('src.utils.api_client.clients.session', return_value=session):
+        qa_pairs = generate_qa_pairs("python", threading.Event(), 'ollama', 3, SETTINGS)
+
+    assert [qa_pair[0] for qa_pair in qa_pairs] == [pair["question"] for pair in pairs]
+
+
+class FakeCompletions:
+    """OpenAI chat completions that only accept the listed response_format types."""
+
+    def __init__(self, accepted):
+        self.accepted = accepted
+        self.formats = []
+
+    def create(self, **request):
+        response_format = request.get("response_format", {}).get("type")
+        self.formats.append(response_format)
+        if response_format not in self.accepted:
+            raise openai.BadRequestError(
+                f"Invalid parameter: 'response_format' of type '{response_format}' is not supported",
+                response=httpx.Response(400, request=httpx.Request("POST", "http://openai.test")),
+                body={"param": "response_format"})
+        return Mock(usage=None)
+
+
+def test_openai_falls_back_to_a_response_format_the_model_supports(monkeypatch):
+    monkeypatch.setattr(api_client, "_response_formats", {})
+    completions = FakeCompletions(accepted=("json_object",))
+    client = Mock(chat=Mock(completions=completions))
+    settings = {"openai_model": "gpt-3.5-turbo", "max_retries": 3}
+
+    with patch('src.utils.api_client.clients.openai', return_value=client):
+        assert make_api_request("prompt", 'openai', settings, json_schema=qa_json_schema()) is not None
+        # The downgrade is remembered for the model
+        assert make_api_request("prompt", 'openai', settings, json_schema=qa_json_schema()) is not None
+
+    assert completions.formats == ["json_schema", "json_object", "json_object"]
+
+
+def test_stream_spots_question_in_json():
+    data = record()
+    text = json.dumps(data)
+    lines = [json.dumps({"response": text[i:i + 5], "done": False}) for i in range(0, len(text), 5)]
+
+    result = read_ollama_stream(lines, lambda question: 'duplicate')
+
+    assert result["question"] == data["question"]
+    assert result["aborted"] == 'duplicate'
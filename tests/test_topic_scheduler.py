@@ -0,0 +1,93 @@
+import random
+import threading
+import uuid
+import pytest
+from unittest.mock import Mock, patch
+from src.data.dataset_creator import create_dataset
+from src.data.database_operations import get_dataset_stats
+from src.data.topic_scheduler import (
+    BanditTopicScheduler, TopicScheduler, make_topic_scheduler, parse_topics)
+
+
+def test_bandit_steers_away_from_saturated_topic():
+    scheduler = BanditTopicScheduler(["fresh", "saturated"], rng=random.Random(0))
+    picks = []
+    for _ in range(200):
+        topic = scheduler.next_topic()
+        picks.append(topic)
+        scheduler.record(topic, 1, 1 if topic == "fresh" else 0)
+
+    assert picks[-100:].count("fresh") > 85
+    report = scheduler.report()["topics"]
+    assert report["saturated"]["acceptance_rate"] == 0
+    assert report["fresh"]["accepted_per_request"] == 1
+
+
+def test_quota_counts_requests_in_flight():
+    scheduler = TopicScheduler(["math", "python"], quotas={"math": 3}, rng=random.Random(1))
+    math_requests = [topic for topic in (scheduler.next_topic(2) for _ in range(20)) if topic == "math"]
+    # Two requests of two pairs each already cover a quota of three
+    assert len(math_requests) == 2
+
+    scheduler.record("math", 2, 2)
+    assert scheduler.remaining_quota("math") == 1
+    assert scheduler.remaining_quota("python") is None
+
+    only_math = TopicScheduler(["math"], quotas={"math": 1})
+    assert only_math.next_topic() == "math"
+    assert only_math.next_topic() is None
+
+
+def test_report_tracks_templates():
+    scheduler = make_topic_scheduler(["math"], {"topic_scheduler": "random"})
+    assert type(scheduler) is TopicScheduler
+    scheduler.record(scheduler.next_topic(3), 3, 2, template="advanced")
+    assert scheduler.report()["templates"]["advanced"]["accepted"] == 2
+
+
+def test_parse_topics():
+    assert parse_topics("math:100, python ,, science:5") == (
+        ["math", "python", "science"], {"math": 100, "science": 5})
+    with pytest.raises(ValueError):
+        parse_topics("math:lots")
+
+
+def test_create_dataset_honours_quotas(tmp_path):
+    db_path = str(tmp_path / "test.db")
+
+    def fake_generate(topic, stop_event, api_choice, settings=None, question_filter=None, metadata=None):
+        return f"What is {uuid.uuid4().hex} in {topic}?", "A sufficiently long answer.", topic
+
+    scheduler = BanditTopicScheduler(["math", "python"], quotas={"math": 2, "python": 3})
+    with patch('src.data.dataset_creator.generate_qa_pair', side_effect=fake_generate):
+        result = create_dataset(10, db_path, ["math", "python"], Mock(), threading.Event(), 'ollama',
+                                concurrency=4, scheduler=scheduler)
+
+    assert result == 5
+    assert get_dataset_stats(db_path)["category_counts"] == {"math": 2, "python": 3}
+
+
+def test_request_errors_do_not_count_against_a_topic(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    calls = []
+
+    def flaky_generate(topic, stop_event, api_choice, settings=None, question_filter=None, metadata=None):
+        calls.append(topic)
+        if len(calls) % 2:
+            metadata["request_failed"] = True
+            return None, None, None
+        return f"What is {uuid.uuid4().hex} in {topic}?", "A sufficiently long answer.", topic
+
+    scheduler = TopicScheduler(["math"])
+    with patch('src.data.dataset_creator.generate_qa_pair', side_effect=flaky_generate):
+        result = create_dataset(3, db_path, ["math"], Mock(), threading.Event(), 'ollama',
+                                concurrency=1, scheduler=scheduler)
+
+    assert result == 3
+    assert len(calls) == 6
+    stats = scheduler.report()["topics"]["math"]
+    assert (stats["requests"], stats["accepted"], stats["acceptance_rate"]) == (3, 3, 1)
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,117 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import pytest
+from benchmarks.mock_server import MockConfig, MockServer
+from src.data import dataset_creator
+from src.data.database_operations import insert_qa_pair
+from src.data.work_queue import (DONE, PENDING, claim_work, enqueue_work, finish_work, plan_work_units,
+                                 produced_for_unit, queue_status, renew_lease, run_worker)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "queue.db")
+
+
+def test_plan_splits_total_and_respects_quotas():
+    assert plan_work_units(["a", "b"], 7, unit_size=3) == [("a", 3), ("a", 1), ("b", 3)]
+    units = plan_work_units(["a", "b", "c"], 30, unit_size=100, quotas={"a": 2})
+    assert dict(units) == {"a": 2, "b": 14, "c": 14}
+
+
+def test_leases_are_exclusive_and_expired_ones_are_reissued(db_path):
+    enqueue_work(db_path, ["a", "b"], 4, unit_size=2)
+
+    first = claim_work(db_path, "w1", lease_seconds=60)
+    second = claim_work(db_path, "w2", lease_seconds=-1)  # Expired at once, as if w2 died
+    assert {first.topic, second.topic} == {"a", "b"}
+    assert renew_lease(db_path, first, 60)
+
+    reissued = claim_work(db_path, "w3", lease_seconds=60)
+    assert reissued.id == second.id and reissued.attempts == 2
+    assert claim_work(db_path, "w4") is None
+
+    # The dead worker's lease is gone for good
+    assert not renew_lease(db_path, second, 60)
+    assert finish_work(db_path, second, 0) is None
+    assert finish_work(db_path, reissued, 2) == DONE
+    assert finish_work(db_path, first, 1, stopped=True) == PENDING
+
+
+def settings_file(directory, server):
+    with open(os.path.join(directory, "settings.json"), "w") as f:
+        json.dump({"api_url": f"{server.url}/api/generate", "max_retries": 1,
+                   "ollama_probe_interval": 0, "model": "mock-model"}, f)
+
+
+def test_worker_finishes_a_crashed_workers_unit(db_path, tmp_path, monkeypatch):
+    enqueue_work(db_path, ["python"], 3, unit_size=3)
+    crashed = claim_work(db_path, "crashed", lease_seconds=-1)
+    insert_qa_pair(db_path, "What did the crashed worker store?", "One pair.", "python",
+                   {"work_unit_id": crashed.id})
+
+    with MockServer(MockConfig(latency_ms=0, seed=5)) as server:
+        settings_file(str(tmp_path), server)
+        monkeypatch.chdir(tmp_path)
+        summary = run_worker(db_path, 'ollama', threading.Event(), worker_id="w1", poll_interval=0.1)
+
+    assert summary == {"units": 1, "pairs": 2}
+    assert produced_for_unit(db_path, crashed.id) == 3
+    assert queue_status(db_path) == {DONE: {"units": 1, "pairs": 3, "produced": 3}}
+
+
+def test_worker_shares_one_writer_across_units(db_path, tmp_path, monkeypatch):
+    enqueue_work(db_path, ["python", "math"], 6, unit_size=2)
+    writers = []
+
+    class CountingWriter(dataset_creator.QAPairWriter):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            writers.append(self)
+
+    monkeypatch.setattr(dataset_creator, "QAPairWriter", CountingWriter)
+    with MockServer(MockConfig(latency_ms=0, seed=3)) as server:
+        settings_file(str(tmp_path), server)
+        monkeypatch.chdir(tmp_path)
+        summary = run_worker(db_path, 'ollama', threading.Event(), worker_id="w1", concurrency=2)
+
+    assert summary == {"units": 4, "pairs": 6}
+    assert len(writers) == 1 and writers[0].committed_count == 6
+    # Multi-machine safe unless the settings ask for WAL
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("PRAGMA journal_mode").fetchone() == ("delete",)
+    conn.close()
+
+
+def test_worker_processes_share_one_queue(db_path, tmp_path):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    with MockServer(MockConfig(latency_ms=20, seed=9)) as server:
+        settings_file(str(tmp_path), server)
+        subprocess.run([sys.executable, os.path.join(ROOT, "main.py"), "enqueue", "--db", db_path,
+                        "--entries", "12", "--topics", "python, math", "--unit-size", "2"],
+                       cwd=tmp_path, env=env, check=True, capture_output=True, timeout=60)
+        workers = [subprocess.Popen([sys.executable, os.path.join(ROOT, "main.py"), "worker", "--db", db_path,
+                                     "--concurrency", "2", "--worker-id", f"w{i}",
+                                     "--poll-interval", "0.2"],
+                                    cwd=tmp_path, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                   for i in range(3)]
+        for worker in workers:
+            _, err = worker.communicate(timeout=120)
+            assert worker.returncode == 0, err.decode()
+
+    conn = sqlite3.connect(db_path)
+    owners = conn.execute("SELECT COUNT(*), COUNT(DISTINCT work_unit_id) FROM qa_pairs").fetchone()
+    statuses = conn.execute("SELECT DISTINCT status FROM work_queue").fetchall()
+    conn.close()
+    assert owners == (12, 6)
+    assert statuses == [(DONE,)]
+
+
+if __name__ == "__main__":
+    pytest.main()